@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.crawl import ROOT
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Runs the test in an empty working directory, which the relative paths of the settings (vehicles.csv, snapshots/,
+    ...) are relative to.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def site(workdir):
+    """
+    Writes the fake websites of the spiders to site.json (see crawl.py): site(gmc=[pages], close=...) or
+    site(gmc={'pages': [...], 'close': 'shutdown'}).
+    """
+    def write(**spiders):
+        with open(workdir / 'site.json', 'w') as site_file:
+            json.dump({name: pages if isinstance(pages, dict) else {'pages': pages}
+                       for name, pages in spiders.items()}, site_file)
+    return write
+
+
+@pytest.fixture
+def cli(workdir):
+    """
+    Runs "python -m vehicle_data_tracker" with the given arguments in a process of its own, with the fake spiders of
+    crawl.py and any ``settings`` given, and returns the completed process and the crawl report. Each crawl needs a
+    process of its own, since the reactor cannot be restarted.
+    """
+    def run(*args, settings=None, timeout=120):
+        env = dict(os.environ, PYTHONPATH=str(ROOT), SCRAPY_SETTINGS_MODULE='tests.settings',
+                   TEST_SETTINGS=json.dumps(settings or {}))
+        process = subprocess.run([sys.executable, '-m', 'vehicle_data_tracker', *args], cwd=workdir, env=env,
+                                 capture_output=True, text=True, timeout=timeout)
+        report_file = workdir / 'crawl_report.json'
+        report = json.loads(report_file.read_text()) if report_file.exists() else None
+        return process, report
+    return run
+
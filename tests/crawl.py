@@ -0,0 +1,90 @@
+"""
+A fake website for every make, so that crawls can run through the real runner, middlewares and pipelines without a
+network.
+
+The website of each spider is the entry for its name in site.json, in the working directory:
+
+{"gmc": {"pages": [["2024", "Sierra 1500", [["SLE", "$50,000"], ...]], ...], "close": "reason"}, ...}
+
+The spider requests a data: URL per page, with the year and model of the page in its cb_kwargs like the real spiders
+pass them, and yields a vehicle per trim of the page. A page whose year is null is requested without cb_kwargs, like
+a page listing several years, and its trims are [year, trim, msrp] instead. With "close", the spider closes with that
+finish reason once its last page is crawled, e.g. "shutdown" or "error".
+"""
+import csv
+import json
+import pathlib
+import urllib.parse
+
+import scrapy
+from scrapy.exceptions import CloseSpider
+
+from vehicle_data_tracker.items import Vehicle
+from vehicle_data_tracker.registry import RegistrySpiderLoader
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+
+SITE_FILE = 'site.json'
+# the root of the repository, for running the project in a process of its own
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def load_site(name: str):
+    try:
+        with open(SITE_FILE, 'r') as site_file:
+            return json.load(site_file).get(name, {})
+    except FileNotFoundError:
+        return {}
+
+
+class FakeSpider(scrapy.Spider):
+    name = 'fake'
+    name_long = 'Fake'
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        site = load_site(self.name)
+        pages = site.get('pages', [])
+        for index, (year, model, trims) in enumerate(pages):
+            url = 'data:text/plain,' + urllib.parse.quote(f'{self.name}/{index}')
+            cb_kwargs = {'trims': trims, 'model': model, 'last': index == len(pages) - 1 and site.get('close')}
+            if year is not None:
+                cb_kwargs['year'] = year
+            yield scrapy.Request(url, callback=self.parse_trims, cb_kwargs=cb_kwargs, dont_filter=True,
+                                 priority=-index)
+
+    def parse_trims(self, response, trims, model, last, year=None):
+        for trim in trims:
+            trim_year = year if year is not None else trim.pop(0)
+            yield Vehicle(year=trim_year, make=self.name_long, model=model, trim=trim[0], msrp=trim[1])
+        if last:
+            raise CloseSpider(last)
+
+
+class FakeSpiderLoader(RegistrySpiderLoader):
+    """
+    Loads a FakeSpider with the name, make, makes and custom settings of the real spider of every name in the
+    registry.
+    """
+    def load(self, spider_name: str):
+        real = super().load(spider_name)
+        return type(real.__name__, (FakeSpider,), {'name': spider_name,
+                                                   'name_long': getattr(real, 'name_long', spider_name.upper()),
+                                                   'custom_settings': dict(real.custom_settings or {})})
+
+
+def read_csv(path):
+    """
+    Returns the rows of a csv file in the layout of vehicles.csv, without the header, as tuples.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as csv_file:
+        return [tuple(row) for row in csv.reader(csv_file) if row and row[0] != 'year']
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(STANDARD_FIELDS)
+        writer.writerows(rows)
@@ -0,0 +1,16 @@
+"""
+The project settings, with every spider replaced by a fake one that crawls the vehicles of site.json in the working
+directory instead of the make's website (see crawl.py). The tests run crawls with SCRAPY_SETTINGS_MODULE set to this
+module, and override any other settings with a JSON object in the TEST_SETTINGS environment variable.
+"""
+import json
+import os
+
+from vehicle_data_tracker.settings import *
+
+SPIDER_LOADER_CLASS = 'tests.crawl.FakeSpiderLoader'
+ROBOTSTXT_OBEY = False
+TELNETCONSOLE_ENABLED = False
+LOG_LEVEL = 'WARNING'
+
+globals().update(json.loads(os.environ.get('TEST_SETTINGS', '{}')))
@@ -0,0 +1,117 @@
+import concurrent.futures
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.crawl import ROOT
+
+pytest.importorskip('tkinter')
+pytest.importorskip('PIL')
+
+
+class Widget:
+    """
+    Stands in for the Tk widgets and variables of the app, which need a display: get returns ``value``, and every other
+    method does nothing.
+    """
+    def __init__(self, value=''):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def cget(self, option):
+        return ''
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+# imports the app and starts its worker pool like the app does when Scrapy can be imported, with stand-ins for the
+#  widgets start_worker_pool touches, then lists the modules that were imported
+STARTUP = """
+import json
+import sys
+
+import scraper_app
+
+
+class Widget:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+app = scraper_app.ScraperApp.__new__(scraper_app.ScraperApp)
+app.projectPath = sys.argv[1]
+for name in ('queueFrame', 'closeAppCautionLabel', 'crawlButton', 'resumeButton', 'purgeCheckButton',
+             'purgeYearEntry', 'purgeModelEntry', 'comboBox', 'queueButton'):
+    setattr(app, name, Widget())
+app.start_worker_pool()
+imported = sorted(sys.modules)
+app.workerPool.close()
+print(json.dumps(imported))
+"""
+
+
+class FakePool:
+    """
+    Records the jobs submitted to it instead of crawling them, and finishes them right away.
+    """
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, makes, **options):
+        self.jobs.append((makes, options))
+        future = concurrent.futures.Future()
+        future.set_result({})
+        return future
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """
+    Returns a ScraperApp with a FakePool for a worker pool and a Widget for every widget and variable the crawl buttons
+    use, and 'Ford' selected.
+    """
+    # the app imports its modules as the frozen bundle has them, from its own directory
+    monkeypatch.syspath_prepend(str(ROOT / 'vehicle_data_tracker'))
+    scraper_app = importlib.import_module('scraper_app')
+    app = scraper_app.ScraperApp.__new__(scraper_app.ScraperApp)
+    for name in ('master', 'updateLabel', 'closeAppCautionLabel', 'progressBar', 'crawlButton', 'resumeButton',
+                 'purgeCheckButton', 'purgeYearEntry', 'purgeModelEntry', 'comboBox', 'queueButton'):
+        setattr(app, name, Widget())
+    app.selectedMake = Widget('Ford')
+    app.purgeFlag = Widget(0)
+    app.purgeYear = Widget()
+    app.purgeModel = Widget()
+    app.checkpoint = None
+    app.workerPool = FakePool()
+    return app
+
+
+@pytest.mark.parametrize('make, checkpointed', [('Ford', False), ('[UPDATE ALL]', True)])
+def test_only_update_all_keeps_a_checkpoint(app, make, checkpointed):
+    app.selectedMake = Widget(make)
+    app.crawl_button_click()
+    assert [options['checkpointed'] for makes, options in app.workerPool.jobs] == [checkpointed]
+
+
+def test_resume_keeps_a_checkpoint(app):
+    app.resume_button_click()
+    assert [(makes, options['resume'], options['checkpointed']) for makes, options in app.workerPool.jobs] == \
+           [([], True, True)]
+
+
+def test_starting_the_app_does_not_import_scrapy(workdir):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join((str(ROOT / 'vehicle_data_tracker'), str(ROOT))),
+               SCRAPY_SETTINGS_MODULE='tests.settings', TEST_SETTINGS=json.dumps({'WORKER_POOL_SIZE': 1}))
+    process = subprocess.run([sys.executable, '-c', STARTUP, str(ROOT)], cwd=workdir, env=env, capture_output=True,
+                             text=True, timeout=120)
+    assert process.returncode == 0, process.stderr
+    imported = json.loads(process.stdout.splitlines()[-1])
+    assert 'scrapy' not in imported
+    assert 'twisted' not in imported
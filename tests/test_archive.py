@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import pytest
+
+from vehicle_data_tracker import archive
+from vehicle_data_tracker.archive import Archive
+from vehicle_data_tracker.archive import ArchiveReader
+from vehicle_data_tracker.archive import index_path
+
+ROWS = [['2024', 'GMC', 'Sierra 1500', 'SLE', '$48,000'],
+        ['2024', 'Ford', 'F-150', 'XL', '$35,000'],
+        ['2023', 'GMC', 'Acadia', 'SLT', '$40,000']]
+
+CODECS = ['archive.csv.gz', pytest.param('archive.csv.zst', marks=pytest.mark.skipif(archive.zstd is None,
+                                                                                      reason='needs zstd'))]
+
+
+@pytest.mark.parametrize('name', CODECS)
+def test_runs_and_makes_read_back(workdir, name):
+    target = Archive(name)
+    assert target.add_run('run1', ROWS) == 3
+    assert target.add_run('run2', ROWS[:1]) == 1
+    reader = ArchiveReader(name)
+    assert [(v['run_id'], v['make'], v['model']) for v in reader.vehicles()] == [
+        ('run1', 'Ford', 'F-150'), ('run1', 'GMC', 'Acadia'), ('run1', 'GMC', 'Sierra 1500'),
+        ('run2', 'GMC', 'Sierra 1500')]
+    assert [v['model'] for v in reader.vehicles(run_id='run1', make='gmc')] == ['Acadia', 'Sierra 1500']
+    assert target.runs() == ['run1', 'run2']
+
+
+def test_gzip_archive_is_one_gzip_file(workdir):
+    Archive('archive.csv.gz').add_run('run1', ROWS)
+    Archive('archive.csv.gz').add_run('run2', ROWS)
+    with gzip.open('archive.csv.gz', 'rt') as whole:
+        assert len(whole.read().splitlines()) == 6
+
+
+def test_blocks_indexed_without_a_codec_are_gzip(workdir):
+    Archive('archive.csv.gz').add_run('run1', ROWS)
+    entries = [json.loads(line) for line in open(index_path('archive.csv.gz'))]
+    with open(index_path('archive.csv.gz'), 'w') as index_file:
+        for entry in entries:
+            del entry['codec']
+            index_file.write(json.dumps(entry) + '\n')
+    assert len(list(ArchiveReader('archive.csv.gz').vehicles())) == 3
+
+
+def test_empty_run_writes_nothing(workdir):
+    assert Archive('archive.csv.gz').add_run('run1', []) == 0
+    assert not (workdir / 'archive.csv.gz').exists()
+    assert not (workdir / index_path('archive.csv.gz')).exists()
+
+
+def test_crawls_are_not_archived_by_default(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]])
+    cli('gmc')
+    assert not list(workdir.glob('archive*'))
+
+
+def test_failed_crawl_creates_no_archive(site, cli, workdir):
+    site(gmc={'pages': [['2024', 'Acadia', []]], 'close': 'error'})
+    process, report = cli('gmc', settings={'ARCHIVE_FILE': 'archive.csv.gz'})
+    assert report['failed'] == ['GMC']
+    assert not list(workdir.glob('archive*'))
+
+
+def test_crawl_is_archived_under_its_run_id(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]])
+    process, report = cli('gmc', settings={'ARCHIVE_FILE': 'archive.csv.gz'})
+    assert [v['run_id'] for v in ArchiveReader(str(workdir / 'archive.csv.gz')).vehicles()] == [report['run_id']]
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from tests.crawl import ROOT
+from tests.crawl import read_csv
+from tests.crawl import write_csv
+from vehicle_data_tracker.trimindex import index_path
+
+OLD = [('2024', 'GMC', 'Acadia', 'SLT', '$40,000')]
+PAGES = [['2024', 'Acadia', [['SLT', '$40,000'], ['AT4', '$45,000'], ['AT4', '$45,000']]]] + \
+        [['2024', f'Model {i}', [['Base', '$30,000'], ['Denali', '$50,000']]] for i in range(5)]
+# the number of different trims of PAGES, SLT (which OLD has already) included
+TRIMS = len({(year, model, trim) for year, model, trims in PAGES for trim, msrp in trims})
+SLOW = {'DOWNLOAD_DELAY': 0.5, 'RANDOMIZE_DOWNLOAD_DELAY': False, 'CONCURRENT_REQUESTS': 1}
+
+
+def test_batches_write_the_same_bytes_as_single_rows(site, cli, workdir):
+    site(gmc=PAGES)
+    written = {}
+    for batch_size in (1, 1000):
+        write_csv(workdir / 'vehicles.csv', OLD)
+        process, report = cli('gmc', settings={'WRITE_BATCH_SIZE': batch_size, 'CONCURRENT_REQUESTS': 1})
+        assert report['done'] == ['GMC']
+        written[batch_size] = [(workdir / path).read_bytes() for path in ('vehicles.csv', index_path('vehicles.csv'))]
+        for path in ('vehicles.csv', index_path('vehicles.csv')):
+            os.remove(workdir / path)
+    assert written[1] == written[1000]
+    # the header and a row per trim
+    assert written[1][0].count(b'\n') == 1 + TRIMS
+
+
+@pytest.mark.parametrize('interval, flushed_while_running', [(0, False), (0.2, True)])
+def test_batches_are_flushed_every_interval_and_when_the_spider_closes(site, workdir, interval,
+                                                                        flushed_while_running):
+    site(gmc=PAGES)
+    env = dict(os.environ, PYTHONPATH=str(ROOT), SCRAPY_SETTINGS_MODULE='tests.settings',
+               TEST_SETTINGS=json.dumps(dict(SLOW, WRITE_BATCH_SIZE=1000, WRITE_BATCH_INTERVAL=interval)))
+    process = subprocess.Popen([sys.executable, '-m', 'vehicle_data_tracker', 'gmc'], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # the number of rows in vehicles.csv every time it is looked at while the crawl is running
+    seen = set()
+    while process.poll() is None:
+        if (workdir / 'vehicles.csv').exists():
+            seen.add(len(read_csv(workdir / 'vehicles.csv')))
+        time.sleep(0.05)
+    assert process.returncode == 0
+    assert any(0 < rows < TRIMS for rows in seen) == flushed_while_running
+    assert len(read_csv(workdir / 'vehicles.csv')) == TRIMS
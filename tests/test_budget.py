@@ -0,0 +1,24 @@
+PAGES = [['2024', f'Model {i}', [['Base', '$30,000']]] for i in range(6)]
+
+
+def test_no_budget_by_default(site, cli):
+    site(porsche=PAGES)
+    process, report = cli('porsche')
+    assert report['done'] == ['Porsche']
+    assert report['spiders']['Porsche']['items'] == 6
+
+
+def test_request_budget_closes_the_spider(site, cli):
+    site(porsche=PAGES)
+    process, report = cli('porsche', '--request-budget', '2', settings={'CONCURRENT_REQUESTS': 1})
+    assert report['partial'] == ['Porsche']
+    assert report['spiders']['Porsche']['finish_reason'] == 'budget_requests'
+    assert report['spiders']['Porsche']['items'] < 6
+
+
+def test_budget_by_spider(site, cli):
+    site(porsche=PAGES, tesla=PAGES)
+    process, report = cli('porsche', 'tesla',
+                          settings={'CONCURRENT_REQUESTS': 1, 'SPIDER_BUDGETS': {'tesla': {'requests': 1}}})
+    assert report['done'] == ['Porsche']
+    assert report['partial'] == ['Tesla']
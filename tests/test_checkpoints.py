@@ -0,0 +1,41 @@
+from tests.crawl import read_csv
+from vehicle_data_tracker.checkpoints import RunCheckpoint
+
+
+def test_interrupted_run_resumes_with_the_unfinished_makes(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         porsche={'pages': [['2024', '911', [['Carrera', '$120,000']]]], 'close': 'shutdown'})
+    process, report = cli('gmc', 'porsche')
+    assert report['done'] == ['GMC']
+    checkpoint = RunCheckpoint(str(workdir / 'checkpoints'))
+    assert checkpoint.load()
+    assert checkpoint.pending() == ['Porsche']
+
+    site(gmc=[['2024', 'Acadia', [['AT4', '$45,000']]]],
+         porsche=[['2024', '911', [['Carrera', '$120,000'], ['GT3', '$180,000']]]])
+    process, report = cli('--resume')
+    assert report['done'] == ['Porsche']
+    assert not RunCheckpoint(str(workdir / 'checkpoints')).load()
+    assert sorted(read_csv(workdir / 'vehicles.csv')) == [('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+                                                          ('2024', 'PORSCHE', '911', 'Carrera', '$120,000'),
+                                                          ('2024', 'PORSCHE', '911', 'GT3', '$180,000')]
+
+
+def test_resume_without_an_interrupted_run(cli):
+    process, report = cli('--resume')
+    assert process.returncode != 0
+    assert 'no interrupted run to resume' in process.stderr
+
+
+def test_resumed_make_purges_if_the_run_did(site, cli, workdir):
+    site(porsche=[['2024', '911', [['Carrera', '$120,000']]]])
+    cli('porsche')
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         porsche={'pages': [['2024', '911', [['GT3', '$180,000']]]], 'close': 'shutdown'})
+    cli('--purge', '1', 'gmc', 'porsche')
+    assert ('2024', 'PORSCHE', '911', 'Carrera', '$120,000') in read_csv(workdir / 'vehicles.csv')
+    site(porsche=[['2024', '911', [['GT3', '$180,000']]]])
+    process, report = cli('--resume')
+    assert report['done'] == ['Porsche']
+    assert sorted(read_csv(workdir / 'vehicles.csv')) == [('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+                                                          ('2024', 'PORSCHE', '911', 'GT3', '$180,000')]
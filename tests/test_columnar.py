@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+import pytest
+
+from tests.crawl import ROOT
+from vehicle_data_tracker import columnar
+
+pytestmark = pytest.mark.skipif(not columnar.available(), reason='needs pyarrow')
+
+
+def test_pipelines_do_not_import_pyarrow():
+    code = 'import sys, vehicle_data_tracker.pipelines; print("pyarrow" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'False'
+
+
+def test_write_and_read_back(workdir):
+    rows = [['2024', 'Ford', 'F-150', 'XL', '$35,000'],
+            ['2022', 'Ford', 'Edge', 'SE', ''],
+            ['2024', 'GMC', 'Acadia', 'SLT', '$40,000'],
+            ['n/a', 'GMC', 'Acadia', 'SLE', '$1']]
+    assert columnar.write_rows(rows, 'columnar', 'run1', '2024-05-01') == 3
+    table = columnar.read_vehicles('columnar', make='Ford', years=(2023, 2025))
+    assert table.column('trim').to_pylist() == ['XL']
+    assert table.column('msrp').to_pylist() == [35000]
+    assert sorted(columnar.read_vehicles('columnar').column('make').to_pylist()) == ['Ford', 'Ford', 'GMC']
+
+
+def test_crawl_writes_every_vehicle_once(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000'], ['SLT', '$40,000'], ['AT4', '$45,000']]]])
+    process, report = cli('gmc', settings={'COLUMNAR_DIR': 'columnar'})
+    assert report['done'] == ['GMC']
+    table = columnar.read_vehicles(str(workdir / 'columnar'))
+    assert sorted(table.column('trim').to_pylist()) == ['AT4', 'SLT']
+
+
+def test_crawl_writes_only_the_purge_scope(site, cli, workdir):
+    site(gmc=[[None, 'Sierra 1500', [['2025', 'SLE', '$50,000'], ['2024', 'Pro', '$40,000']]]])
+    process, report = cli('--purge-year', '2024', 'gmc', settings={'COLUMNAR_DIR': 'columnar'})
+    assert report['done'] == ['GMC']
+    assert columnar.read_vehicles(str(workdir / 'columnar')).column('trim').to_pylist() == ['Pro']
@@ -0,0 +1,79 @@
+import datetime
+import json
+
+from scrapy.settings import Settings
+from twisted.internet import defer
+
+from vehicle_data_tracker import daemon
+from vehicle_data_tracker.daemon import RefreshDaemon
+from vehicle_data_tracker.daemon import last_success
+from vehicle_data_tracker.daemon import stale_makes
+from vehicle_data_tracker.history import load_history
+
+NOW = datetime.datetime(2024, 6, 1, 12, 0, 0)
+HOUR = 60 * 60
+
+
+def run(hours_ago: float, finish_reason='finished', now=NOW):
+    finished = now - datetime.timedelta(hours=hours_ago)
+    return {'finished': finished.isoformat(timespec='seconds'), 'seconds': 1.0, 'requests': 1,
+            'finish_reason': finish_reason}
+
+
+def write_history(path, history: dict):
+    with open(path, 'w') as history_file:
+        json.dump(history, history_file)
+    return str(path)
+
+
+def settings(**overrides):
+    return Settings(dict({'REFRESH_TTL': 24 * HOUR, 'REFRESH_TTLS': {}, 'CRAWL_HISTORY': 'crawl_history.json',
+                          'DAEMON_INTERVAL': 600}, **overrides))
+
+
+def test_last_success_skips_the_runs_that_did_not_finish(workdir):
+    history = load_history(write_history(workdir / 'crawl_history.json',
+                                         {'gmc': [run(30), run(2, 'shutdown'), run(5), run(1, 'error: boom')]}))
+    assert last_success(history, 'gmc') == NOW - datetime.timedelta(hours=5)
+    assert last_success(history, 'ford') is None
+
+
+def test_makes_past_the_default_ttl_or_never_crawled_are_stale(workdir):
+    history = load_history(write_history(workdir / 'crawl_history.json',
+                                         {'gmc': [run(23)], 'ford': [run(24)], 'buick': [run(48), run(1, 'shutdown')]}))
+    # Ford is exactly as old as its ttl, Buick's last run failed, and Tesla was never crawled
+    assert stale_makes(['GMC', 'Ford', 'Buick', 'Tesla'], history, settings(), NOW) == ['Ford', 'Buick', 'Tesla']
+
+
+def test_ttl_of_a_spider_overrides_the_default(workdir):
+    history = load_history(write_history(workdir / 'crawl_history.json',
+                                         {'tesla': [run(2)], 'porsche': [run(30)], 'gmc': [run(2)]}))
+    ttls = settings(REFRESH_TTLS={'tesla': HOUR, 'porsche': 7 * 24 * HOUR})
+    assert stale_makes(['Tesla', 'Porsche', 'GMC'], history, ttls, NOW) == ['Tesla']
+
+
+def test_tick_crawls_the_stale_makes_and_skips_while_crawling(workdir, monkeypatch):
+    # tick checks against the current time
+    now = datetime.datetime.now()
+    write_history(workdir / 'crawl_history.json', {'gmc': [run(0, now=now)], 'ford': [run(48, now=now)]})
+    crawls = []
+
+    def schedule_crawls(process, makes, purge):
+        crawls.append(makes)
+        return defer.Deferred()
+
+    monkeypatch.setattr(daemon, 'schedule_crawls', schedule_crawls)
+    refresher = RefreshDaemon.__new__(RefreshDaemon)
+    refresher.makes = ['GMC', 'Ford', 'Tesla']
+    refresher.settings = settings()
+    refresher.purge = False
+    refresher.process = None
+    refresher.crawling = False
+    refresher.tick()
+    assert crawls == [['Ford', 'Tesla']]
+    assert refresher.crawling
+    refresher.tick()
+    assert crawls == [['Ford', 'Tesla']]
+    refresher.done(None)
+    refresher.tick()
+    assert len(crawls) == 2
@@ -0,0 +1,72 @@
+import pytest
+
+from tests.crawl import read_csv
+from tests.crawl import write_csv
+from vehicle_data_tracker import dedup
+from vehicle_data_tracker.utilities import trim_id
+
+OLD = [('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+       ('2024', 'PORSCHE', '911', 'Carrera', '$120,000')]
+SLT = trim_id(*OLD[0][:4])
+AT4 = trim_id('2024', 'GMC', 'Acadia', 'AT4')
+
+
+@pytest.fixture
+def output(workdir, monkeypatch):
+    monkeypatch.setattr(dedup, '_shared_sets', {})
+    write_csv(workdir / 'vehicles.csv', OLD)
+    return 'vehicles.csv'
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_spiders_share_the_ids(output, use_index):
+    first = dedup.register(output, use_index)
+    second = dedup.register(output, use_index)
+    assert first.ids is second.ids
+    assert SLT in second and len(second) == 2
+    first.add(AT4)
+    assert AT4 in second
+    dedup.release(first)
+    dedup.release(second)
+
+
+def test_ids_are_kept_until_the_file_changes(output):
+    view = dedup.register(output)
+    dedup.release(view)
+    assert dedup.register(output).ids is view.ids
+    dedup.release(view)
+    with open(output, 'a', newline='', encoding='utf-8') as csv_file:
+        csv_file.write('2024,GMC,Acadia,AT4,"$45,000"\n')
+    again = dedup.register(output)
+    assert again.ids is not view.ids
+    assert AT4 in again
+
+
+def test_purging_view_is_private_and_refresh_updates_the_shared_ids(output):
+    shared = dedup.register(output)
+    purging = dedup.register(output, private=True)
+    assert len(purging) == 0
+    purging.add(AT4)
+    assert AT4 not in shared
+    dedup.release(purging)
+    dedup.refresh(output, removed=[SLT], added=[AT4])
+    assert AT4 in shared and SLT not in shared
+    dedup.release(shared)
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_spiders_of_one_crawl_drop_the_vehicles_seen(site, cli, workdir, use_index):
+    write_csv(workdir / 'vehicles.csv', OLD)
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000'], ['AT4', '$45,000'], ['AT4', '$46,000']]]],
+         porsche=[['2024', '911', [['Carrera', '$120,000'], ['GT3', '$180,000']]]])
+    process, report = cli('gmc', 'porsche', settings={'VEHICLES_INDEX': use_index})
+    assert sorted(report['done']) == ['GMC', 'Porsche']
+    assert sorted(read_csv(workdir / 'vehicles.csv')[2:]) == [('2024', 'GMC', 'Acadia', 'AT4', '$45,000'),
+                                                              ('2024', 'PORSCHE', '911', 'GT3', '$180,000')]
+
+
+def test_trims_that_join_to_the_same_string_are_both_kept(site, cli, workdir):
+    site(gmc=[['2024', 'X', [['5M', '$1,000']]], ['2024', 'X5', [['M', '$2,000']]]])
+    cli('gmc')
+    assert sorted(read_csv(workdir / 'vehicles.csv')) == [('2024', 'GMC', 'X', '5M', '$1,000'),
+                                                          ('2024', 'GMC', 'X5', 'M', '$2,000')]
@@ -0,0 +1,38 @@
+import csv
+
+import pytest
+
+from tests.crawl import write_csv
+from vehicle_data_tracker.diff import diff_files
+from vehicle_data_tracker.snapshots import SnapshotLog
+
+OLD = [('2024', 'GMC', 'Sierra 1500', 'SLE', '$48,000'),
+       ('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+       ('2024', 'GMC', 'Sierra 1500', 'SLE', '$49,000'),
+       ('2024', 'Ford', 'F-150', 'XL', '$35,000')]
+
+NEW = [('2024', 'GMC', 'Sierra 1500', 'SLE', '$49,000'),
+       ('2024', 'GMC', 'Sierra 1500', 'Denali', '$60,000'),
+       ('2024', 'GMC', 'Acadia', 'SLT', '$41,000'),
+       ('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+       ('2024', 'GMC', 'Sierra 1500', 'Denali', '$61,000')]
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 100])
+def test_last_row_of_a_trim_counts(workdir, chunk_rows):
+    write_csv(workdir / 'old.csv', OLD)
+    write_csv(workdir / 'new.csv', NEW)
+    assert list(diff_files('old.csv', 'new.csv', chunk_rows)) == [
+        ['removed', '2024', 'Ford', 'F-150', 'XL', '$35,000', ''],
+        ['added', '2024', 'GMC', 'Sierra 1500', 'Denali', '$61,000', '']]
+
+
+def test_diff_is_the_delta_between_snapshots(workdir):
+    write_csv(workdir / 'old.csv', OLD)
+    write_csv(workdir / 'new.csv', NEW)
+    log = SnapshotLog('snapshots')
+    log.record(OLD, {'GMC': 'done', 'Ford': 'done'})
+    entry = log.record(NEW, {'GMC': 'done'})
+    assert entry['kind'] == 'delta'
+    with open(workdir / 'snapshots' / entry['file'], 'r', newline='') as delta:
+        assert list(csv.reader(delta))[1:] == list(diff_files('old.csv', 'new.csv'))
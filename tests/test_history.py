@@ -0,0 +1,39 @@
+from vehicle_data_tracker.history import HISTORY_RUNS
+from vehicle_data_tracker.history import expected_durations
+from vehicle_data_tracker.history import load_history
+from vehicle_data_tracker.history import longest_first
+from vehicle_data_tracker.history import pack_longest_first
+from vehicle_data_tracker.history import record_runs
+
+
+def history_of(**durations):
+    return {spider: [{'seconds': seconds, 'finish_reason': 'finished'}] for spider, seconds in durations.items()}
+
+
+def test_longest_first():
+    history = history_of(a=1, b=5, c=3)
+    history['c'].append({'seconds': 50, 'finish_reason': 'closespider_timeout'})
+    assert expected_durations(['a', 'b', 'c', 'new'], history) == {'a': 1, 'b': 5, 'c': 3, 'new': 5}
+    assert longest_first(['a', 'b', 'c', 'new'], history) == ['b', 'new', 'c', 'a']
+
+
+def test_packing_counts_the_spiders_each_worker_runs_at_once():
+    history = history_of(a=10, b=8, c=8, d=3, e=3, f=3, g=1)
+    spiders = list('abcdefg')
+    # one spider at a time, the work is balanced by total duration: 10 + 3 + 3 + 1 against 8 + 8 + 3
+    assert pack_longest_first(spiders, 2, history) == [['a', 'd', 'e', 'g'], ['b', 'c', 'f']]
+    # two at a time, the first worker is busy for 10s with a and 8 + 1 = 9s with c and g, the second for 8s with b
+    #  and 3 * 3 = 9s with d, e and f, instead of 10 + 1 = 11s and 8 + 3 = 11s
+    assert pack_longest_first(spiders, 2, history, concurrency=2) == [['a', 'c', 'g'], ['b', 'd', 'e', 'f']]
+
+
+def test_spiders_without_history_are_dealt_out_round_robin():
+    assert pack_longest_first(list('abcde'), 2, {}, concurrency=8) == [['a', 'c', 'e'], ['b', 'd']]
+    assert pack_longest_first(['a'], 4, {}) == [['a']]
+
+
+def test_history_keeps_the_last_runs(workdir):
+    result = {'spider': 'gmc', 'seconds': 1.0, 'requests': 2, 'finish_reason': 'finished'}
+    for _ in range(HISTORY_RUNS + 2):
+        record_runs('history.json', {'GMC': result})
+    assert len(load_history('history.json')['gmc']) == HISTORY_RUNS
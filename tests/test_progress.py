@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+from tests.crawl import ROOT
+from vehicle_data_tracker.monitor import OutputMonitor
+from vehicle_data_tracker.monitor import PROGRESS_PREFIX
+
+PAGES = [['2024', f'Model {i}', [['Base', '$30,000']]] for i in range(6)]
+
+
+def crawl(workdir, *args, settings=None):
+    """
+    Starts "python -m vehicle_data_tracker --progress" like the app does, with the fake spiders of crawl.py and any
+    ``settings`` given, and returns the Popen, whose output is piped.
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT), SCRAPY_SETTINGS_MODULE='tests.settings',
+               TEST_SETTINGS=json.dumps(settings or {}))
+    return subprocess.Popen([sys.executable, '-m', 'vehicle_data_tracker', '--progress', *args], cwd=workdir, env=env,
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+
+def reports(workdir, *args, settings=None):
+    """
+    Returns the progress reports printed by a crawl, in order.
+    """
+    process = crawl(workdir, *args, settings=settings)
+    output, _ = process.communicate(timeout=120)
+    lines = output.decode('utf-8').splitlines()
+    return [json.loads(line[len(PROGRESS_PREFIX):]) for line in lines if line.startswith(PROGRESS_PREFIX)]
+
+
+def totals_of(*sites):
+    """
+    Returns the requests, items and drops expected of crawling the given sites into an empty vehicles.csv: a request
+    per page, and an item per trim, except for the trims a page before it already had, which are dropped.
+    """
+    trims = [(year, model, trim) for pages in sites for year, model, page_trims in pages for trim, msrp in page_trims]
+    return {'requests': sum(len(pages) for pages in sites), 'items': len(set(trims)),
+            'dropped': len(trims) - len(set(trims))}
+
+
+def test_monitor_totals_the_reports_of_every_spider(site, workdir):
+    gmc = [['2024', 'Acadia', [['SLT', '$41,000'], ['AT4', '$45,000'], ['AT4', '$45,000']]],
+           ['2024', 'Terrain', [['SLE', '$30,000']]]]
+    ford = [['2024', 'F-150', [['XL', '$35,000']]]]
+    site(gmc=gmc, ford=ford)
+    updates = []
+    monitor = OutputMonitor(crawl(workdir, 'gmc', 'ford'), on_progress=lambda monitor: updates.append(monitor.totals()))
+    assert monitor.wait() == 0
+    assert totals_of(gmc, ford) == {'requests': 3, 'items': 4, 'dropped': 1}
+    assert monitor.totals() == totals_of(gmc, ford)
+    assert {spider: progress['state'] for spider, progress in monitor.progress.items()} == {'gmc': 'finished',
+                                                                                          'ford': 'finished'}
+    assert updates[-1] == monitor.totals()
+    assert not any(line.startswith(PROGRESS_PREFIX) for line in monitor.tail())
+
+
+def test_reports_once_at_the_start_and_once_at_the_end_within_the_interval(site, workdir):
+    site(gmc=PAGES)
+    assert [progress['state'] for progress in reports(workdir, 'gmc', settings={'PROGRESS_INTERVAL': 60})] == \
+           ['running', 'finished']
+
+
+def test_reports_every_interval_while_running(site, workdir):
+    site(gmc=PAGES)
+    progress = reports(workdir, 'gmc', settings={'PROGRESS_INTERVAL': 0.1, 'DOWNLOAD_DELAY': 0.2,
+                                                  'RANDOMIZE_DOWNLOAD_DELAY': False, 'CONCURRENT_REQUESTS': 1})
+    running = [report for report in progress if report['state'] == 'running']
+    assert len(running) >= 5
+    assert [report['requests'] for report in running] == sorted(report['requests'] for report in running)
+    assert progress[-1] == dict({'spider': 'gmc', 'state': 'finished'}, **totals_of(PAGES))
@@ -0,0 +1,44 @@
+import pytest
+
+from tests.crawl import read_csv
+from vehicle_data_tracker.store import VehicleStore
+
+BACKENDS = ['csv', 'sqlite', 'segments']
+OLD = [['2024', 'Acadia', [['SLT', '$40,000'], ['AT4', '$45,000']]]]
+NEW = [['2024', 'Acadia', [['Denali', '$50,000']]]]
+
+
+def stored(workdir, backend):
+    """
+    Returns the vehicles the crawls left in ``backend``, sorted.
+    """
+    if backend == 'sqlite':
+        with VehicleStore(str(workdir / 'vehicles.db')) as store:
+            return sorted(store.rows())
+    return sorted(read_csv(workdir / 'vehicles.csv'))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('close', ['error', 'shutdown'])
+def test_unfinished_purge_keeps_the_old_vehicles(site, cli, workdir, backend, close):
+    settings = {'VEHICLES_BACKEND': backend}
+    site(gmc=OLD)
+    cli('gmc', settings=settings)
+    old = stored(workdir, backend)
+    assert len(old) == 2
+    site(gmc={'pages': NEW, 'close': close})
+    process, report = cli('--purge', '1', 'gmc', settings=settings)
+    assert report['done'] == []
+    assert stored(workdir, backend) == old
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_committed_purge_replaces_the_vehicles_of_the_make(site, cli, workdir, backend):
+    settings = {'VEHICLES_BACKEND': backend}
+    site(gmc=OLD, porsche=[['2024', '911', [['Carrera', '$120,000']]]])
+    cli('gmc', 'porsche', settings=settings)
+    site(gmc=NEW)
+    process, report = cli('--purge', '1', 'gmc', settings=settings)
+    assert report['done'] == ['GMC']
+    assert stored(workdir, backend) == [('2024', 'GMC', 'Acadia', 'Denali', '$50,000'),
+                                        ('2024', 'PORSCHE', '911', 'Carrera', '$120,000')]
@@ -0,0 +1,76 @@
+from vehicle_data_tracker.query import QueryIndex
+from vehicle_data_tracker.snapshots import SnapshotLog
+
+RUN1 = [['2024', 'GMC', 'Sierra 1500', 'SLE', '$48,000'],
+        ['2024', 'GMC', 'Acadia', 'SLT', '$40,000'],
+        ['2023', 'GMC', 'Sierra 1500', 'SLE', '$45,000'],
+        ['2024', 'Ford', 'F-150', 'XL', '$35,000'],
+        ['', 'Ford', 'F-150', 'Raptor', '$80,000']]
+RUN2 = [['2024', 'GMC', 'Sierra 1500', 'SLE', '$49,000'],
+        ['2025', 'GMC', 'Sierra_1500%', 'Pro', '$39,000']]
+
+
+def trims(vehicles):
+    return [(vehicle['year'], vehicle['model'], vehicle['trim'], vehicle['msrp']) for vehicle in vehicles]
+
+
+def test_latest_complete_run_of_each_make(workdir):
+    with QueryIndex('query.db') as index:
+        assert index.add_run('run1', RUN1) == 4
+        index.add_run('run2', RUN2)
+        index.add_run('run3', [['2024', 'Ford', 'F-150', 'Lariat', '$55,000']], complete=False)
+        assert sorted(index.latest_runs()) == [('Ford', 'run1'), ('GMC', 'run2')]
+        assert trims(index.find(make='ford')) == [(2024, 'F-150', 'XL', 35000)]
+        index.complete_run('run3', ['Ford'])
+        assert trims(index.find(make='FORD')) == [(2024, 'F-150', 'Lariat', 55000)]
+        assert trims(index.find(make='gmc', run_id='run1', year_min=2024)) == [(2024, 'Acadia', 'SLT', 40000),
+                                                                               (2024, 'Sierra 1500', 'SLE', 48000)]
+        assert len(index.find(all_runs=True)) == 7
+
+
+def test_filters(workdir):
+    with QueryIndex('query.db') as index:
+        index.add_run('run1', RUN1 + RUN2[1:])
+        assert trims(index.find(model='sierra', year_max=2024, msrp_max=46000)) == [(2023, 'Sierra 1500', 'SLE', 45000)]
+        # % and _ are matched literally
+        assert trims(index.find(model='_1500%')) == [(2025, 'Sierra_1500%', 'Pro', 39000)]
+        # ordered by make, year, model and trim
+        assert trims(index.find(msrp_min=40000, limit=2)) == [(2023, 'Sierra 1500', 'SLE', 45000),
+                                                              (2024, 'Acadia', 'SLT', 40000)]
+        assert index.find(make='Tesla') == []
+
+
+def test_snapshots_are_loaded_once(workdir):
+    log = SnapshotLog('snapshots')
+    first = log.record(RUN1[:4], {'GMC': 'done', 'Ford': 'done'}, 'run1')
+    second = log.record(RUN2, {'GMC': 'done'}, 'run2')
+    with QueryIndex('query.db') as index:
+        assert index.load_snapshots(log) == [first['run_id'], second['run_id']]
+        assert index.load_snapshots(log) == []
+        assert len(index.find(run_id='run1')) == 4
+        assert trims(index.find(run_id='run2', model='Sierra 1500')) == [(2024, 'Sierra 1500', 'SLE', 49000)]
+
+
+def test_crawl_is_indexed(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000'], ['AT4', '$45,000']]]])
+    process, report = cli('gmc')
+    with QueryIndex(str(workdir / 'query.db')) as index:
+        assert trims(index.find(make='GMC', msrp_min=41000)) == [(2024, 'Acadia', 'AT4', 45000)]
+        assert index.latest_runs() == [('GMC', report['run_id'])]
+
+
+def test_crawl_with_custom_settings_is_indexed(site, cli, workdir):
+    # the tesla spider has custom settings of its own, which must not leave QueryIndexPipeline out
+    site(tesla=[['2024', 'Model 3', [['RWD', '$39,000']]]])
+    process, report = cli('tesla')
+    assert report['done'] == ['Tesla']
+    with QueryIndex(str(workdir / 'query.db')) as index:
+        assert trims(index.find(make='tesla')) == [(2024, 'Model 3', 'RWD', 39000)]
+
+
+def test_crawl_indexes_only_the_purge_scope(site, cli, workdir):
+    site(gmc=[[None, 'Sierra 1500', [['2025', 'SLE', '$50,000'], ['2024', 'Pro', '$40,000']]]])
+    process, report = cli('--purge-year', '2024', 'gmc')
+    assert report['done'] == ['GMC']
+    with QueryIndex(str(workdir / 'query.db')) as index:
+        assert trims(index.find(all_runs=True)) == [(2024, 'Sierra 1500', 'Pro', 40000)]
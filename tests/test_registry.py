@@ -0,0 +1,51 @@
+import json
+import subprocess
+import sys
+
+import pytest
+import scrapy
+
+from tests.crawl import ROOT
+from vehicle_data_tracker.registry import REGISTRY_PATH
+from vehicle_data_tracker.registry import RegistrySpiderLoader
+from vehicle_data_tracker.registry import build_registry
+from vehicle_data_tracker.registry import load_registry
+from vehicle_data_tracker.registry import spider_class
+from vehicle_data_tracker.runner import crawl_settings
+
+
+def test_registry_file_is_up_to_date():
+    with open(REGISTRY_PATH, 'r') as registry_file:
+        assert json.load(registry_file) == build_registry()
+
+
+def test_group_spiders_write_every_make_of_their_group():
+    assert build_registry()['tata']['makes'] == ['jaguar', 'land rover']
+
+
+def test_loader_resolves_spiders_and_requests():
+    loader = RegistrySpiderLoader()
+    spider = loader.load('gmc')
+    assert issubclass(spider, scrapy.Spider) and spider.name == 'gmc'
+    assert loader.find_by_request(scrapy.Request('https://www.gmc.com/trucks')) == ['gmc']
+    with pytest.raises(KeyError):
+        loader.load('acura_old')
+
+
+def test_loading_a_spider_imports_no_other_spider_module():
+    code = ('import sys\n'
+            'from vehicle_data_tracker.registry import RegistrySpiderLoader\n'
+            'RegistrySpiderLoader().load("gmc")\n'
+            'print(sorted(name for name in sys.modules if name.startswith("vehicle_data_tracker.spiders.")))')
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "['vehicle_data_tracker.spiders.gmc']"
+
+
+@pytest.mark.parametrize('name', load_registry())
+def test_spiders_keep_the_project_pipelines(name):
+    settings = crawl_settings()
+    spider_class(name).update_settings(settings)
+    pipelines = settings.getdict('ITEM_PIPELINES')
+    assert pipelines == crawl_settings().getdict('ITEM_PIPELINES')
+    assert 'vehicle_data_tracker.pipelines.ColumnarPipeline' in pipelines
+    assert 'vehicle_data_tracker.pipelines.QueryIndexPipeline' in pipelines
@@ -0,0 +1,30 @@
+from vehicle_data_tracker.query import QueryIndex
+from vehicle_data_tracker.snapshots import SnapshotLog
+
+
+def test_one_run_id_for_every_writer(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         porsche=[['2024', '911', [['Carrera', '$110,000']]]])
+    process, report = cli('gmc', 'porsche', settings={'VEHICLES_BACKEND': 'segments'})
+    run_id = report['run_id']
+    assert run_id
+    assert {result['run_id'] for result in report['spiders'].values()} == {run_id}
+    with QueryIndex(str(workdir / 'query.db')) as index:
+        assert sorted(vehicle['trim'] for vehicle in index.find(run_id=run_id)) == ['Carrera', 'SLT']
+        assert sorted(make for make, latest in index.latest_runs()) == ['GMC', 'PORSCHE']
+    assert [entry['run_id'] for entry in SnapshotLog(str(workdir / 'snapshots')).snapshots()] == [run_id]
+    assert (workdir / 'vehicles' / 'gmc' / f'{run_id}.csv').exists()
+
+
+def test_failed_spider_does_not_complete_the_run_of_other_makes(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         porsche={'pages': [['2024', '911', [['Carrera', '$110,000']]]], 'close': 'error'})
+    process, report = cli('gmc', 'porsche')
+    with QueryIndex(str(workdir / 'query.db')) as index:
+        assert index.latest_runs() == [('GMC', report['run_id'])]
+
+
+def test_snapshot_of_a_run_id_already_taken(workdir):
+    log = SnapshotLog(str(workdir / 'snapshots'))
+    assert log.record([['2024', 'GMC', 'Acadia', 'SLT', '$1']], {}, 'run1')['run_id'] == 'run1'
+    assert log.record([['2024', 'GMC', 'Acadia', 'SLT', '$2']], {}, 'run1')['run_id'] == 'run1-1'
@@ -0,0 +1,41 @@
+from tests.crawl import read_csv
+from tests.crawl import write_csv
+from vehicle_data_tracker.segments import SegmentWriter
+from vehicle_data_tracker.segments import compact
+from vehicle_data_tracker.segments import segment_paths
+from vehicle_data_tracker.utilities import PurgeScope
+
+OLD = [('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+       ('2023', 'GMC', 'Acadia', 'SLT', '$39,000'),
+       ('2024', 'Tesla', 'Model 3', 'RWD', '$39,000')]
+
+
+def write_segment(partition, run_id, rows, purged=None):
+    writer = SegmentWriter('vehicles', partition, run_id)
+    writer.carry_over('vehicles.csv', [partition], purged)
+    for row in rows:
+        writer.add(list(row))
+    writer.close()
+
+
+def test_segments_carry_over_and_compact(workdir):
+    write_csv(workdir / 'vehicles.csv', OLD)
+    (workdir / 'vehicles.csv.idx').write_bytes(b'index')
+    write_segment('gmc', 'run1', [('2024', 'GMC', 'Acadia', 'AT4', '$45,000'), OLD[0]])
+    write_segment('porsche', 'run1', [('2024', 'PORSCHE', '911', 'Carrera', '$120,000')])
+    write_segment('gmc', 'run2', [('2024', 'GMC', 'Acadia', 'Denali', '$50,000')],
+                  PurgeScope(['gmc'], '2024'))
+    assert compact('vehicles', 'vehicles.csv') == 2
+    # the rows of makes without segments first, then the latest segment of every make, merged in order
+    assert read_csv(workdir / 'vehicles.csv') == [('2024', 'Tesla', 'Model 3', 'RWD', '$39,000'),
+                                                  ('2023', 'GMC', 'Acadia', 'SLT', '$39,000'),
+                                                  ('2024', 'GMC', 'Acadia', 'Denali', '$50,000'),
+                                                  ('2024', 'PORSCHE', '911', 'Carrera', '$120,000')]
+    assert [path.split('/')[-1] for path in segment_paths('vehicles', 'gmc')] == ['run2.csv']
+    assert not (workdir / 'vehicles.csv.idx').exists()
+
+
+def test_compact_without_segments(workdir):
+    write_csv(workdir / 'vehicles.csv', OLD)
+    assert compact('vehicles', 'vehicles.csv') == 0
+    assert read_csv(workdir / 'vehicles.csv') == OLD
@@ -0,0 +1,67 @@
+import pytest
+
+from tests.crawl import read_csv
+from tests.crawl import write_csv
+from vehicle_data_tracker.runner import merge_partitions
+from vehicle_data_tracker.runner import run_sharded
+from vehicle_data_tracker.store import VehicleStore
+
+OLD = [('2024', 'GMC', 'Acadia', 'SLT', '$40,000'),
+       ('2024', 'FORD', 'F-150', 'XL', '$35,000')]
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_failed_purge_keeps_the_old_rows_only(site, cli, workdir, workers):
+    write_csv(workdir / 'vehicles.csv', OLD)
+    site(gmc=[['2024', 'Acadia', [['AT4', '$45,000']]]],
+         ford={'pages': [['2024', 'F-150', [['Lariat', '$55,000']]]], 'close': 'error'})
+    process, report = cli('--purge', '1', '--workers', workers, 'gmc', 'ford')
+    assert report['done'] == ['GMC']
+    assert report['failed'] == ['Ford']
+    assert sorted(read_csv(workdir / 'vehicles.csv')) == [('2024', 'FORD', 'F-150', 'XL', '$35,000'),
+                                                          ('2024', 'GMC', 'Acadia', 'AT4', '$45,000')]
+    assert not list(workdir.glob('vehicles.part*'))
+
+
+def test_sharded_run_without_purge_adds_new_rows(site, cli, workdir):
+    write_csv(workdir / 'vehicles.csv', OLD)
+    site(gmc=[['2024', 'Acadia', [['SLT', '$41,000'], ['AT4', '$45,000']]]],
+         ford=[['2024', 'F-150', [['Lariat', '$55,000']]]])
+    process, report = cli('--workers', '2', 'gmc', 'ford')
+    assert sorted(report['done']) == ['Ford', 'GMC']
+    assert read_csv(workdir / 'vehicles.csv') == OLD + [('2024', 'FORD', 'F-150', 'Lariat', '$55,000'),
+                                                        ('2024', 'GMC', 'Acadia', 'AT4', '$45,000')]
+    assert not list(workdir.glob('vehicles.part*'))
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_sharded_run_counts_the_vehicles_already_stored_as_dropped(site, cli, workdir, workers):
+    write_csv(workdir / 'vehicles.csv', OLD)
+    site(gmc=[['2024', 'Acadia', [['SLT', '$41,000'], ['AT4', '$45,000'], ['AT4', '$45,000']]]],
+         ford=[['2024', 'F-150', [['XL', '$35,000']]]])
+    process, report = cli('--workers', workers, 'gmc', 'ford')
+    counts = {make: (spider['items'], spider['dropped']) for make, spider in report['spiders'].items()}
+    assert counts == {'GMC': (1, 2), 'Ford': (0, 1)}
+
+
+def test_sharded_run_uses_the_backend_of_its_settings(site, workdir, monkeypatch):
+    monkeypatch.setenv('SCRAPY_SETTINGS_MODULE', 'tests.settings')
+    monkeypatch.delenv('TEST_SETTINGS', raising=False)
+    site(gmc=[['2024', 'Acadia', [['AT4', '$45,000']]]],
+         ford=[['2024', 'F-150', [['XL', '$35,000']]]])
+    results = run_sharded(['GMC', 'Ford'], 2, settings={'VEHICLES_BACKEND': 'sqlite'})
+    assert {make: result['status'] for make, result in results.items()} == {'GMC': 'done', 'Ford': 'done'}
+    with VehicleStore('vehicles.db') as store:
+        assert sorted(store.rows()) == [('2024', 'FORD', 'F-150', 'XL', '$35,000'),
+                                        ('2024', 'GMC', 'Acadia', 'AT4', '$45,000')]
+    # the workers wrote to the database, so there is nothing to merge into vehicles.csv
+    assert not list(workdir.glob('vehicles*.csv'))
+
+
+def test_merge_deletes_the_partitions_and_the_stale_indexes(workdir):
+    write_csv(workdir / 'vehicles.part0.csv', OLD)
+    (workdir / 'vehicles.part0.csv.idx').write_bytes(b'index')
+    (workdir / 'vehicles.csv.idx').write_bytes(b'index')
+    merge_partitions('vehicles.csv', ['vehicles.part0.csv', 'vehicles.part1.csv'], discarded={'ford'})
+    assert read_csv(workdir / 'vehicles.csv') == OLD[:1]
+    assert sorted(path.name for path in workdir.iterdir()) == ['vehicles.csv']
@@ -0,0 +1,51 @@
+from tests.crawl import write_csv
+from vehicle_data_tracker.snapshots import SnapshotLog
+from vehicle_data_tracker.snapshots import diff_vehicles
+
+SLE = ('2024', 'GMC', 'Sierra 1500', 'SLE')
+AT4 = ('2024', 'GMC', 'Acadia', 'AT4')
+XL = ('2024', 'Ford', 'F-150', 'XL')
+
+
+def test_deltas_between_full_checkpoints(workdir):
+    log = SnapshotLog('snapshots', full_every=3)
+    runs = [{SLE: '$48,000', XL: '$35,000'},
+            {SLE: '$49,000', XL: '$35,000', AT4: '$45,000'},
+            {SLE: '$49,000', AT4: '$45,000'},
+            {SLE: '$50,000', AT4: '$45,000'}]
+    entries = [log.record([[*key, msrp] for key, msrp in vehicles.items()], {'GMC': 'done'}, f'run{i}')
+               for i, vehicles in enumerate(runs)]
+    assert [entry['kind'] for entry in entries] == ['full', 'delta', 'delta', 'full']
+    assert [(entry['added'], entry['removed'], entry['repriced']) for entry in entries[1:3]] == [(1, 0, 1), (0, 1, 0)]
+    assert (workdir / 'snapshots' / 'run1.delta.csv').exists()
+    for i, vehicles in enumerate(runs):
+        assert log.reconstruct(f'run{i}') == vehicles
+    assert log.reconstruct() == runs[-1]
+    assert log.price_history(*SLE) == [('run0', '$48,000'), ('run1', '$49,000'), ('run2', '$49,000'),
+                                       ('run3', '$50,000')]
+    assert log.price_history(*XL)[1:] == [('run1', '$35,000'), ('run2', None), ('run3', None)]
+
+
+def test_snapshots_of_one_run_id_get_a_suffix(workdir):
+    log = SnapshotLog('snapshots')
+    log.record([[*SLE, '$48,000']], {}, 'run')
+    assert log.record([[*SLE, '$48,000']], {}, 'run')['run_id'] == 'run-1'
+    assert log.reconstruct('run-1') == {SLE: '$48,000'}
+
+
+def test_diff_vehicles():
+    assert diff_vehicles({SLE: '$48,000', XL: '$35,000'}, {SLE: '$49,000', AT4: '$45,000'}) == [
+        ['removed', *XL, '$35,000', ''],
+        ['added', *AT4, '$45,000', ''],
+        ['repriced', *SLE, '$49,000', '$48,000']]
+
+
+def test_crawl_records_a_snapshot(site, cli, workdir):
+    write_csv(workdir / 'vehicles.csv', [('2024', 'GMC', 'Acadia', 'SLT', '$40,000')])
+    site(gmc=[['2024', 'Acadia', [['AT4', '$45,000']]]])
+    process, report = cli('gmc', settings={'SNAPSHOT_FULL_EVERY': 1})
+    log = SnapshotLog(str(workdir / 'snapshots'))
+    [entry] = log.snapshots()
+    assert entry['run_id'] == report['run_id']
+    assert entry['makes'] == {'GMC': 'done'}
+    assert log.reconstruct() == {('2024', 'GMC', 'Acadia', 'SLT'): '$40,000', AT4: '$45,000'}
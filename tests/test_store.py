@@ -0,0 +1,45 @@
+from tests.crawl import read_csv
+from tests.crawl import write_csv
+from vehicle_data_tracker.store import VehicleStore
+
+OLD = [['2024', 'GMC', 'Acadia', 'SLT', '$40,000'],
+       ['2023', 'GMC', 'Acadia', 'SLT', '$39,000'],
+       ['2024', 'Ford', 'F-150', 'XL', '$35,000']]
+
+
+def test_generation_is_only_visible_once_committed(workdir):
+    with VehicleStore('vehicles.db') as store:
+        assert store.upsert(OLD) == 3
+        generations = store.begin_generation(['gmc'])
+        assert generations == {'gmc': 1}
+        assert store.add_many([['2024', 'GMC', 'Acadia', 'AT4', '$45,000', 1]]) == 1
+        assert sorted(store.rows()) == sorted(map(tuple, OLD))
+        store.commit_generation(generations)
+        assert sorted(store.rows()) == [('2024', 'Ford', 'F-150', 'XL', '$35,000'),
+                                        ('2024', 'GMC', 'Acadia', 'AT4', '$45,000')]
+        assert store.collect() == 2
+        assert store.connection.execute('SELECT COUNT(*) FROM vehicles').fetchone()[0] == 2
+
+
+def test_scoped_commit_keeps_the_vehicles_outside_the_scope(workdir):
+    with VehicleStore('vehicles.db') as store:
+        store.upsert(OLD)
+        generations = store.begin_generation(['GMC'])
+        store.add_many([['2024', 'GMC', 'Acadia', 'Denali', '$50,000', generations['GMC']]])
+        assert store.commit_scoped(generations, '2024', 'acadia') == 1
+        assert sorted(store.rows()) == [('2023', 'GMC', 'Acadia', 'SLT', '$39,000'),
+                                        ('2024', 'Ford', 'F-150', 'XL', '$35,000'),
+                                        ('2024', 'GMC', 'Acadia', 'Denali', '$50,000')]
+
+
+def test_upsert_updates_the_msrp_and_export_round_trips(workdir):
+    with VehicleStore('vehicles.db') as store:
+        store.upsert(OLD)
+        store.upsert([['2024', 'Ford', 'F-150', 'XL', '$36,000']])
+        assert store.contains(['2024', 'Ford', 'F-150', 'XL', '', 0])
+        assert store.export_csv('vehicles.csv') == 3
+    assert read_csv(workdir / 'vehicles.csv')[2] == ('2024', 'Ford', 'F-150', 'XL', '$36,000')
+    write_csv(workdir / 'more.csv', [('2025', 'Ford', 'F-150', 'XL', '$37,000')])
+    with VehicleStore('vehicles.db') as store:
+        assert store.import_csv('more.csv') == 1
+        assert len(list(store.rows())) == 4
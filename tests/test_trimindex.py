@@ -0,0 +1,148 @@
+import pytest
+
+from tests.crawl import read_csv
+from tests.crawl import write_csv
+from vehicle_data_tracker import trimindex
+from vehicle_data_tracker.trimindex import TrimIndex
+from vehicle_data_tracker.trimindex import TrimSet
+from vehicle_data_tracker.trimindex import index_path
+from vehicle_data_tracker.trimindex import open_index
+from vehicle_data_tracker.trimindex import refresh_index
+from vehicle_data_tracker.trimindex import release_index
+from vehicle_data_tracker.utilities import trim_id
+
+IDS = [trim_id('2024', f'Make{i % 7}', f'Model{i % 13}', f'Trim {i}') for i in range(3000)]
+
+
+def test_bulk_update_matches_adding_one_by_one(monkeypatch):
+    monkeypatch.setattr(trimindex, 'HASH_BATCH', 100)
+    one_by_one = TrimSet()
+    for trim in IDS[:500]:
+        one_by_one.add(trim)
+    bulk = TrimSet(IDS[:500])
+    assert bulk.table == one_by_one.table
+    assert bulk.keys == one_by_one.keys
+    # more ids than the table has room for, some of them in it already or given twice
+    bulk.update(IDS[250:] + IDS[:10])
+    assert len(bulk) == len(IDS)
+    assert all(trim in bulk for trim in IDS)
+    assert trim_id('2024', 'Make0', 'Model0', 'Trim 3000') not in bulk
+    assert len(bulk) <= bulk.capacity * trimindex.MAX_LOAD
+
+
+def test_discard_after_bulk_update():
+    trims = TrimSet(IDS)
+    trims.difference_update(IDS[::2])
+    assert len(trims) == len(IDS) // 2
+    assert not any(trim in trims for trim in IDS[::2])
+    assert all(trim in trims for trim in IDS[1::2])
+
+
+def test_lengths_keep_trims_apart():
+    assert len(TrimSet([trim_id('2024', 'BMW', 'X', '5 M'), trim_id('2024', 'BMW', 'X5', ' M')])) == 2
+
+
+def test_trims_with_the_same_hash_are_told_apart(workdir, monkeypatch):
+    # every trim id gets the same hash, so only comparing the trim ids themselves keeps them apart
+    monkeypatch.setattr(trimindex, 'trim_digest', lambda key: b'\1' + bytes(7))
+    one_by_one = TrimSet()
+    for trim in IDS[:100]:
+        assert one_by_one.add(trim)
+    assert IDS[0] in one_by_one and IDS[100] not in one_by_one
+    bulk = TrimSet(IDS[:100] + IDS[:10])
+    assert len(bulk) == 100
+    assert IDS[99] in bulk and IDS[100] not in bulk
+    bulk.difference_update(IDS[:50])
+    assert len(bulk) == 50
+    assert IDS[0] not in bulk and IDS[50] in bulk
+    index = TrimIndex('vehicles.csv.idx')
+    assert all(index.add(trim) for trim in IDS[:100])
+    assert not index.add(IDS[0])
+    assert IDS[0] in index and IDS[100] not in index
+    index.close()
+
+
+def test_index_grows_its_key_area(workdir):
+    index = TrimIndex('vehicles.csv.idx')
+    long_ids = [trim_id('2024', 'Make', f'Model {i}', 'Trim' * 100) for i in range(500)]
+    assert all(index.add(trim) for trim in long_ids)
+    assert index.keys_capacity > trimindex.MIN_KEYS
+    index.close()
+    reopened = TrimIndex('vehicles.csv.idx')
+    assert len(reopened) == 500
+    assert all(trim in reopened for trim in long_ids)
+    reopened.close()
+
+
+def test_rebuilt_index_has_every_trim(workdir):
+    write_csv(workdir / 'vehicles.csv', [('2024', f'Make{i % 7}', f'Model{i % 13}', f'Trim {i}', '$1')
+                                         for i in range(3000)])
+    index = open_index('vehicles.csv')
+    assert len(index) == len(IDS)
+    assert all(trim in index for trim in IDS)
+    assert index.add(trim_id('2025', 'Make0', 'Model0', 'Trim 0'))
+    release_index('vehicles.csv')
+    reopened = TrimIndex(index_path('vehicles.csv'))
+    assert len(reopened) == len(IDS) + 1
+    assert trim_id('2025', 'Make0', 'Model0', 'Trim 0') in reopened
+    reopened.close()
+
+
+def test_index_is_rebuilt_when_the_file_changed(workdir):
+    write_csv(workdir / 'vehicles.csv', [('2024', 'GMC', 'Acadia', 'SLT', '$1')])
+    open_index('vehicles.csv')
+    release_index('vehicles.csv')
+    write_csv(workdir / 'vehicles.csv', [('2024', 'GMC', 'Sierra', 'SLE', '$1'),
+                                         ('2024', 'GMC', 'Sierra', 'AT4', '$1')])
+    index = open_index('vehicles.csv')
+    assert len(index) == 2
+    assert trim_id('2024', 'GMC', 'Acadia', 'SLT') not in index
+    release_index('vehicles.csv')
+
+
+@pytest.mark.parametrize('rows', [0, 1])
+def test_index_of_a_small_file(workdir, rows):
+    write_csv(workdir / 'vehicles.csv', [('2024', 'GMC', 'Acadia', 'SLT', '$1')][:rows])
+    assert len(open_index('vehicles.csv')) == rows
+    release_index('vehicles.csv')
+
+
+def test_index_of_a_rewritten_file_of_the_same_size_is_not_used(workdir):
+    write_csv(workdir / 'vehicles.csv', [('2024', 'GMC', 'Acadia', 'SLT', '$1')])
+    open_index('vehicles.csv')
+    release_index('vehicles.csv')
+    write_csv(workdir / 'vehicles.csv', [('2024', 'GMC', 'Acadia', 'AT4', '$1')])
+    refresh_index('vehicles.csv')
+    index = open_index('vehicles.csv')
+    assert trim_id('2024', 'GMC', 'Acadia', 'AT4') in index
+    assert trim_id('2024', 'GMC', 'Acadia', 'SLT') not in index
+    release_index('vehicles.csv')
+
+
+def check_index_matches(workdir):
+    """
+    Checks that the index of vehicles.csv was left in step with it, holding the trim of every row.
+    """
+    rows = read_csv(workdir / 'vehicles.csv')
+    index = TrimIndex(str(workdir / index_path('vehicles.csv')))
+    assert index.source_size == (workdir / 'vehicles.csv').stat().st_size
+    assert len(index) == len(rows)
+    assert all(trim_id(*row[:4]) in index for row in rows)
+    index.close()
+
+
+def test_crawls_keep_the_index_in_step(site, cli, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000'], ['AT4', '$45,000']]]])
+    cli('gmc')
+    check_index_matches(workdir)
+    site(gmc=[['2024', 'Acadia', [['AT4', '$46,000'], ['Denali', '$50,000']]]])
+    cli('gmc')
+    assert [row[3] for row in read_csv(workdir / 'vehicles.csv')] == ['SLT', 'AT4', 'Denali']
+    check_index_matches(workdir)
+    site(gmc=[['2024', 'Acadia', [['Denali', '$51,000']]]])
+    cli('--purge', '1', 'gmc')
+    assert read_csv(workdir / 'vehicles.csv') == [('2024', 'GMC', 'Acadia', 'Denali', '$51,000')]
+    # the purge rewrote the file, so the index is left for the next crawl to rebuild
+    assert not (workdir / index_path('vehicles.csv')).exists()
+    cli('gmc')
+    check_index_matches(workdir)
@@ -0,0 +1,84 @@
+import json
+import time
+
+import pytest
+
+from tests.crawl import read_csv
+from vehicle_data_tracker.workers import WorkerPool
+
+JOB = {'checkpointed': False, 'record': False, 'compact': False}
+
+
+@pytest.fixture
+def pool(workdir, monkeypatch):
+    """
+    Returns a function that starts a WorkerPool whose workers crawl the fake spiders of crawl.py with the given
+    settings, and closes the pools it started once the test is over.
+    """
+    pools = []
+
+    def start(size=1, max_jobs=10, **settings):
+        monkeypatch.setenv('SCRAPY_SETTINGS_MODULE', 'tests.settings')
+        monkeypatch.setenv('TEST_SETTINGS', json.dumps(settings))
+        pools.append(WorkerPool(size, max_jobs, interval=0.1))
+        return pools[-1]
+
+    yield start
+    for started in pools:
+        started.close()
+
+
+def test_make_added_to_a_running_job_is_crawled_by_it(site, pool, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         ford=[['2024', 'F-150', [['XL', '$35,000']]]])
+    workers = pool()
+    future = workers.submit(['GMC'], max_spiders=1, **JOB)
+    workers.add(future, 'Ford')
+    results = future.result(timeout=120)
+    assert {make: result['status'] for make, result in results.items()} == {'GMC': 'done', 'Ford': 'done'}
+    assert len({result['run_id'] for result in results.values()}) == 1
+    assert sorted(row[3] for row in read_csv(workdir / 'vehicles.csv')) == ['SLT', 'XL']
+
+
+def test_make_added_to_a_finished_job_is_left_out(site, pool, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         ford=[['2024', 'F-150', [['XL', '$35,000']]]])
+    workers = pool()
+    future = workers.submit(['GMC'], **JOB)
+    future.result(timeout=120)
+    workers.add(future, 'Ford')
+    # the worker takes the next job as usual
+    assert list(workers.submit(['Ford'], **JOB).result(timeout=120)) == ['Ford']
+    assert list(future.result()) == ['GMC']
+
+
+def test_cancelled_make_is_skipped(site, pool, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]],
+         ford=[['2024', 'F-150', [['XL', '$35,000']]]])
+    workers = pool()
+    future = workers.submit(['GMC', 'Ford'], max_spiders=1, **JOB)
+    workers.cancel(future, 'Ford')
+    results = future.result(timeout=120)
+    assert results['GMC']['status'] == 'done'
+    assert results['Ford']['finish_reason'] == 'cancelled'
+    assert [row[3] for row in read_csv(workdir / 'vehicles.csv')] == ['SLT']
+
+
+def test_worker_is_replaced_after_max_jobs(site, pool, workdir):
+    site(gmc=[['2024', 'Acadia', [['SLT', '$40,000']]]])
+    workers = pool(max_jobs=1)
+    for _ in range(2):
+        assert workers.submit(['GMC'], **JOB).result(timeout=120)['GMC']['status'] == 'done'
+
+
+def test_progress_is_reported_every_interval(site, pool, workdir):
+    site(gmc=[['2024', f'Model {i}', [['Base', '$30,000']]] for i in range(6)])
+    workers = pool(DOWNLOAD_DELAY=0.2, RANDOMIZE_DOWNLOAD_DELAY=False, CONCURRENT_REQUESTS=1)
+    reported = []
+    future = workers.submit(['GMC'], on_progress=lambda totals: reported.append((time.monotonic(), totals)), **JOB)
+    assert future.result(timeout=120)['GMC']['items'] == 6
+    assert len(reported) >= 5
+    # the pool's interval is 0.1 seconds; reports may come late, but never early
+    times = [when for when, totals in reported]
+    assert min(later - earlier for earlier, later in zip(times, times[1:])) >= 0.05
+    assert all(totals['items'] <= 6 and totals['dropped'] == 0 for when, totals in reported)
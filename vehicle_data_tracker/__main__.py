@@ -0,0 +1,161 @@
+"""
+Headless command-line entry point, for running crawls without the app (e.g. from cron).
+
+To run from console, enter:
+
+python -m vehicle_data_tracker [--purge 0|1] [--purge-year YEAR [--purge-model MODEL]] [--concurrency N] [--workers N]
+                               [--output FILE] [--report FILE] [--progress] [--time-budget SECONDS]
+                               [--request-budget N] (all | make [make ...])
+
+or, to resume a run that was interrupted:
+
+python -m vehicle_data_tracker --resume [options]
+
+or, to keep running and re-crawl makes whenever their data goes stale (see daemon.py):
+
+python -m vehicle_data_tracker --daemon [--purge 0|1] [--purge-year YEAR [--purge-model MODEL]] [--interval SECONDS]
+                               [all | make [make ...]]
+
+With --purge-year, the crawl is narrowed down to the vehicles of that model year, and with --purge-model as well, to
+those of that model of the year (see utilities.PurgeScope). A purge then only replaces the vehicles in the scope, e.g.
+"--purge 1 --purge-year 2024 --purge-model Sierra gmc" re-scrapes the 2024 GMC Sierra and keeps every other GMC.
+
+When the crawl is over, a JSON report is written with the run id (which the query index, Parquet files and snapshot of
+the run are recorded under as well) and the wall time, request count, item count and drop count of each spider, for
+tracking crawl performance across releases. The duration and request count of each spider are also added to the crawl
+history, which is used to schedule the longest spiders first (see history.py), and a snapshot of the vehicles is
+recorded (see snapshots.py).
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+
+from vehicle_data_tracker.checkpoints import RunCheckpoint
+from vehicle_data_tracker.daemon import RefreshDaemon
+from vehicle_data_tracker.history import record_runs
+from vehicle_data_tracker.runner import crawl_settings
+from vehicle_data_tracker.runner import record_snapshot
+from vehicle_data_tracker.runner import resolve_makes
+from vehicle_data_tracker.runner import results_run_id
+from vehicle_data_tracker.runner import run_crawl
+from vehicle_data_tracker.runner import run_sharded
+
+
+def build_report(results: dict, started: datetime.datetime, seconds: float, args):
+    """
+    Builds the JSON-serializable run report from the results of a crawl.
+
+    :param results: a dict mapping each make to its crawl_result
+    :param started: when the run started
+    :param seconds: wall time of the whole run
+    :param args: the parsed command-line arguments
+    """
+    totals = {'requests': 0, 'items': 0, 'dropped': 0}
+    for result in results.values():
+        for key in totals:
+            totals[key] += result[key]
+    statuses = {'done': [], 'partial': [], 'failed': []}
+    for make, result in results.items():
+        statuses[result['status']].append(make)
+    return {'run_id': results_run_id(results),
+            'started': started.isoformat(timespec='seconds'),
+            'seconds': round(seconds, 3),
+            'purge': bool(args.purge),
+            'purge_year': args.purge_year,
+            'purge_model': args.purge_model,
+            'concurrency': args.concurrency,
+            'workers': args.workers,
+            'output': args.output,
+            'totals': totals,
+            'done': statuses['done'],
+            'partial': statuses['partial'],
+            'failed': statuses['failed'],
+            'spiders': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker',
+                                     description='Crawl the websites of the given makes for vehicle data.')
+    parser.add_argument('makes', nargs='*', help='make names or spider names, or "all"')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume the last run if it was interrupted, instead of crawling the given makes')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running, re-crawling the given makes (all by default) whenever they are stale')
+    parser.add_argument('--interval', type=int, default=None,
+                        help='with --daemon, seconds between checks for stale makes, default DAEMON_INTERVAL')
+    parser.add_argument('--purge', type=int, choices=(0, 1), default=0,
+                        help='1 to remove old entries of the crawled makes, 0 to check for duplicates instead')
+    parser.add_argument('--purge-year', default=None,
+                        help='only crawl, and with --purge 1 only replace, the vehicles of this model year')
+    parser.add_argument('--purge-model', default=None,
+                        help='with --purge-year, only crawl and replace the vehicles of this model of the year')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='maximum number of spiders running at once (in each worker), default CONCURRENT_SPIDERS')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes to split the makes across')
+    parser.add_argument('--output', default=None, help='csv file to write vehicles to, default VEHICLES_OUTPUT')
+    parser.add_argument('--report', default='crawl_report.json', help='file to write the JSON run report to')
+    parser.add_argument('--progress', action='store_true',
+                        help='print a JSON progress line for each spider every PROGRESS_INTERVAL seconds')
+    parser.add_argument('--time-budget', type=int, default=None,
+                        help='default wall-clock budget of each spider in seconds (0 for none), see SPIDER_BUDGET')
+    parser.add_argument('--request-budget', type=int, default=None,
+                        help='default request budget of each spider (0 for none), see SPIDER_BUDGET')
+    args = parser.parse_args(argv)
+    if args.purge_model and not args.purge_year:
+        parser.error('--purge-model needs --purge-year')
+    scope = {'PURGE_YEAR': args.purge_year, 'PURGE_MODEL': args.purge_model}
+    if args.daemon:
+        try:
+            makes = resolve_makes(args.makes or ['all'])
+        except ValueError as e:
+            parser.error(str(e))
+        RefreshDaemon(makes, crawl_settings(VEHICLES_OUTPUT=args.output, **scope), purge=args.purge,
+                      interval=args.interval).run()
+        return 0
+
+    checkpoint = RunCheckpoint(crawl_settings().get('CHECKPOINT_DIR') or '')
+    if args.resume and checkpoint.directory and checkpoint.load():
+        makes = checkpoint.pending()
+        print(f'resuming the last run: {", ".join(makes)}')
+        if args.workers > 1:
+            parser.error('an interrupted run can only be resumed with one worker')
+    elif args.makes:
+        try:
+            makes = resolve_makes(args.makes)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        parser.error('no makes given' + (' and no interrupted run to resume' if args.resume else ''))
+
+    settings = {name: value for name, value in scope.items() if value}
+    if args.progress:
+        settings['PROGRESS_ENABLED'] = True
+    budget = crawl_settings().getdict('SPIDER_BUDGET')
+    if args.time_budget is not None:
+        settings['SPIDER_BUDGET'] = budget = dict(budget, seconds=args.time_budget)
+    if args.request_budget is not None:
+        settings['SPIDER_BUDGET'] = dict(budget, requests=args.request_budget)
+    started = datetime.datetime.now()
+    start = time.monotonic()
+    if args.workers > 1:
+        results = run_sharded(makes, args.workers, purge=args.purge, max_spiders=args.concurrency, output=args.output,
+                              settings=settings)
+    else:
+        results = run_crawl(makes, purge=args.purge, max_spiders=args.concurrency, output=args.output,
+                            settings=settings, resume=args.resume)
+    report = build_report(results, started, time.monotonic() - start, args)
+    record_runs(crawl_settings().get('CRAWL_HISTORY'), results)
+    record_snapshot(crawl_settings(VEHICLES_OUTPUT=args.output), results)
+
+    with open(args.report, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    for make, result in results.items():
+        print(f'{make} {result["status"]}: {result["items"]} items, {result["dropped"]} dropped, '
+              f'{result["requests"]} requests in {result["seconds"]}s ({result["finish_reason"]})')
+    return 0 if len(results) == len(makes) and not report['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+A compressed archive of the vehicles of every finished run, for keeping the full data of each run at a fraction of the
+size of a csv file per run.
+
+The archive (ARCHIVE_FILE) is a gzip file of csv rows (run id, then the STANDARD_FIELDS, without a header), written
+as a series of independent gzip members, or blocks. Each block holds up to BLOCK_ROWS rows of a single run and make,
+sorted by year, model and trim, so the make, model and trim strings that repeat from row to row compress well. Since
+a series of gzip members is itself a valid gzip file, the archive can also be read whole with any gzip tool (e.g.
+zcat). An archive whose name ends with .zst is written as a series of zstd frames instead, which is just as valid a
+zstd file (e.g. for zstdcat), and smaller and faster to write. That needs Python 3.14's compression.zstd, or the
+backports.zstd package on older versions.
+
+Next to it, the block index (ARCHIVE_FILE + '.idx') has a JSON line per block with its run id, make, codec, offset,
+length and row count. ArchiveReader reads the index, seeks straight to the blocks of the run(s) and make(s) asked for,
+and only decompresses those, a block at a time. Blocks are appended to the archive before their index lines, so a run
+interrupted halfway leaves nothing in the index, only unused bytes at the end of the archive.
+
+If ARCHIVE_FILE is set (it is empty by default, since the snapshots of snapshots.py hold the same vehicles), the
+snapshot recorded by runner.record_snapshot after every run is archived as well. To archive a csv file or the snapshots
+that are not archived yet, read from the archive, or see the compression ratio and read throughput on generated data,
+enter:
+
+python -m vehicle_data_tracker.archive add [--input FILE] [--archive FILE]
+python -m vehicle_data_tracker.archive snapshots [--archive FILE]
+python -m vehicle_data_tracker.archive read [--run RUN_ID] [--make MAKE] [--archive FILE]
+python -m vehicle_data_tracker.archive bench ROWS [ROWS ...] [--runs N]
+
+The archive defaults to the ARCHIVE_FILE setting, or archive.csv.gz if it is empty, and the input file to
+VEHICLES_OUTPUT.
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+
+BLOCK_ROWS = 5000
+ARCHIVE_FIELDS = ['run_id'] + STANDARD_FIELDS
+
+
+def index_path(archive_file: str):
+    return archive_file + '.idx'
+
+
+def codec(archive_file: str):
+    """
+    Returns the codec the blocks of ``archive_file`` are compressed with: 'zstd' if its name ends with .zst, and 'gzip'
+    otherwise.
+    """
+    return 'zstd' if archive_file.endswith('.zst') else 'gzip'
+
+
+def _require(block_codec: str):
+    if block_codec == 'zstd' and zstd is None:
+        raise RuntimeError('zstd archives require Python 3.14 or the backports.zstd package (pip install '
+                           'backports.zstd)')
+
+
+def compress(data: bytes, block_codec: str, level: int = None):
+    """
+    Compresses a block with ``block_codec``, at ``level`` (default 9 for gzip and 12 for zstd).
+    """
+    _require(block_codec)
+    if block_codec == 'zstd':
+        return zstd.compress(data, level=level or 12)
+    return gzip.compress(data, compresslevel=level or 9, mtime=0)
+
+
+def decompress(data: bytes, block_codec: str):
+    _require(block_codec)
+    if block_codec == 'zstd':
+        return zstd.decompress(data)
+    return gzip.decompress(data)
+
+
+class Archive:
+    """
+    The archive in ``path``, which is created when the first run is added. Its blocks are compressed with the codec of
+    its name (see codec), at ``level``.
+    """
+    def __init__(self, path: str, level: int = None):
+        self.path = path
+        self.codec = codec(path)
+        self.level = level
+
+    def blocks(self):
+        """
+        Returns the index entries of every block, in the order they were written: dicts with the run id, timestamp,
+        make, offset, length, row count and codec of the block.
+        """
+        try:
+            with open(index_path(self.path), 'r') as index_file:
+                return [json.loads(line) for line in index_file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def runs(self):
+        """
+        Returns the run ids in the archive, oldest first.
+        """
+        return list(dict.fromkeys(block['run_id'] for block in self.blocks()))
+
+    def add_run(self, run_id: str, rows, timestamp: str = None):
+        """
+        Archives the vehicles of a run. Nothing is written if there are none, so an archive is only created once
+        there is something in it.
+
+        :param rows: lists of values in STANDARD_FIELDS order
+        :param timestamp: when the run finished, as an ISO timestamp, default now
+        :return: the number of vehicles archived
+        """
+        timestamp = timestamp or datetime.datetime.now().isoformat(timespec='seconds')
+        rows = sorted((row[:len(STANDARD_FIELDS)] for row in rows), key=lambda row: (row[1], row[0], row[2], row[3]))
+        if not rows:
+            return 0
+        _require(self.codec)
+        entries = []
+        with open(self.path, 'ab') as archive:
+            offset = archive.seek(0, os.SEEK_END)
+            for make, make_rows in itertools.groupby(rows, key=lambda row: row[1]):
+                make_rows = list(make_rows)
+                for start in range(0, len(make_rows), BLOCK_ROWS):
+                    block_rows = make_rows[start:start + BLOCK_ROWS]
+                    text = io.StringIO()
+                    csv.writer(text).writerows([run_id] + row for row in block_rows)
+                    block = compress(text.getvalue().encode('utf-8'), self.codec, self.level)
+                    archive.write(block)
+                    entries.append({'run_id': run_id, 'timestamp': timestamp, 'make': make, 'offset': offset,
+                                    'length': len(block), 'rows': len(block_rows), 'codec': self.codec})
+                    offset += len(block)
+            archive.flush()
+            os.fsync(archive.fileno())
+        with open(index_path(self.path), 'a') as index_file:
+            for entry in entries:
+                index_file.write(json.dumps(entry) + '\n')
+        return len(rows)
+
+    def archive_snapshots(self, log):
+        """
+        Archives every snapshot of ``log`` (a snapshots.SnapshotLog) that is not archived yet, each as a run with the
+        run id and timestamp of the snapshot. The snapshots are replayed once, in order.
+
+        :return: the run ids of the snapshots archived
+        """
+        archived = set(self.runs())
+        added = []
+        vehicles = {}
+        for entry in log.snapshots():
+            log.replay(entry, vehicles)
+            if entry['run_id'] not in archived:
+                self.add_run(entry['run_id'], (list(key) + [msrp] for key, msrp in vehicles.items()),
+                             entry['timestamp'])
+                added.append(entry['run_id'])
+        return added
+
+
+class ArchiveReader:
+    """
+    Reads vehicles from the archive in ``path``, decompressing only the blocks that are asked for.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.index = Archive(path).blocks()
+
+    def vehicles(self, run_id: str = None, make: str = None):
+        """
+        Yields the vehicles of ``run_id`` (every run if None) and ``make`` (matched case-insensitively, every make if
+        None) as dicts with the ARCHIVE_FIELDS, run by run and, within a run, sorted by make, year, model and trim.
+        """
+        blocks = [block for block in self.index
+                  if (run_id is None or block['run_id'] == run_id)
+                  and (make is None or block['make'].lower() == make.lower())]
+        if not blocks:
+            return
+        with open(self.path, 'rb') as archive:
+            for block in blocks:
+                archive.seek(block['offset'])
+                # blocks indexed before zstd support have no codec, and are gzip members
+                text = decompress(archive.read(block['length']), block.get('codec', 'gzip')).decode('utf-8')
+                for row in csv.reader(io.StringIO(text)):
+                    yield dict(zip(ARCHIVE_FIELDS, row))
+
+
+def benchmark(rows: int, runs: int, directory: str, block_codec: str = 'gzip'):
+    """
+    Archives ``runs`` runs of a generated catalog of ``rows`` vehicles, each with a few prices changed, in an archive
+    compressed with ``block_codec``, and prints the size of the archive against that of a csv file per run, and how
+    fast the archive is read whole, a run at a time, and a make of a run at a time.
+    """
+    archive_file = os.path.join(directory, f'archive_{rows}.csv.' + ('zst' if block_codec == 'zstd' else 'gz'))
+    for path in (archive_file, index_path(archive_file)):
+        if os.path.exists(path):
+            os.remove(path)
+    catalog = [[str(2015 + i % 10), f'Make{i % 40}', f'Model {i % 1000 // 40}', f'Trim {i // 1000} Package',
+                f'${30000 + i % 50000:,}'] for i in range(rows)]
+    archive = Archive(archive_file)
+    csv_bytes = 0
+    start = time.perf_counter()
+    for run in range(runs):
+        for row in catalog[run::97]:
+            row[4] = f'${30000 + (run * 7919) % 50000:,}'
+        text = io.StringIO()
+        csv.writer(text).writerows([STANDARD_FIELDS] + catalog)
+        csv_bytes += len(text.getvalue().encode('utf-8'))
+        archive.add_run(f'run{run:04d}', catalog)
+    write_time = time.perf_counter() - start
+    archive_bytes = os.path.getsize(archive_file)
+
+    reader = ArchiveReader(archive_file)
+    start = time.perf_counter()
+    count = sum(1 for _ in reader.vehicles())
+    read_time = time.perf_counter() - start
+    start = time.perf_counter()
+    run_count = sum(1 for _ in reader.vehicles(run_id=f'run{runs // 2:04d}'))
+    run_time = time.perf_counter() - start
+    start = time.perf_counter()
+    make_count = sum(1 for _ in reader.vehicles(run_id=f'run{runs // 2:04d}', make='Make7'))
+    make_time = time.perf_counter() - start
+    print(f'{block_codec:<4} {rows:>10,} rows x {runs} runs: csv {csv_bytes / 2 ** 20:.1f} MiB, '
+          f'archive {archive_bytes / 2 ** 20:.1f} MiB (ratio {csv_bytes / archive_bytes:.1f}x), '
+          f'written in {write_time:.2f}s | read all {count:,} rows in '
+          f'{read_time:.2f}s ({count / read_time:,.0f} rows/s, {csv_bytes / read_time / 2 ** 20:.1f} MiB/s of csv), '
+          f'one run ({run_count:,} rows) {run_time * 1000:.1f}ms, one make of one run ({make_count:,} rows) '
+          f'{make_time * 1000:.1f}ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.archive',
+                                     description='Archive the vehicles of past runs, or read them back.')
+    parser.add_argument('command', choices=('add', 'snapshots', 'read', 'bench'))
+    parser.add_argument('rows', type=int, nargs='*', help='for bench, numbers of rows to benchmark with')
+    parser.add_argument('--archive', default=None, help='the archive, default ARCHIVE_FILE')
+    parser.add_argument('--input', default=None, help='csv file to add, default VEHICLES_OUTPUT')
+    parser.add_argument('--run', default=None, help='only read this run')
+    parser.add_argument('--make', default=None, help='only read this make')
+    parser.add_argument('--runs', type=int, default=10, help='for bench, runs to archive, default 10')
+    args = parser.parse_args(argv)
+    if args.command == 'bench':
+        if not args.rows:
+            parser.error('bench takes one or more numbers of rows')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for count in args.rows:
+                for block_codec in ('gzip', 'zstd') if zstd is not None else ('gzip',):
+                    benchmark(count, args.runs, temp_dir, block_codec)
+        return 0
+
+    # imported here, so that reading the archive does not depend on Scrapy
+    from vehicle_data_tracker.diff import read_rows
+    from vehicle_data_tracker.runner import crawl_settings
+    from vehicle_data_tracker.segments import new_run_id
+    from vehicle_data_tracker.snapshots import SnapshotLog
+
+    settings = crawl_settings()
+    archive_file = args.archive or settings.get('ARCHIVE_FILE') or 'archive.csv.gz'
+    if args.command == 'add':
+        run_id = new_run_id()
+        count = Archive(archive_file).add_run(run_id, read_rows(args.input or settings.get('VEHICLES_OUTPUT')))
+        print(f'{count} vehicles archived as run {run_id}')
+    elif args.command == 'snapshots':
+        log = SnapshotLog(settings.get('SNAPSHOT_DIR'), settings.getint('SNAPSHOT_FULL_EVERY'))
+        print(f'{len(Archive(archive_file).archive_snapshots(log))} snapshots archived')
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(ARCHIVE_FIELDS)
+        for vehicle in ArchiveReader(archive_file).vehicles(args.run, args.make):
+            writer.writerow(vehicle[field] for field in ARCHIVE_FIELDS)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
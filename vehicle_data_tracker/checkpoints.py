@@ -0,0 +1,97 @@
+"""
+On-disk checkpoints of multi-make runs, so that a run interrupted by closing the app or rebooting can be resumed
+instead of started over.
+
+Each spider of a checkpointed run crawls with its own JOBDIR (CHECKPOINT_DIR/<spider name>), where Scrapy keeps the
+spider's pending requests, the requests it has already seen and the spider's state. On top of that, CHECKPOINT_DIR/
+run.json records which makes the run was for, whether it was a purge (and its year and model, if it was narrowed down
+to them, see utilities.PurgeScope), and which makes have started and finished.
+
+When a run is resumed, only the makes that have not finished are crawled, each picking up from its JOBDIR. In a purge
+run, the spiders crawl without a JOBDIR, and the makes that had already started are crawled again from the start:
+a purge is only committed once its spider finishes (see DuplicatePipeline.spider_closed), so the rows an interrupted
+one found were thrown away, and the make still has its old rows.
+"""
+import json
+import os
+import shutil
+
+
+class RunCheckpoint:
+    """
+    The checkpoint of a multi-make run, stored in ``directory``.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, 'run.json')
+        self.state = None
+
+    def start(self, makes: list, purge: bool, purge_year: str = '', purge_model: str = ''):
+        """
+        Starts a new checkpoint for a run of ``makes``, discarding any previous one.
+        """
+        self.clear()
+        self.state = {'makes': list(makes), 'purge': bool(purge), 'purge_year': purge_year or '',
+                      'purge_model': purge_model or '', 'started': [], 'finished': []}
+        self.save()
+
+    def load(self):
+        """
+        Loads the checkpoint of an unfinished run.
+
+        :return: True if there was one, False otherwise
+        """
+        try:
+            with open(self.path, 'r') as run_file:
+                self.state = json.load(run_file)
+            return True
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as run_file:
+            json.dump(self.state, run_file, indent=2)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        self.state = None
+
+    def pending(self):
+        """
+        Returns the makes of the run that have not finished yet, in their original order.
+        """
+        return [make for make in self.state['makes'] if make not in self.state['finished']]
+
+    def jobdir(self, spider_name: str):
+        """
+        Returns the JOBDIR for the given spider.
+        """
+        return os.path.join(self.directory, spider_name)
+
+    def purge(self, make: str):
+        """
+        Returns whether the spider of ``make`` should purge, which is the case for every make of a purge run, whether
+        it had started before the run was interrupted or not. Such a spider does not get a JOBDIR.
+        """
+        return self.state['purge']
+
+    def mark_started(self, make: str):
+        if make not in self.state['started']:
+            self.state['started'].append(make)
+            self.save()
+
+    def mark_finished(self, make: str, spider_name: str):
+        """
+        Records that ``make`` is finished and deletes its JOBDIR. Once every make is finished, the whole checkpoint is
+        deleted.
+        """
+        self.state['finished'].append(make)
+        shutil.rmtree(self.jobdir(spider_name), ignore_errors=True)
+        if self.pending():
+            self.save()
+        else:
+            self.clear()
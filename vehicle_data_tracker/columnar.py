@@ -0,0 +1,237 @@
+"""
+A columnar copy of the vehicle data, in Parquet files that dataframe libraries can load without parsing strings.
+
+The files are a Hive-partitioned dataset, COLUMNAR_DIR/make=<make>/run_date=<YYYY-MM-DD>/<run id>-<n>.parquet, with a
+file per make per run. In the files, the year is an int16 and the msrp an int32 (in dollars, null if unknown), and the
+model, trim and run id are dictionary-encoded, since the same strings repeat on many rows. The rows of a file are sorted
+by year and model, and split into row groups of at most ROW_GROUP_ROWS rows, each with min/max statistics. Reading a
+single make only opens the files under its directory, and a year range filter skips the row groups whose years are
+all outside it:
+
+read_vehicles('columnar', make='Ford', years=(2022, 2024))
+
+or, with pandas:
+
+pandas.read_parquet('columnar', filters=[('make', '=', 'Ford'), ('year', '>=', 2022)])
+
+ColumnarPipeline writes the vehicles every spider scrapes here as it goes, when the COLUMNAR_DIR setting is set. To
+write the current output, or every snapshot (see snapshots.py) that is not here yet, enter:
+
+python -m vehicle_data_tracker.columnar export [--dir DIR]
+python -m vehicle_data_tracker.columnar history [--dir DIR]
+
+This needs pyarrow, which is optional: without it, ColumnarPipeline is disabled and the commands exit with an error.
+pyarrow is only imported once columnar files are written or read, since importing it takes most of a tenth of a second,
+and the pipelines import this module whether COLUMNAR_DIR is set or not.
+"""
+import argparse
+import datetime
+import importlib.util
+import os
+import re
+import sys
+
+from vehicle_data_tracker.segments import new_run_id
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+
+ROW_GROUP_ROWS = 10000
+# the run ids of the snapshots already written by export_history, one per line (with a leading underscore, so that
+#  pyarrow does not take it for part of the dataset)
+EXPORTED_FILE = '_snapshots_exported.txt'
+
+
+def available():
+    """
+    Returns whether pyarrow is installed, without importing it.
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _require():
+    """
+    Imports pyarrow and returns it.
+    """
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError:
+        raise RuntimeError('writing or reading columnar files requires pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+def schema():
+    """
+    Returns the schema of the files, with the partition columns (make and run_date) last.
+    """
+    pyarrow = _require()
+    dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.schema([('year', pyarrow.int16()),
+                           ('model', dictionary),
+                           ('trim', dictionary),
+                           ('msrp', pyarrow.int32()),
+                           ('run_id', dictionary),
+                           ('make', pyarrow.string()),
+                           ('run_date', pyarrow.string())])
+
+
+def parse_year(year: str):
+    """
+    Returns ``year`` as an int, or None if it has no 4-digit year in it.
+    """
+    match = re.search('[0-9]{4}', year)
+    return int(match.group()) if match else None
+
+
+def parse_msrp(msrp: str):
+    """
+    Returns a price formatted by FormatPipeline, e.g. '$45,990', as an int, or None if it has no digits in it.
+    """
+    digits = ''.join(re.findall('[0-9]', msrp))
+    return int(digits) if digits else None
+
+
+class ColumnarExporter:
+    """
+    Writes vehicles to the dataset in ``directory``, as run ``run_id`` on ``run_date`` (today by default). Used like
+    CsvItemExporter, except that the vehicles are buffered until finish_exporting, which writes one file per make.
+    """
+    def __init__(self, directory: str, run_id: str = None, run_date: datetime.date = None):
+        _require()
+        self.directory = directory
+        self.run_id = run_id or new_run_id()
+        self.run_date = (run_date or datetime.date.today()).isoformat()
+        self.rows = []
+
+    def start_exporting(self):
+        self.rows = []
+
+    def export_item(self, vehicle):
+        """
+        Buffers ``vehicle``, a Vehicle or any mapping with the STANDARD_FIELDS.
+        """
+        self.export_row([str(vehicle[field]) for field in STANDARD_FIELDS])
+
+    def export_row(self, row: list):
+        """
+        Buffers ``row``, a list of values in STANDARD_FIELDS order.
+        """
+        self.rows.append(row)
+
+    def finish_exporting(self):
+        """
+        Writes the buffered vehicles.
+
+        :return: the number of vehicles written
+        """
+        count = write_rows(self.rows, self.directory, self.run_id, self.run_date)
+        self.rows = []
+        return count
+
+
+def write_rows(rows: list, directory: str, run_id: str, run_date: str):
+    """
+    Writes ``rows`` (lists of values in STANDARD_FIELDS order) to the dataset in ``directory``, as run ``run_id`` on
+    ``run_date`` (an ISO date). Rows without a valid year are skipped.
+
+    :return: the number of rows written
+    """
+    pyarrow = _require()
+    rows = sorted((year, row[2], row[3], row[1], parse_msrp(row[4]))
+                  for row in rows for year in [parse_year(row[0])] if year is not None)
+    if not rows:
+        return 0
+    years, models, trims, makes, msrps = zip(*rows)
+    table_schema = schema()
+    table = pyarrow.table([pyarrow.array(years, pyarrow.int16()),
+                           pyarrow.array(models).dictionary_encode(),
+                           pyarrow.array(trims).dictionary_encode(),
+                           pyarrow.array(msrps, pyarrow.int32()),
+                           pyarrow.array([run_id] * len(rows)).dictionary_encode(),
+                           pyarrow.array(makes),
+                           pyarrow.array([run_date] * len(rows))], schema=table_schema)
+    partitioning = pyarrow.dataset.partitioning(pyarrow.schema([table_schema.field('make'),
+                                                                table_schema.field('run_date')]), flavor='hive')
+    pyarrow.dataset.write_dataset(table, directory, format='parquet', partitioning=partitioning,
+                                  basename_template=f'{run_id}-{{i}}.parquet',
+                                  existing_data_behavior='overwrite_or_ignore',
+                                  max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=min(len(rows), ROW_GROUP_ROWS))
+    return len(rows)
+
+
+def read_vehicles(directory: str, make: str = None, years: tuple = None, columns: list = None):
+    """
+    Reads vehicles from the dataset in ``directory``, only opening the files of ``make`` if it is given, and skipping
+    the row groups that have no year in the range ``years`` (a (first, last) tuple, inclusive) if it is given.
+
+    :param columns: the names of the columns to read, default all of them
+    :return: a pyarrow.Table
+    """
+    pyarrow = _require()
+    dataset = pyarrow.dataset.dataset(directory, format='parquet', partitioning='hive', schema=schema())
+    condition = None
+    if make is not None:
+        condition = pyarrow.dataset.field('make') == make
+    if years is not None:
+        in_range = (pyarrow.dataset.field('year') >= years[0]) & (pyarrow.dataset.field('year') <= years[1])
+        condition = in_range if condition is None else condition & in_range
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def export_history(log, directory: str):
+    """
+    Writes every snapshot of ``log`` (a snapshots.SnapshotLog) that has not been written to ``directory`` yet, each as
+    the run of its snapshot on the date it was taken. The snapshots are replayed once, in order.
+
+    :return: the run ids of the snapshots written
+    """
+    _require()
+    exported_path = os.path.join(directory, EXPORTED_FILE)
+    try:
+        with open(exported_path, 'r') as exported_file:
+            exported = set(exported_file.read().split())
+    except FileNotFoundError:
+        exported = set()
+    written = []
+    vehicles = {}
+    os.makedirs(directory, exist_ok=True)
+    for entry in log.snapshots():
+        log.replay(entry, vehicles)
+        if entry['run_id'] in exported:
+            continue
+        write_rows([list(key) + [msrp] for key, msrp in vehicles.items()], directory, entry['run_id'],
+                   entry['timestamp'][:10])
+        with open(exported_path, 'a') as exported_file:
+            exported_file.write(entry['run_id'] + '\n')
+        written.append(entry['run_id'])
+    return written
+
+
+def main(argv=None):
+    # imported here, so that the rest of the module does not depend on Scrapy
+    from vehicle_data_tracker.runner import crawl_settings
+    from vehicle_data_tracker.runner import output_rows
+    from vehicle_data_tracker.snapshots import SnapshotLog
+
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.columnar',
+                                     description='Write the vehicle data, or its snapshots, as Parquet files.')
+    parser.add_argument('command', choices=('export', 'history'))
+    parser.add_argument('--dir', default=None, help='the dataset directory, default COLUMNAR_DIR or "columnar"')
+    args = parser.parse_args(argv)
+    if not available():
+        parser.error('pyarrow is not installed (pip install pyarrow)')
+    settings = crawl_settings()
+    directory = args.dir or settings.get('COLUMNAR_DIR') or 'columnar'
+    if args.command == 'export':
+        exporter = ColumnarExporter(directory)
+        for row in output_rows(settings):
+            exporter.export_row(row)
+        print(f'{exporter.finish_exporting()} vehicles written to {directory} as run {exporter.run_id}')
+    else:
+        log = SnapshotLog(settings.get('SNAPSHOT_DIR'), settings.getint('SNAPSHOT_FULL_EVERY'))
+        written = export_history(log, directory)
+        print(f'{len(written)} snapshots written to {directory}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Service mode: a long-running process that keeps the vehicle data fresh by re-crawling only the makes whose data has
+gone stale.
+
+Every make has a time to live (REFRESH_TTLS, falling back on REFRESH_TTL), counted from the last run of its spider
+that finished normally, as recorded in the crawl history (see history.py). Every DAEMON_INTERVAL seconds, the makes
+whose data is older than that are crawled. All crawls share the same process and reactor, so Scrapy and the spiders
+are only loaded once.
+
+To run from console, enter:
+
+python -m vehicle_data_tracker --daemon [--purge 0|1] [--interval SECONDS] [all | make [make ...]]
+"""
+import datetime
+import logging
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.reactor import install_reactor
+from twisted.internet import task
+from twisted.internet import threads
+
+from vehicle_data_tracker.history import load_history
+from vehicle_data_tracker.history import record_runs
+from vehicle_data_tracker.runner import compact_output
+from vehicle_data_tracker.runner import record_snapshot
+from vehicle_data_tracker.runner import schedule_crawls
+from vehicle_data_tracker.runner import spider_name
+
+logger = logging.getLogger(__name__)
+
+
+def last_success(history: dict, spider: str):
+    """
+    Returns when the last run of ``spider`` that finished normally ended, or None if there has not been one.
+    """
+    finished = [run['finished'] for run in history.get(spider, []) if run.get('finish_reason') == 'finished']
+    if not finished:
+        return None
+    return datetime.datetime.fromisoformat(max(finished))
+
+
+def stale_makes(makes: list, history: dict, settings, now: datetime.datetime = None):
+    """
+    Returns the makes in ``makes`` whose data is older than their time to live, or that have never been crawled
+    successfully.
+    """
+    now = now or datetime.datetime.now()
+    default_ttl = settings.getint('REFRESH_TTL')
+    ttls = settings.getdict('REFRESH_TTLS')
+    stale = []
+    for make in makes:
+        spider = spider_name(make)
+        last = last_success(history, spider)
+        if last is None or (now - last).total_seconds() >= ttls.get(spider, default_ttl):
+            stale.append(make)
+    return stale
+
+
+class RefreshDaemon:
+    """
+    Re-crawls the stale makes among ``makes`` every ``interval`` seconds, in a single CrawlerProcess that is kept
+    running between crawls. A tick is skipped if the crawl started by the previous one is still going.
+    """
+    def __init__(self, makes: list, settings, purge=False, interval: int = None):
+        self.makes = makes
+        self.settings = settings
+        self.purge = purge
+        self.interval = interval or settings.getint('DAEMON_INTERVAL')
+        self.crawling = False
+        if settings.get('TWISTED_REACTOR'):
+            install_reactor(settings.get('TWISTED_REACTOR'))
+        self.process = CrawlerProcess(settings)
+
+    def tick(self):
+        if self.crawling:
+            logger.info('Previous refresh still running, skipping this one')
+            return
+        history = load_history(self.settings.get('CRAWL_HISTORY'))
+        stale = stale_makes(self.makes, history, self.settings)
+        if not stale:
+            logger.info('All makes are fresh')
+            return
+        logger.info('Refreshing %s', ', '.join(stale))
+        self.crawling = True
+        d = schedule_crawls(self.process, stale, self.purge)
+        d.addCallback(self.refreshed)
+        d.addErrback(lambda failure: logger.error('Refresh failed: %s', failure.getErrorMessage()))
+        d.addBoth(self.done)
+
+    def refreshed(self, results: dict):
+        record_runs(self.settings.get('CRAWL_HISTORY'), results)
+        for make, result in results.items():
+            logger.info('%s %s: %d items in %ss', make, result['status'], result['items'], result['seconds'])
+        return threads.deferToThread(self.finish, results)
+
+    def finish(self, results: dict):
+        """
+        Compacts the output and records a snapshot of it, in a thread of the reactor's pool.
+        """
+        compact_output(self.settings)
+        record_snapshot(self.settings, results)
+
+    def done(self, _):
+        self.crawling = False
+
+    def run(self):
+        """
+        Runs until the process is stopped (e.g. with Ctrl-C).
+        """
+        loop = task.LoopingCall(self.tick)
+        loop.start(self.interval)
+        self.process.start(stop_after_crawl=False)
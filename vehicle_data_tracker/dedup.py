@@ -0,0 +1,106 @@
+"""
+The trim ids DuplicatePipeline checks new vehicles against, shared by every spider of a process.
+
+Each spider registers with the output file it writes to, and gets a view of the trim ids of that file. Unless they
+purge, the spiders of a process all see the same ids: the trim index of the file with the VEHICLES_INDEX setting on
+(see trimindex.py), and otherwise a TrimSet of the trim ids in the file (see the same). The ids a spider adds are seen
+by every other spider right away, so however many spiders run at once, the file is read at most once and its ids are
+held in memory once, where each DuplicatePipeline used to read the whole file into a set of its own.
+
+The set is kept after the last spider releases it, so that the next crawl in the same process (e.g. the next job of a
+worker, see workers.py) does not read the file again, unless its size changed in the meantime. While spiders are
+registered, the set is kept up to date by the spiders themselves, so it is never reread.
+
+A purging spider gets a view of its own instead, which starts out empty, since the old rows of its make(s) are being
+replaced (see DuplicatePipeline.spider_closed) and rows of other makes cannot have the same trim id as its own. When
+the purge is committed, refresh applies the change to the shared ids.
+
+Spiders must register, add ids and release from the same thread (the reactor's), as pipelines do.
+"""
+import os
+
+from vehicle_data_tracker.trimindex import open_index
+from vehicle_data_tracker.trimindex import read_trim_ids
+from vehicle_data_tracker.trimindex import refresh_index
+from vehicle_data_tracker.trimindex import release_index
+from vehicle_data_tracker.trimindex import TrimSet
+
+# for each output file, by absolute path: [the set of its trim ids, the number of spiders registered, and the size the
+#  file had when the set last matched it]
+_shared_sets = {}
+
+
+def _file_size(output_file: str):
+    return os.path.getsize(output_file) if os.path.exists(output_file) else 0
+
+
+class DedupView:
+    """
+    A spider's view of the trim ids of ``output_file``: ``ids`` is the set or TrimIndex it shares with the other
+    spiders, or a set of its own if ``private``.
+    """
+    def __init__(self, output_file: str, ids, use_index: bool, private: bool):
+        self.output_file = output_file
+        self.ids = ids
+        self.use_index = use_index
+        self.private = private
+
+    def __contains__(self, trim_id: str):
+        return trim_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, trim_id: str):
+        self.ids.add(trim_id)
+
+
+def register(output_file: str, use_index=False, private=False):
+    """
+    Registers a spider writing to ``output_file``, and returns its view of the trim ids of the file. The view must be
+    given back to release once the spider is done with it.
+
+    :param use_index: share the trim index of the file instead of a set (see trimindex.py)
+    :param private: give the spider an empty set of its own instead, e.g. because it purges
+    """
+    if private:
+        return DedupView(output_file, TrimSet(), use_index, True)
+    if use_index:
+        return DedupView(output_file, open_index(output_file), True, False)
+    path = os.path.abspath(output_file)
+    shared = _shared_sets.get(path)
+    if shared is None or (shared[1] == 0 and shared[2] != _file_size(output_file)):
+        shared = _shared_sets[path] = [TrimSet(read_trim_ids(output_file)), 0, _file_size(output_file)]
+    shared[1] += 1
+    return DedupView(output_file, shared[0], False, False)
+
+
+def release(view: DedupView):
+    """
+    Unregisters the spider ``view`` was given to. Call once the spider has written all its rows.
+    """
+    if view.private:
+        return
+    if view.use_index:
+        release_index(view.output_file)
+        return
+    shared = _shared_sets[os.path.abspath(view.output_file)]
+    shared[1] -= 1
+    if shared[1] == 0:
+        shared[2] = _file_size(view.output_file)
+
+
+def refresh(output_file: str, removed=(), added=()):
+    """
+    Brings the shared trim ids of ``output_file`` up to date after the file was rewritten rather than appended to, e.g.
+    by a committed purge, which removed the trim ids ``removed`` and added the trim ids ``added``. The trim index is
+    rebuilt from the file if it is open, since it cannot have ids removed, and deleted otherwise (see
+    trimindex.refresh_index).
+    """
+    refresh_index(output_file)
+    shared = _shared_sets.get(os.path.abspath(output_file))
+    if shared is not None:
+        shared[0].difference_update(removed)
+        shared[0].update(added)
+        if shared[1] == 0:
+            shared[2] = _file_size(output_file)
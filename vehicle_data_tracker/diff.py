@@ -0,0 +1,164 @@
+"""
+A streaming diff of two csv files in the layout of vehicles.csv, for finding out what a refresh changed: which trims
+were added or removed and which were repriced.
+
+Both files are sorted by year, make, model and trim, then walked side by side in a single merge pass. A file of up to
+CHUNK_ROWS rows is sorted in memory. A larger one is sorted externally: it is read CHUNK_ROWS rows at a time, each chunk
+is sorted and written to a temporary file, and the chunks are read back a row at a time through a k-way merge. So
+memory use depends on CHUNK_ROWS, not on the size of the files. If a trim appears in several rows of a file, the last
+one counts, as in the snapshots of snapshots.py, so that the diff of two files is the delta between their snapshots.
+
+The changes have the same layout as the deltas of snapshots.py (DELTA_FIELDS): added and removed trims with their
+msrp, and repriced trims with their new msrp and the previous one. They are written as csv or as JSON lines. To diff
+two files, enter:
+
+python -m vehicle_data_tracker.diff OLD NEW [--format csv|jsonl] [--output FILE] [--chunk-rows N]
+"""
+import argparse
+import csv
+import heapq
+import json
+import os
+import sys
+import tempfile
+
+from vehicle_data_tracker.snapshots import DELTA_FIELDS
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+
+CHUNK_ROWS = 500000
+
+
+def row_key(row: list):
+    return row[0], row[1], row[2], row[3]
+
+
+def read_rows(path: str):
+    """
+    Yields the rows of a csv file in the layout of vehicles.csv, as lists of values in STANDARD_FIELDS order, without
+    its header.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if len(row) >= len(STANDARD_FIELDS) and row[0].lower() != 'year':
+                yield row[:len(STANDARD_FIELDS)]
+
+
+def _read_run(path: str):
+    with open(path, 'r', newline='', encoding='utf-8') as run_file:
+        yield from csv.reader(run_file)
+
+
+def sorted_rows(rows, temp_dir: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Yields ``rows`` sorted by year, make, model and trim, keeping rows with the same trim in their original order.
+    If there are more than ``chunk_rows`` of them, the sorted chunks are written to ``temp_dir`` and merged from there.
+    """
+    chunk = []
+    runs = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            chunk.sort(key=row_key)
+            runs.append(os.path.join(temp_dir, f'run{len(runs)}.csv'))
+            with open(runs[-1], 'w', newline='', encoding='utf-8') as run_file:
+                csv.writer(run_file).writerows(chunk)
+            chunk = []
+    chunk.sort(key=row_key)
+    if not runs:
+        yield from chunk
+        return
+    # heapq.merge takes equal keys from the earlier runs first, so the original order of a trim's rows is kept
+    yield from heapq.merge(*(_read_run(path) for path in runs), chunk, key=row_key)
+
+
+def _last_of_each(rows):
+    previous = None
+    for row in rows:
+        if previous is not None and row_key(row) != row_key(previous):
+            yield previous
+        previous = row
+    if previous is not None:
+        yield previous
+
+
+def diff_sorted(old_rows, new_rows):
+    """
+    Yields the changes from ``old_rows`` to ``new_rows``, both sorted by year, make, model and trim, as rows in
+    DELTA_FIELDS order. Rows with the same trim must be in their original order, the last of them being the one that
+    counts.
+    """
+    old_rows = _last_of_each(old_rows)
+    new_rows = _last_of_each(new_rows)
+    old = next(old_rows, None)
+    new = next(new_rows, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and row_key(old) < row_key(new)):
+            yield ['removed', *old, '']
+            old = next(old_rows, None)
+        elif old is None or row_key(new) < row_key(old):
+            yield ['added', *new, '']
+            new = next(new_rows, None)
+        else:
+            if old[4] != new[4]:
+                yield ['repriced', *new, old[4]]
+            old = next(old_rows, None)
+            new = next(new_rows, None)
+
+
+def diff_files(old_file: str, new_file: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Yields the changes from ``old_file`` to ``new_file`` (csv files in the layout of vehicles.csv), as rows in
+    DELTA_FIELDS order, sorted by year, make, model and trim. The files are sorted with at most ``chunk_rows`` rows of
+    each in memory at a time.
+    """
+    with tempfile.TemporaryDirectory(prefix='vehicle_diff_') as temp_dir:
+        old_dir = os.path.join(temp_dir, 'old')
+        new_dir = os.path.join(temp_dir, 'new')
+        os.mkdir(old_dir)
+        os.mkdir(new_dir)
+        yield from diff_sorted(sorted_rows(read_rows(old_file), old_dir, chunk_rows),
+                               sorted_rows(read_rows(new_file), new_dir, chunk_rows))
+
+
+def write_changes(changes, output, output_format: str = 'csv'):
+    """
+    Writes ``changes`` (rows in DELTA_FIELDS order) to the text file ``output``, as csv with a header or as one JSON
+    object per line.
+
+    :return: a dict with the number of added, removed and repriced trims
+    """
+    counts = {'added': 0, 'removed': 0, 'repriced': 0}
+    writer = csv.writer(output) if output_format == 'csv' else None
+    if writer is not None:
+        writer.writerow(DELTA_FIELDS)
+    for change in changes:
+        counts[change[0]] += 1
+        if writer is not None:
+            writer.writerow(change)
+        else:
+            output.write(json.dumps(dict(zip(DELTA_FIELDS, change))) + '\n')
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.diff',
+                                     description='List the trims added, removed and repriced between two csv files.')
+    parser.add_argument('old', help='the earlier csv file')
+    parser.add_argument('new', help='the later csv file')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv', help='output format, default csv')
+    parser.add_argument('--output', default=None, help='file to write the changes to, default stdout')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help=f'rows of each file to sort in memory at a time, default {CHUNK_ROWS}')
+    args = parser.parse_args(argv)
+    changes = diff_files(args.old, args.new, max(1, args.chunk_rows))
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as output:
+            counts = write_changes(changes, output, args.format)
+    else:
+        counts = write_changes(changes, sys.stdout, args.format)
+    print(f'{counts["added"]} added, {counts["removed"]} removed, {counts["repriced"]} repriced', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# Define here your extensions
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import json
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from vehicle_data_tracker.monitor import PROGRESS_PREFIX
+
+
+def close_spider(crawler, spider, reason: str):
+    """
+    Closes the spider of ``crawler`` with the given finish reason, using whichever API the installed version of Scrapy
+    provides.
+    """
+    engine = crawler.engine
+    if hasattr(engine, 'close_spider_async'):
+        from scrapy.utils.defer import deferred_from_coro
+        return deferred_from_coro(engine.close_spider_async(reason=reason))
+    return engine.close_spider(spider, reason)
+
+
+class ProgressReporter:
+    """
+    Prints a one-line JSON progress report for the spider (requests done, items scraped, items dropped) to stdout
+    every PROGRESS_INTERVAL seconds, and once more when the spider closes. The reports start with PROGRESS_PREFIX so
+    that OutputMonitor can tell them apart from the log.
+
+    Enabled by the PROGRESS_ENABLED setting.
+    """
+    def __init__(self, stats, interval: float):
+        self.stats = stats
+        self.interval = interval
+        self.loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PROGRESS_ENABLED'):
+            raise NotConfigured
+        reporter = cls(crawler.stats, crawler.settings.getfloat('PROGRESS_INTERVAL'))
+        crawler.signals.connect(reporter.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(reporter.spider_closed, signal=signals.spider_closed)
+        return reporter
+
+    def report(self, spider, state='running'):
+        progress = {'spider': spider.name,
+                    'state': state,
+                    'requests': (self.stats.get_value('downloader/response_count', 0) +
+                                 self.stats.get_value('downloader/exception_count', 0)),
+                    'items': self.stats.get_value('item_scraped_count', 0),
+                    'dropped': self.stats.get_value('item_dropped_count', 0)}
+        print(PROGRESS_PREFIX + json.dumps(progress), flush=True)
+
+    def spider_opened(self, spider):
+        self.loop = task.LoopingCall(self.report, spider)
+        self.loop.start(self.interval)
+
+    def spider_closed(self, spider, reason):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.report(spider, state=reason)
+
+
+class SpiderBudget:
+    """
+    Closes a spider once it has run out of its wall-clock or request budget, so that one slow or stuck website cannot
+    hold up a whole refresh. The spider is closed the same way as when it finishes, so the pipelines still write out
+    whatever was scraped; the finish reason ('budget_seconds' or 'budget_requests') marks the make as partial in the
+    run report.
+
+    The budget of a spider is SPIDER_BUDGETS[spider name], with any missing limits taken from SPIDER_BUDGET. A limit
+    of 0 means no limit.
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.budget = {}
+        self.requests = 0
+        self.timer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        budget = cls(crawler)
+        crawler.signals.connect(budget.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(budget.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(budget.request_reached_downloader, signal=signals.request_reached_downloader)
+        return budget
+
+    def spider_opened(self, spider):
+        settings = self.crawler.settings
+        self.budget = dict(settings.getdict('SPIDER_BUDGET'), **settings.getdict('SPIDER_BUDGETS').get(spider.name, {}))
+        if self.budget.get('seconds'):
+            from twisted.internet import reactor
+            self.timer = reactor.callLater(self.budget['seconds'], close_spider, self.crawler, spider, 'budget_seconds')
+
+    def spider_closed(self, spider):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+
+    def request_reached_downloader(self, request, spider):
+        self.requests += 1
+        if self.requests == self.budget.get('requests'):
+            close_spider(self.crawler, spider, 'budget_requests')
@@ -0,0 +1,103 @@
+"""
+Per-spider crawl history, and scheduling of crawls based on it.
+
+After every run, the duration and request count of each spider are appended to the CRAWL_HISTORY file. When several
+spiders are run in parallel, the ones expected to take the longest (fca.py and the GM spiders, for instance) are
+started first, and each of the rest starts in whichever of the CONCURRENT_SPIDERS spots frees up first. This is the
+longest-processing-time-first rule, which keeps the total time of a refresh close to that of its longest spider.
+
+When the spiders are split across several worker processes (see runner.run_sharded), each of which runs up to
+CONCURRENT_SPIDERS of them at once, the split follows the same rule over the spots of every worker: the spiders are
+dealt out longest first, each to the worker with the spot expected to free up first. That is the spot the spider would
+start in within that worker, since the worker also starts its spiders longest first.
+"""
+import datetime
+import json
+import statistics
+
+# how many runs of each spider to remember
+HISTORY_RUNS = 10
+
+
+def load_history(path: str):
+    """
+    Reads the crawl history from ``path``.
+
+    :return: a dict mapping each spider name to a list of runs, oldest first, or an empty dict if there is no history
+    """
+    try:
+        with open(path, 'r') as history_file:
+            return json.load(history_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def record_runs(path: str, results: dict):
+    """
+    Appends the results of a run to the crawl history in ``path``, keeping the last HISTORY_RUNS runs of each spider.
+
+    :param results: a dict mapping each make to its crawl_result (see runner.py)
+    :return: the updated history
+    """
+    history = load_history(path)
+    finished = datetime.datetime.now().isoformat(timespec='seconds')
+    for result in results.values():
+        runs = history.setdefault(result['spider'], [])
+        runs.append({'finished': finished,
+                     'seconds': result['seconds'],
+                     'requests': result['requests'],
+                     'finish_reason': result['finish_reason']})
+        del runs[:-HISTORY_RUNS]
+    with open(path, 'w') as history_file:
+        json.dump(history, history_file, indent=2)
+    return history
+
+
+def expected_durations(spiders: list, history: dict):
+    """
+    Estimates how long each spider will take, as the median duration of its past runs that finished normally.
+
+    Spiders with no such runs are assumed to take as long as the slowest spider that has some, so that they are
+    started early rather than holding up the end of a run. If no spider has any history, every estimate is 0 and the
+    spiders keep the order they were given in.
+
+    :return: a dict mapping each spider name to its expected duration in seconds
+    """
+    estimates = {}
+    for spider in spiders:
+        durations = [run['seconds'] for run in history.get(spider, []) if run.get('finish_reason') == 'finished']
+        if durations:
+            estimates[spider] = statistics.median(durations)
+    fallback = max(estimates.values(), default=0)
+    return {spider: estimates.get(spider, fallback) for spider in spiders}
+
+
+def longest_first(spiders: list, history: dict):
+    """
+    Sorts ``spiders`` by expected duration, longest first. Spiders with equal estimates keep their relative order.
+    """
+    estimates = expected_durations(spiders, history)
+    return sorted(spiders, key=lambda spider: -estimates[spider])
+
+
+def pack_longest_first(spiders: list, workers: int, history: dict, concurrency: int = 1):
+    """
+    Splits ``spiders`` into at most ``workers`` groups, one per worker, each of which runs up to ``concurrency`` spiders
+    at once, so that the workers are expected to finish at about the same time. Each spider, longest first, goes to the
+    worker whose earliest free spot is expected to free up first, and is expected to keep that spot busy for as long
+    as it takes.
+
+    :return: a list of non-empty lists of spider names, each sorted longest first
+    """
+    estimates = expected_durations(spiders, history)
+    groups = [[] for _ in range(max(1, min(workers, len(spiders))))]
+    concurrency = max(1, concurrency)
+    # when each spot expected to free up, by worker
+    spots = [[0] * concurrency for _ in groups]
+    for spider in longest_first(spiders, history):
+        # ties go to the worker with the fewest spiders, so that spiders without estimates are dealt out round-robin
+        i = min(range(len(groups)), key=lambda i: (min(spots[i]), len(groups[i]), i))
+        groups[i].append(spider)
+        spot = spots[i].index(min(spots[i]))
+        spots[i][spot] += estimates[spider]
+    return groups
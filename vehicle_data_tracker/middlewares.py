@@ -3,11 +3,14 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+from scrapy import Request
 from scrapy import signals
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from vehicle_data_tracker.pipelines import purge_scope
+
 
 class VehicleDataTrackerSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +104,65 @@ class VehicleDataTrackerDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class PurgeScopeMiddleware:
+    """
+    Skips the requests for pages outside of the spider's purge scope (see pipelines.purge_scope), so that a crawl
+    narrowed down to a model year or a model of a year only sends the requests it needs. Spiders pass the year and
+    model a page is for along to its callback as the year and model keyword arguments (cb_kwargs), and a request is
+    skipped if they rule the page out (see utilities.PurgeScope.may_cover). Requests without them, e.g. for the list
+    of models, are always sent, and so are items.
+
+    This only saves requests: the pipelines still drop the vehicles outside of the scope, which is what keeps them out
+    of the output, since not every spider passes the year and model along, and a page may list vehicles of several
+    years.
+
+    The number of requests skipped is in the purge_scope/skipped stat.
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.scope = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def skipped(self, result, spider):
+        """
+        Returns whether ``result``, something the spider yielded, is a request outside of the purge scope.
+        """
+        if not isinstance(result, Request):
+            return False
+        if self.scope is None:
+            self.scope = purge_scope(spider)
+        if self.scope.narrowed() and not self.scope.may_cover(result.cb_kwargs.get('year'),
+                                                              result.cb_kwargs.get('model')):
+            self.crawler.stats.inc_value('purge_scope/skipped', spider=spider)
+            return True
+        return False
+
+    # newer versions of Scrapy no longer pass the spider, which is then the crawler's
+    def process_spider_output(self, response, result, spider=None):
+        spider = spider or self.crawler.spider
+        for r in result:
+            if not self.skipped(r, spider):
+                yield r
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        # Scrapy uses this one when the spider (or a middleware before this one) yields asynchronously
+        spider = spider or self.crawler.spider
+        async for r in result:
+            if not self.skipped(r, spider):
+                yield r
+
+    async def process_start(self, start):
+        async for r in start:
+            if not self.skipped(r, self.crawler.spider):
+                yield r
+
+    def process_start_requests(self, start_requests, spider):
+        # for versions of Scrapy older than 2.13, which have no process_start
+        for r in start_requests:
+            if not self.skipped(r, spider):
+                yield r
@@ -0,0 +1,72 @@
+"""
+Live monitoring of crawl subprocesses.
+
+A crawl's Scrapy log can get large (DUPEFILTER_DEBUG is on, and every duplicate trim logs a warning), so instead of
+buffering all of it until the process exits, OutputMonitor reads the output line by line on a background thread and
+only keeps the most recent lines. Lines starting with PROGRESS_PREFIX are progress reports printed by the
+ProgressReporter extension (see extensions.py) and are parsed into a dict per spider instead.
+
+This module only uses the standard library, so that the app can import it without Scrapy.
+"""
+import collections
+import json
+import threading
+
+PROGRESS_PREFIX = '@@progress '
+
+
+class OutputMonitor:
+    """
+    Consumes the output of a subprocess on a background thread.
+
+    :param process: a Popen whose stdout is a pipe (ideally with stderr redirected to it)
+    :param max_lines: how many of the most recent output lines to keep
+    :param on_progress: called with this monitor (from the reader thread) whenever a spider reports progress
+    """
+    def __init__(self, process, max_lines=500, on_progress=None):
+        self.process = process
+        self.lines = collections.deque(maxlen=max_lines)
+        self.progress = {}
+        self.on_progress = on_progress
+        self.reader = threading.Thread(target=self.read_output, name='output_monitor', daemon=True)
+        self.reader.start()
+
+    def read_output(self):
+        for line in iter(self.process.stdout.readline, b''):
+            line = line.decode('utf-8', errors='replace').rstrip()
+            if line.startswith(PROGRESS_PREFIX):
+                try:
+                    progress = json.loads(line[len(PROGRESS_PREFIX):])
+                except ValueError:
+                    self.lines.append(line)
+                    continue
+                self.progress[progress['spider']] = progress
+                if self.on_progress is not None:
+                    self.on_progress(self)
+            else:
+                self.lines.append(line)
+        self.process.stdout.close()
+
+    def totals(self):
+        """
+        Returns the request, item and drop counts summed over every spider that has reported progress.
+        """
+        totals = {'requests': 0, 'items': 0, 'dropped': 0}
+        for progress in list(self.progress.values()):
+            for key in totals:
+                totals[key] += progress.get(key, 0)
+        return totals
+
+    def tail(self):
+        """
+        Returns the most recent output lines (at most max_lines of them).
+        """
+        return list(self.lines)
+
+    def wait(self):
+        """
+        Waits for the process to exit and its output to be consumed, and returns its exit code.
+        """
+        returncode = self.process.wait()
+        self.reader.join()
+        return returncode
@@ -5,6 +5,7 @@
 
 
 # useful for handling different item types with a single interface
+import io
 import os
 import pathlib
 
@@ -14,9 +15,24 @@ from scrapy.exporters import CsvItemExporter
 
 import re
 import csv
+from scrapy import signals
 from scrapy.exceptions import DropItem
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+from vehicle_data_tracker.columnar import ColumnarExporter
+from vehicle_data_tracker.columnar import available as columnar_available
+from vehicle_data_tracker import dedup
+from vehicle_data_tracker.query import QueryIndex
+from vehicle_data_tracker.registry import spider_makes
+from vehicle_data_tracker.runner import crawl_status
+from vehicle_data_tracker.runner import purge_committed
+from vehicle_data_tracker.segments import new_run_id
+from vehicle_data_tracker.segments import SegmentWriter
+from vehicle_data_tracker.store import VehicleStore
+from vehicle_data_tracker.trimindex import TrimSet
 from vehicle_data_tracker.utilities import STANDARD_FIELDS
-from vehicle_data_tracker.utilities import MAKES_LIST
+from vehicle_data_tracker.utilities import PurgeScope
+from vehicle_data_tracker.utilities import trim_id
 
 
 class FormatPipeline:
@@ -82,9 +98,148 @@ class FormatPipeline:
         return vehicle
 
 
+class ColumnarPipeline:
+    """
+    Writes every vehicle the spider scrapes to the Parquet dataset in COLUMNAR_DIR as well (see columnar.py), with a
+    file per make for this run. It runs before DuplicatePipeline, so that the files hold all the vehicles the spider
+    found, not only those that are new to vehicles.csv. A vehicle is only written once per run, and not at all if it is
+    outside of the spider's purge scope (see purge_scope), since DuplicatePipeline drops it.
+
+    Disabled if COLUMNAR_DIR is empty, or if pyarrow is not installed.
+    """
+    def __init__(self, directory, run_id=None):
+        self.exporter = ColumnarExporter(directory, run_id)
+        self.ids_seen = TrimSet()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get('COLUMNAR_DIR')
+        if not directory:
+            raise NotConfigured
+        if not columnar_available():
+            raise NotConfigured('COLUMNAR_DIR is set, but pyarrow is not installed')
+        return cls(directory, crawler.settings.get('RUN_ID') or None)
+
+    def open_spider(self, spider):
+        self.scope = purge_scope(spider)
+        self.exporter.start_exporting()
+
+    def close_spider(self, spider):
+        self.exporter.finish_exporting()
+
+    def process_item(self, vehicle, spider):
+        if not self.scope.in_scope([vehicle[field] for field in STANDARD_FIELDS]):
+            return vehicle
+        identity = trim_id(vehicle['year'], vehicle['make'], vehicle['model'], vehicle['trim'])
+        if identity not in self.ids_seen:
+            self.ids_seen.add(identity)
+            self.exporter.export_item(vehicle)
+        return vehicle
+
+
+class QueryIndexPipeline:
+    """
+    Adds every vehicle the spider scrapes to the QUERY_DB database (see query.py), as part of the run of the RUN_ID
+    setting (see runner.schedule_crawls), in batches of up to WRITE_BATCH_SIZE like DuplicatePipeline. It runs before
+    DuplicatePipeline, so that the run holds all the vehicles the spider found, except for those outside of the
+    spider's purge scope (see purge_scope), which DuplicatePipeline drops. The run becomes the latest one of the
+    spider's make(s) once the spider finishes normally.
+
+    Disabled if QUERY_DB is empty.
+    """
+    def __init__(self, db_file, batch_size=1, batch_interval=0.0, run_id=None):
+        self.db_file = db_file
+        self.run_id = run_id or new_run_id()
+        self.index = None
+        self.makes = set()
+        self.ids_seen = TrimSet()
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.batch = []
+        self.flush_loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.get('QUERY_DB'):
+            raise NotConfigured
+        pipeline = cls(crawler.settings.get('QUERY_DB'), crawler.settings.getint('WRITE_BATCH_SIZE', 1),
+                       crawler.settings.getfloat('WRITE_BATCH_INTERVAL'), crawler.settings.get('RUN_ID'))
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.scope = purge_scope(spider)
+        self.index = QueryIndex(self.db_file)
+        if self.batch_size > 1 and self.batch_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush)
+            self.flush_loop.start(self.batch_interval, now=False)
+
+    def flush(self):
+        """
+        Adds the vehicles of the current batch, in one transaction.
+        """
+        if self.batch:
+            self.index.add_run(self.run_id, self.batch, complete=False)
+            self.batch = []
+
+    def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        if self.index is not None:
+            self.flush()
+
+    def spider_closed(self, spider, reason):
+        if self.index is None:
+            return
+        if crawl_status(reason) == 'done':
+            # only the makes of this spider: the other spiders of the run may not have finished, or not normally
+            self.index.complete_run(self.run_id, self.makes)
+        self.index.close()
+
+    def process_item(self, vehicle, spider):
+        row = [str(vehicle[field]) for field in STANDARD_FIELDS]
+        if not self.scope.in_scope(row):
+            return vehicle
+        identity = trim_id(*row[0:4])
+        if identity not in self.ids_seen:
+            self.ids_seen.add(identity)
+            self.makes.add(row[1])
+            self.batch.append(row)
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        return vehicle
+
+
 class DuplicatePipeline:
-    def __init__(self):
-        self.ids_seen = set()
+    def __init__(self, output_file='vehicles.csv', use_index=False, batch_size=1, batch_interval=0.0, stored_file=''):
+        self.ids_seen = TrimSet()
+        self.ids_stored = None
+        self.output_file = output_file
+        self.stored_file = stored_file
+        self.use_index = use_index
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.batched = 0
+        self.flush_loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # with the sqlite and segments backends, the vehicles are checked for duplicates and written by StorePipeline
+        #  and SegmentPipeline instead
+        batch_size = crawler.settings.getint('WRITE_BATCH_SIZE', 1)
+        batch_interval = crawler.settings.getfloat('WRITE_BATCH_INTERVAL')
+        if crawler.settings.get('VEHICLES_BACKEND') == 'sqlite':
+            pipeline = StorePipeline(crawler.settings.get('VEHICLES_DB'), batch_size, batch_interval)
+        elif crawler.settings.get('VEHICLES_BACKEND') == 'segments':
+            pipeline = SegmentPipeline(crawler.settings.get('VEHICLES_SEGMENTS'),
+                                       crawler.settings.get('VEHICLES_OUTPUT'), crawler.settings.get('RUN_ID') or None)
+        else:
+            pipeline = cls(crawler.settings.get('VEHICLES_OUTPUT', 'vehicles.csv'),
+                           crawler.settings.getbool('VEHICLES_INDEX'), batch_size, batch_interval,
+                           crawler.settings.get('VEHICLES_STORED', ''))
+        # a purge is committed once the spider is closed, since only the spider_closed signal has the finish reason
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
 
     # noinspection PyAttributeOutsideInit
     def open_spider(self, spider):
@@ -92,97 +247,303 @@ class DuplicatePipeline:
         I would like to use this docstring to apologize for how incredibly inconsistent I am with my naming conventions.
 
         Anyhow, here's what this pipeline does. When the spider is opened, vehicles.csv is opened for reading if it
-        exists. A csv reader reads each line, adding the entry to list_purged and to the set ids_seen if purge is
-        disabled or if the make of the entry does not match the make(s) of the spider. Otherwise, the entry is ignored.
-        Then, if purge is enabled, a csv writer overwrites vehicles.csv with the contents of list_purged.
+        exists. A csv reader reads each line, adding the trim id of the entry (see utilities.trim_id) to ids_seen. If
+        vehicles.csv does not exist, it is created for appending. In either case, self.exporter is initialized with
+        vehicles.csv as the target file. Finally, call exporter.start_exporting.
+
+        The trim ids are shared by every spider of the process writing to vehicles.csv (see dedup.py), so it is read
+        by the first spider only, and each spider sees the rows the others add. With the VEHICLES_INDEX setting on,
+        ids_seen is the persistent trim index of vehicles.csv (see trimindex.py) instead of a set, and vehicles.csv is
+        not read at all.
 
-        If vehicles.csv does not exist, it is created for appending.
+        New rows are not written one at a time, but in batches of up to WRITE_BATCH_SIZE rows (see open_exporter),
+        which are flushed when they are full, every WRITE_BATCH_INTERVAL seconds, and when the spider closes.
 
-        In either case, self.exporter is initialized with vehicles.csv as the target file. Finally, call
-        exporter.start_exporting.
+        If purge is enabled, vehicles.csv is left alone until the spider is closed. The spider's rows are a new
+        generation of its make(s): they are checked for duplicates among themselves (in a view of the trim ids of its
+        own) and written to a staging file next to vehicles.csv, and only replace the old rows of the make(s) if the
+        purge is committed (see spider_closed). Opening a purging spider does not read anything, and a failed crawl
+        loses nothing.
+
+        With a purge scope narrower than the make(s) (see purge_scope), the vehicles outside of it are dropped, and
+        only the old rows in it are replaced.
+
+        With the VEHICLES_STORED setting, the vehicles of that file are dropped as duplicates as well, as are those of
+        vehicles.csv. Its trim ids are shared like those of vehicles.csv, but always in a set, since its index may be
+        in use by another process. A purging spider ignores it, since its rows replace the stored ones.
         """
         # output_dir = pathlib.Path(__file__).parent
         # if hasattr(spider, 'outputdir'):
         #     output_dir = spider.outputdir
         # output_file = os.sep.join((str(output_dir), 'vehicles.csv'))
-        output_file = 'vehicles.csv'
-        try:
-            purge = False
-            group_spider = spider.name in MAKES_LIST['groups']
-            try:
-                if int(spider.purge) == 0:
-                    pass
-                    # print('purge disabled')
-                elif int(spider.purge) == 1:
-                    purge = True
-                    # print('purge enabled')
-                else:
-                    raise AttributeError
-            except AttributeError:
-                purge = False
-                print('missing or invalid purge argument, defaulting to disabled')
-            vehicles_csv_read = open(output_file, 'r', newline='')
-            # print('====================( opened file vehicles.csv for reading )====================')
-            vehicle_csv_reader = csv.reader(vehicles_csv_read)
-            include_headers = False
-            list_purged = []
-            make = spider.name
-            if hasattr(spider, 'name_long'):
-                make = spider.name_long
-            for row in vehicle_csv_reader:
-                # print(f'row {vehicle_csv_reader.line_num}: {row}')
-                if row[0].lower() == 'year':
-                    list_purged.append(row)  # grabs the header at the beginning of the loop
-                else:
-                    if group_spider:
-                        if not (purge and row[1].lower() in spider.makes):
-                            list_purged.append(row)
-                            self.ids_seen.add(''.join(row[0:4]))
-                    else:
-                        # If purge is disabled, add this entry to the list and id set.
-                        # If purge is enabled and the make of the entry matches that of the spider currently running,
-                        #  do NOT add it to the list or the id set.
-                        if not (purge and row[1].lower() == make.lower()):
-                            list_purged.append(row)
-                            self.ids_seen.add(''.join(row[0:4]))
-                            # print('id added: ', ''.join(row[0:4]))
-            if vehicle_csv_reader.line_num == 0:
-                include_headers = True
-            vehicles_csv_read.close()
-            if purge:
-                vehicles_csv_write = open(output_file, 'w', newline='')
-                # print('====================( opened file vehicles.csv for writing )====================')
-                vehicle_csv_writer = csv.writer(vehicles_csv_write)
-                vehicle_csv_writer.writerows(list_purged)
-                vehicles_csv_write.close()
-
-            # print('include_headers ==', include_headers)
-            self.vehicles_csv = open(output_file, 'ab')
-            self.exporter = CsvItemExporter(self.vehicles_csv,
-                                            include_headers_line=include_headers,
-                                            fields_to_export=STANDARD_FIELDS)
-        except FileNotFoundError:
-            print('vehicles.csv does not exist')
-            self.vehicles_csv = open(output_file, 'ab')
-            self.exporter = CsvItemExporter(self.vehicles_csv,
-                                            include_headers_line=True,
-                                            fields_to_export=STANDARD_FIELDS)
+        output_file = self.output_file
+        self.purge = purge_enabled(spider)
+        self.scope = purge_scope(spider)
+        self.ids_seen = dedup.register(output_file, self.use_index, private=self.purge)
+        if self.stored_file and not self.purge:
+            self.ids_stored = dedup.register(self.stored_file)
+        if self.purge:
+            self.staging_file = staging_path(output_file, spider.name)
+            with open(self.staging_file, 'wb'):
+                pass
+            self.open_exporter(self.staging_file, False)
+        else:
+            self.open_exporter(output_file, not os.path.exists(output_file) or os.path.getsize(output_file) == 0)
         self.exporter.start_exporting()
+        if self.batch_size > 1 and self.batch_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush)
+            self.flush_loop.start(self.batch_interval, now=False)
         # self.vehicles_csv.close()
 
+    # noinspection PyAttributeOutsideInit
+    def open_exporter(self, output_file, include_headers):
+        """
+        Opens ``output_file`` for appending and initializes self.exporter with it.
+
+        The exporter writes to an in-memory batch, which flush appends to the file, opened unbuffered, with a single
+        write. That way, the rows of a batch go out together and rows from spiders running in the same process cannot
+        interleave, and the file ends up with exactly the bytes the exporter would have written to it directly. For
+        the same reason, the header line is written right away instead of along with the first item; otherwise, every
+        spider that opened the file before any rows were written would write a header of its own.
+        """
+        self.vehicles_csv = open(output_file, 'ab', buffering=0)
+        if include_headers:
+            self.vehicles_csv.write((','.join(STANDARD_FIELDS) + '\r\n').encode('utf-8'))
+        self.batch = io.BytesIO()
+        self.exporter = CsvItemExporter(self.batch,
+                                        include_headers_line=False,
+                                        fields_to_export=STANDARD_FIELDS)
+
+    def flush(self):
+        """
+        Appends the rows of the current batch to the output file.
+        """
+        if self.batched:
+            self.vehicles_csv.write(self.batch.getvalue())
+            self.batch.seek(0)
+            self.batch.truncate()
+            self.batched = 0
+
     def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
         if hasattr(self, 'exporter'):
             self.exporter.finish_exporting()
+            self.flush()
             self.vehicles_csv.close()
+        if isinstance(self.ids_seen, dedup.DedupView):
+            dedup.release(self.ids_seen)
+        if self.ids_stored is not None:
+            dedup.release(self.ids_stored)
+            self.ids_stored = None
+
+    def spider_closed(self, spider, reason):
+        """
+        Commits the purge of a purging spider if it finished normally with at least one vehicle (see
+        runner.purge_committed): the rows of vehicles.csv in the purge scope (those whose make is one of the spider's,
+        narrowed down to a year and model if the scope has them) are replaced by the staged rows, in place, so that
+        spiders still appending to vehicles.csv keep doing so. Otherwise, the staged rows are thrown away and
+        vehicles.csv keeps the old ones. Since vehicles.csv has no index, it is read and rewritten whole either way; the
+        sqlite backend only touches the rows in the scope (see VehicleStore.commit_scoped).
+        """
+        if not getattr(self, 'purge', False):
+            return
+        if purge_committed(reason, len(self.ids_seen)):
+            list_purged = []
+            removed = []
+            try:
+                with open(self.output_file, 'r', newline='', encoding='utf-8') as vehicles_csv_read:
+                    for row in csv.reader(vehicles_csv_read):
+                        if row and (row[0].lower() == 'year' or not self.scope.covers(row)):
+                            list_purged.append(row)
+                        elif row:
+                            removed.append(trim_id(*row[0:4]))
+            except FileNotFoundError:
+                pass
+            if not list_purged or list_purged[0][0].lower() != 'year':
+                list_purged.insert(0, STANDARD_FIELDS)
+            with open(self.staging_file, 'r', newline='', encoding='utf-8') as staged:
+                added = [row for row in csv.reader(staged) if row]
+            list_purged.extend(added)
+            with open(self.output_file, 'w', newline='', encoding='utf-8') as vehicles_csv_write:
+                csv.writer(vehicles_csv_write).writerows(list_purged)
+            # the trim ids shared by the other spiders of the process still have the old generation and not the new one
+            dedup.refresh(self.output_file, removed, (trim_id(*row[0:4]) for row in added))
+        os.remove(self.staging_file)
 
     def process_item(self, vehicle, spider):
-        trim_id = vehicle['year'] + vehicle['make'] + vehicle['model'] + vehicle['trim']
-        # if vehicle['year'] is not None:
-        #     trim_id = vehicle['year'] + trim_id
-        if trim_id in self.ids_seen:
-            raise DropItem(f'Duplicate trim found:')
+        identity = trim_id(vehicle['year'], vehicle['make'], vehicle['model'], vehicle['trim'])
+        if not self.scope.in_scope([vehicle[field] for field in STANDARD_FIELDS]):
+            raise DropItem(f'Outside of the purge scope: {identity}')
+        if identity in self.ids_seen or (self.ids_stored is not None and identity in self.ids_stored):
+            raise DropItem(f'Duplicate trim found: {identity}')
         else:
-            self.ids_seen.add(trim_id)
+            self.ids_seen.add(identity)
             self.exporter.export_item(vehicle)
+            self.batched += 1
+            if self.batched >= self.batch_size:
+                self.flush()
             # print(f'DuplicatePipeline: item {trim_id} has been processed by the Duplicate Pipeline')
             return vehicle
+
+
+def purge_enabled(spider):
+    """
+    Returns whether the spider was run with purge=1, defaulting to False like DuplicatePipeline.
+    """
+    try:
+        return int(spider.purge) == 1
+    except (AttributeError, ValueError):
+        print('missing or invalid purge argument, defaulting to disabled')
+        return False
+
+
+def purge_scope(spider):
+    """
+    Returns the PurgeScope of the spider (see utilities.py): its make(s), narrowed down to the year and model of the
+    purge_year and purge_model arguments it was run with, or else of the PURGE_YEAR and PURGE_MODEL settings.
+    """
+    settings = getattr(spider, 'settings', None)
+    year = getattr(spider, 'purge_year', None)
+    model = getattr(spider, 'purge_model', None)
+    if year is None and model is None and settings is not None:
+        year = settings.get('PURGE_YEAR')
+        model = settings.get('PURGE_MODEL')
+    return PurgeScope(spider_makes(spider.name), year, model)
+
+
+def staging_path(output_file: str, spider_name: str):
+    """
+    Returns the path of the file a purging spider writes its rows to until the purge is committed, e.g.
+    vehicles.csv.ford.staged.
+    """
+    return f'{output_file}.{spider_name}.staged'
+
+
+class StorePipeline:
+    """
+    DuplicatePipeline for the sqlite backend (see store.py), which writes the vehicles to the VEHICLES_DB database.
+
+    A vehicle is added to the visible generation of its make, and dropped as a duplicate if one with the same year,
+    make, model and trim is already in it. When the spider purges, its make(s) get a new generation instead, which is
+    made visible once the spider is closed if the purge is committed (see runner.purge_committed). With a purge scope
+    narrower than the make(s) (see purge_scope), the vehicles outside of it are dropped, and the committed generation
+    only replaces the vehicles in the scope (see VehicleStore.commit_scoped).
+
+    Like DuplicatePipeline, the vehicles are written in batches of up to WRITE_BATCH_SIZE, each in one transaction. A
+    vehicle is checked for duplicates right away, against the database (a read, which does not wait for writers) and
+    the current batch, so that the transaction is only open while the batch is written. Holding it for longer would
+    keep the other spiders of the process from writing, on the same thread.
+    """
+    def __init__(self, db_file='vehicles.db', batch_size=1, batch_interval=0.0):
+        self.db_file = db_file
+        self.store = None
+        self.generations = {}
+        self.pending = {}
+        self.added = 0
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.batch = []
+        self.batch_ids = set()
+        self.flush_loop = None
+
+    def open_spider(self, spider):
+        self.store = VehicleStore(self.db_file)
+        self.scope = purge_scope(spider)
+        if purge_enabled(spider):
+            self.pending = self.store.begin_generation(spider_makes(spider.name))
+        if self.batch_size > 1 and self.batch_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush)
+            self.flush_loop.start(self.batch_interval, now=False)
+
+    def flush(self):
+        """
+        Writes the vehicles of the current batch, in one transaction.
+        """
+        if self.batch:
+            self.store.add_many(self.batch)
+            self.batch = []
+            self.batch_ids.clear()
+
+    def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        if self.store is not None:
+            self.flush()
+
+    def spider_closed(self, spider, reason):
+        if self.store is None:
+            return
+        if self.pending and purge_committed(reason, self.added):
+            if self.scope.narrowed():
+                self.store.commit_scoped(self.pending, self.scope.year, self.scope.model)
+            else:
+                self.store.commit_generation(self.pending)
+        self.store.close()
+
+    def process_item(self, vehicle, spider):
+        row = [str(vehicle[field]) for field in STANDARD_FIELDS]
+        if not self.scope.in_scope(row):
+            raise DropItem(f'Outside of the purge scope: {trim_id(*row[0:4])}')
+        make = vehicle['make'].lower()
+        if make in self.pending:
+            generation = self.pending[make]
+        else:
+            generation = self.generations.get(make)
+            if generation is None:
+                generation = self.generations[make] = self.store.generation(make)
+        row.append(generation)
+        identity = (row[0], row[1], row[2], row[3], generation)
+        if identity in self.batch_ids or self.store.contains(row):
+            raise DropItem(f'Duplicate trim found: {trim_id(*row[0:4])}')
+        self.batch_ids.add(identity)
+        self.batch.append(row)
+        self.added += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        return vehicle
+
+
+class SegmentPipeline:
+    """
+    DuplicatePipeline for the segments backend (see segments.py), which writes the vehicles to a new segment of the
+    spider's partition in the VEHICLES_SEGMENTS directory.
+
+    Unless the spider purges, the segment starts with the vehicles of the partition's latest segment (or, for the
+    first segment, those of the spider's make(s) in the output file). A vehicle is dropped as a duplicate if one with
+    the same year, make, model and trim is already in the segment. The segment of a purging spider is only written if
+    the purge is committed (see runner.purge_committed), so that the latest segment stays the last complete one.
+
+    With a purge scope narrower than the make(s) (see purge_scope), the vehicles outside of it are dropped, and a
+    purging spider's segment starts with the vehicles of the latest segment that are outside of it.
+    """
+    def __init__(self, segments_dir='vehicles', output_file='vehicles.csv', run_id=None):
+        self.segments_dir = segments_dir
+        self.output_file = output_file
+        self.run_id = run_id
+        self.writer = None
+        self.purge = False
+        self.scope = None
+        self.added = 0
+
+    def open_spider(self, spider):
+        self.writer = SegmentWriter(self.segments_dir, spider.name, self.run_id)
+        self.purge = purge_enabled(spider)
+        self.scope = purge_scope(spider)
+        if not self.purge:
+            self.writer.carry_over(self.output_file, spider_makes(spider.name))
+        elif self.scope.narrowed():
+            self.writer.carry_over(self.output_file, spider_makes(spider.name), self.scope)
+
+    def spider_closed(self, spider, reason):
+        if self.writer is not None and (not self.purge or purge_committed(reason, self.added)):
+            self.writer.close()
+
+    def process_item(self, vehicle, spider):
+        row = [str(vehicle[field]) for field in STANDARD_FIELDS]
+        if not self.scope.in_scope(row):
+            raise DropItem(f'Outside of the purge scope: {trim_id(*row[0:4])}')
+        if not self.writer.add(row):
+            raise DropItem(f'Duplicate trim found: {trim_id(*row[0:4])}')
+        self.added += 1
+        return vehicle
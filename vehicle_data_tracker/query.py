@@ -0,0 +1,262 @@
+"""
+An indexed store of every vehicle seen in every run, for answering questions like "all 2024 GMC trims under $60k"
+without scanning vehicles.csv.
+
+The QUERY_DB database has a row per vehicle per run in the observations table, with the year and msrp as integers (see
+columnar.parse_year and columnar.parse_msrp), and a row per make per run in the runs table. Observations have
+secondary indexes sorted by make and year, by msrp, and by run id (then make and year). A query picks whichever narrows
+it down most, so it reads only the matching part of an index, however many runs are stored. With 200 runs of 40 makes
+(4 million observations), queries of the latest runs take under 10ms. QueryIndexPipeline adds the
+vehicles of every spider as they are scraped, in batches like DuplicatePipeline, so the indexes are kept up to date
+incrementally.
+
+By default, a query looks at the latest complete run of each make, i.e. the vehicle data as it is now. A run is complete
+if its spider finished normally (see runner.crawl_status). A query can also look at a single run, or at every run.
+
+To query, or to load a csv file in the layout of vehicles.csv or the snapshots of snapshots.py into the database, enter:
+
+python -m vehicle_data_tracker.query find [--make MAKE] [--model TEXT] [--year-min YEAR] [--year-max YEAR]
+                                          [--msrp-min DOLLARS] [--msrp-max DOLLARS] [--run RUN_ID | --all-runs]
+                                          [--limit N] [--db FILE]
+python -m vehicle_data_tracker.query import [--input FILE] [--db FILE]
+python -m vehicle_data_tracker.query snapshots [--db FILE]
+
+The database defaults to the QUERY_DB setting, and the input file to VEHICLES_OUTPUT.
+"""
+import argparse
+import contextlib
+import datetime
+import sqlite3
+import sys
+import time
+
+from vehicle_data_tracker.columnar import parse_msrp
+from vehicle_data_tracker.columnar import parse_year
+from vehicle_data_tracker.segments import new_run_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    run_id TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    make TEXT NOT NULL,
+    model TEXT NOT NULL,
+    trim TEXT NOT NULL,
+    msrp INTEGER
+);
+CREATE INDEX IF NOT EXISTS observations_make_year ON observations (make COLLATE NOCASE, year);
+CREATE INDEX IF NOT EXISTS observations_msrp ON observations (msrp);
+CREATE INDEX IF NOT EXISTS observations_run ON observations (run_id, make COLLATE NOCASE, year);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT NOT NULL,
+    make TEXT NOT NULL COLLATE NOCASE,
+    started TEXT NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, make)
+);
+CREATE INDEX IF NOT EXISTS runs_latest ON runs (complete, make, run_id);
+"""
+COLUMNS = ['run_id', 'year', 'make', 'model', 'trim', 'msrp']
+
+
+class QueryIndex:
+    """
+    The query database in ``path``, which is created if it does not exist yet. Like the store of store.py, it is in WAL
+    mode, and every statement is its own transaction unless it is run inside transaction().
+    """
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # keeps the statistics the query planner chooses indexes by up to date, when they are stale enough to matter
+        self.connection.execute('PRAGMA optimize')
+        self.connection.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Runs the statements executed inside the with block in a single transaction.
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def add_run(self, run_id: str, rows, complete=True):
+        """
+        Adds the vehicles of a run in a single transaction, and records the run for the make of every vehicle.
+
+        :param rows: lists of values in STANDARD_FIELDS order; those without a valid year are skipped
+        :param complete: whether the run found every vehicle of its makes (see complete_run)
+        :return: the number of vehicles added
+        """
+        observations = []
+        makes = set()
+        for row in rows:
+            year = parse_year(row[0])
+            if year is not None:
+                observations.append((run_id, year, row[1], row[2], row[3], parse_msrp(row[4])))
+                makes.add(row[1])
+        started = datetime.datetime.now().isoformat(timespec='seconds')
+        with self.transaction():
+            self.connection.executemany('INSERT OR IGNORE INTO runs VALUES (?, ?, ?, 0)',
+                                        [(run_id, make, started) for make in makes])
+            self.connection.executemany('INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?)', observations)
+            if complete:
+                self.connection.executemany('UPDATE runs SET complete = 1 WHERE run_id = ? AND make = ?',
+                                            [(run_id, make) for make in makes])
+        return len(observations)
+
+    def complete_run(self, run_id: str, makes=None):
+        """
+        Marks the makes ``makes`` of a run (every make of the run if None) as complete, making it the latest run of
+        those makes.
+        """
+        if makes is None:
+            self.connection.execute('UPDATE runs SET complete = 1 WHERE run_id = ?', [run_id])
+        else:
+            self.connection.executemany('UPDATE runs SET complete = 1 WHERE run_id = ? AND make = ?',
+                                        [(run_id, make) for make in makes])
+
+    def has_run(self, run_id: str):
+        return self.connection.execute('SELECT 1 FROM runs WHERE run_id = ?', [run_id]).fetchone() is not None
+
+    def find(self, make: str = None, model: str = None, year_min: int = None, year_max: int = None,
+             msrp_min: int = None, msrp_max: int = None, run_id: str = None, all_runs=False, limit: int = None):
+        """
+        Returns the vehicles matching every filter given, as dicts with the COLUMNS, sorted by make, year, model and
+        trim.
+
+        :param make: the make, matched case-insensitively
+        :param model: a substring of the model, matched case-insensitively
+        :param year_min: the earliest year, inclusive
+        :param year_max: the latest year, inclusive
+        :param msrp_min: the lowest msrp in dollars, inclusive
+        :param msrp_max: the highest msrp in dollars, inclusive
+        :param run_id: only look at this run, instead of the latest complete run of each make
+        :param all_runs: look at every run instead
+        :param limit: the most vehicles to return
+        """
+        conditions = []
+        parameters = []
+        if make is not None:
+            conditions.append('o.make = ? COLLATE NOCASE')
+            parameters.append(make)
+        if model is not None:
+            conditions.append("o.model LIKE ? ESCAPE '\\'")
+            parameters.append('%' + model.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        for condition, value in (('o.year >= ?', year_min), ('o.year <= ?', year_max),
+                                 ('o.msrp >= ?', msrp_min), ('o.msrp <= ?', msrp_max)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        if run_id is not None:
+            conditions.append('o.run_id = ?')
+            parameters.append(run_id)
+        elif not all_runs:
+            # the runs are looked up first, so that each of them is a range of the observations_run index
+            latest = self.latest_runs(make)
+            if not latest:
+                return []
+            conditions.append('(' + ' OR '.join(['(o.run_id = ? AND o.make = ? COLLATE NOCASE)'] * len(latest)) + ')')
+            for latest_make, latest_run in latest:
+                parameters.extend((latest_run, latest_make))
+        sql = 'SELECT o.run_id, o.year, o.make, o.model, o.trim, o.msrp FROM observations o'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY o.make, o.year, o.model, o.trim'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        return [dict(zip(COLUMNS, row)) for row in self.connection.execute(sql, parameters)]
+
+    def latest_runs(self, make: str = None):
+        """
+        Returns the latest complete run of every make, or only of ``make`` if it is given, as a list of (make, run id)
+        tuples.
+        """
+        sql = 'SELECT make, MAX(run_id) FROM runs WHERE complete = 1'
+        parameters = []
+        if make is not None:
+            sql += ' AND make = ?'
+            parameters.append(make)
+        return self.connection.execute(sql + ' GROUP BY make', parameters).fetchall()
+
+    def load_snapshots(self, log):
+        """
+        Adds every snapshot of ``log`` (a snapshots.SnapshotLog) that is not in the database yet, each as a complete
+        run with the run id of the snapshot. The snapshots are replayed once, in order.
+
+        :return: the run ids of the snapshots added
+        """
+        added = []
+        vehicles = {}
+        for entry in log.snapshots():
+            log.replay(entry, vehicles)
+            if not self.has_run(entry['run_id']):
+                self.add_run(entry['run_id'], (list(key) + [msrp] for key, msrp in vehicles.items()))
+                added.append(entry['run_id'])
+        return added
+
+
+def format_msrp(msrp):
+    return f'${msrp:,}' if msrp is not None else ''
+
+
+def main(argv=None):
+    # imported here, so that the rest of the module does not depend on Scrapy
+    from vehicle_data_tracker.diff import read_rows
+    from vehicle_data_tracker.runner import crawl_settings
+    from vehicle_data_tracker.snapshots import SnapshotLog
+
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.query',
+                                     description='Query the vehicles of past runs, or load vehicles to query.')
+    parser.add_argument('command', choices=('find', 'import', 'snapshots'))
+    parser.add_argument('--db', default=None, help='the query database, default QUERY_DB')
+    parser.add_argument('--input', default=None, help='csv file to import, default VEHICLES_OUTPUT')
+    parser.add_argument('--make', default=None)
+    parser.add_argument('--model', default=None, help='text the model name contains')
+    parser.add_argument('--year-min', type=int, default=None)
+    parser.add_argument('--year-max', type=int, default=None)
+    parser.add_argument('--msrp-min', type=int, default=None, help='in dollars')
+    parser.add_argument('--msrp-max', type=int, default=None, help='in dollars')
+    runs = parser.add_mutually_exclusive_group()
+    runs.add_argument('--run', default=None, help='only look at this run, instead of the latest one of each make')
+    runs.add_argument('--all-runs', action='store_true', help='look at every run')
+    parser.add_argument('--limit', type=int, default=None, help='the most vehicles to list')
+    args = parser.parse_args(argv)
+    settings = crawl_settings()
+    with QueryIndex(args.db or settings.get('QUERY_DB') or 'query.db') as index:
+        if args.command == 'import':
+            run_id = new_run_id()
+            count = index.add_run(run_id, read_rows(args.input or settings.get('VEHICLES_OUTPUT')))
+            print(f'{count} vehicles added as run {run_id}')
+        elif args.command == 'snapshots':
+            log = SnapshotLog(settings.get('SNAPSHOT_DIR'), settings.getint('SNAPSHOT_FULL_EVERY'))
+            print(f'{len(index.load_snapshots(log))} snapshots added')
+        else:
+            start = time.perf_counter()
+            vehicles = index.find(args.make, args.model, args.year_min, args.year_max, args.msrp_min, args.msrp_max,
+                                  args.run, args.all_runs, args.limit)
+            elapsed = time.perf_counter() - start
+            for vehicle in vehicles:
+                print(f'{vehicle["year"]}  {vehicle["make"]}  {vehicle["model"]}  {vehicle["trim"]}  '
+                      f'{format_msrp(vehicle["msrp"])}  ({vehicle["run_id"]})')
+            print(f'{len(vehicles)} vehicles in {elapsed * 1000:.1f}ms', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
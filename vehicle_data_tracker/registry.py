@@ -0,0 +1,151 @@
+"""
+A registry of the available spiders, so that a crawl only imports the spider modules it actually runs.
+
+Scrapy's default spider loader imports every module in SPIDER_MODULES as soon as a crawl starts, including dead ones
+like acura_old.py and chrysler.py. Instead, spiders/registry.json records the module, class and metadata (name, allowed
+domains, makes written) of the spider of every make in MAKES_LIST['available'], and RegistrySpiderLoader imports a
+spider's module only when that spider is loaded.
+
+The registry is generated by reading the spider modules' source code, without importing them. After adding a spider
+or changing MAKES_LIST, regenerate it by entering:
+
+python -m vehicle_data_tracker.registry
+"""
+import ast
+import importlib
+import json
+import pathlib
+from urllib.parse import urlparse
+
+from vehicle_data_tracker.utilities import MAKES_LIST
+
+SPIDERS_PACKAGE = 'vehicle_data_tracker.spiders'
+SPIDERS_DIR = pathlib.Path(__file__).parent.joinpath('spiders')
+REGISTRY_PATH = SPIDERS_DIR.joinpath('registry.json')
+
+_registry = None
+
+
+def _class_attributes(class_node: ast.ClassDef):
+    """
+    Returns the literal values assigned in the body of a class, e.g. {'name': 'audi', 'allowed_domains': [...]}.
+    Assignments whose value is not a literal are skipped.
+    """
+    attributes = {}
+    for node in class_node.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                attributes[node.targets[0].id] = ast.literal_eval(node.value)
+            except ValueError:
+                pass
+    return attributes
+
+
+def _find_spider_class(source: str):
+    """
+    Returns the name and attributes of the first class in ``source`` that has a ``name`` attribute, as spider classes
+    do.
+    """
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ClassDef):
+            attributes = _class_attributes(node)
+            if 'name' in attributes:
+                return node.name, attributes
+    raise ValueError('no spider class found')
+
+
+def build_registry():
+    """
+    Builds the registry from MAKES_LIST and the source code of the spider modules.
+
+    :return: a dict mapping each spider name to a dict with the make, module, class, allowed domains and makes written
+        (in lowercase, as they appear in the make column of vehicles.csv) of the spider
+    """
+    registry = {}
+    for make, filename in MAKES_LIST['available'].items():
+        class_name, attributes = _find_spider_class(SPIDERS_DIR.joinpath(filename).read_text(encoding='utf-8'))
+        name = attributes['name']
+        if name in MAKES_LIST['groups']:
+            makes = list(MAKES_LIST['groups'][name])
+        else:
+            makes = [attributes.get('name_long', name).lower()]
+        registry[name] = {'make': make,
+                          'module': f'{SPIDERS_PACKAGE}.{filename.replace(".py", "")}',
+                          'class': class_name,
+                          'allowed_domains': attributes.get('allowed_domains', []),
+                          'makes': makes}
+    return registry
+
+
+def write_registry(path=REGISTRY_PATH):
+    registry = build_registry()
+    with open(path, 'w') as registry_file:
+        json.dump(registry, registry_file, indent=2)
+        registry_file.write('\n')
+    return registry
+
+
+def load_registry():
+    """
+    Returns the registry, reading it from spiders/registry.json the first time, or building it from source if the file
+    is missing.
+    """
+    global _registry
+    if _registry is None:
+        try:
+            with open(REGISTRY_PATH, 'r') as registry_file:
+                _registry = json.load(registry_file)
+        except FileNotFoundError:
+            _registry = build_registry()
+    return _registry
+
+
+def spider_makes(name: str):
+    """
+    Returns the makes written by the spider called ``name``, in lowercase, as they appear in the make column.
+
+    :raise KeyError: if there is no spider with that name in the registry
+    """
+    return load_registry()[name]['makes']
+
+
+def spider_class(name: str):
+    """
+    Imports the module of the spider called ``name`` and returns the spider class.
+
+    :raise KeyError: if there is no spider with that name in the registry
+    """
+    entry = load_registry()[name]
+    return getattr(importlib.import_module(entry['module']), entry['class'])
+
+
+class RegistrySpiderLoader:
+    """
+    A Scrapy spider loader (see the SPIDER_LOADER_CLASS setting) that looks spiders up in the registry instead of
+    importing every module in SPIDER_MODULES.
+    """
+    def __init__(self, settings=None):
+        self.registry = load_registry()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings)
+
+    def load(self, spider_name: str):
+        try:
+            return spider_class(spider_name)
+        except KeyError:
+            raise KeyError(f'Spider not found: {spider_name}')
+
+    def list(self):
+        return list(self.registry)
+
+    def find_by_request(self, request):
+        host = urlparse(request.url).hostname or ''
+        return [name for name, entry in self.registry.items()
+                if any(host == domain or host.endswith('.' + domain) for domain in entry['allowed_domains'])]
+
+
+if __name__ == '__main__':
+    for spider, info in write_registry().items():
+        print(f'{spider}: {info["module"]}.{info["class"]}')
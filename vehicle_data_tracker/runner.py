@@ -0,0 +1,529 @@
+"""
+Runs the spiders of several makes concurrently inside a single Scrapy process.
+
+Running "[UPDATE ALL]" used to start one "scrapy runspider" subprocess per make and wait for each one to finish before
+starting the next, so a full refresh took as long as every spider put together. Here, all the requested spiders are
+scheduled on one CrawlerProcess (and so one reactor), which makes a full refresh take roughly as long as the slowest
+make.
+
+Spiders that have taken the longest in past runs are started first (see history.py), so that they do not hold up
+the end of the run.
+
+Concurrency is limited on three levels:
+    - CONCURRENT_SPIDERS: how many spiders may be crawling at the same time
+    - CONCURRENT_REQUESTS: how many requests each of those spiders may have in flight
+    - CONCURRENT_REQUESTS_PER_DOMAIN: how many of those requests may go to the same domain
+The number of requests in flight across the whole process is therefore at most
+CONCURRENT_SPIDERS * CONCURRENT_REQUESTS.
+
+Parsing happens on the reactor thread, so one process only ever uses one core. For CPU-heavy refreshes, run_sharded
+splits the makes across several worker processes (see workers.py), each with a reactor of its own. Every worker
+writes to its own partition of the output file, and the partitions are merged into the output file once all workers
+are done.
+
+The command-line interface for all of this is in __main__.py.
+"""
+import csv
+import os
+import time
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer
+
+from vehicle_data_tracker.archive import Archive
+from vehicle_data_tracker.checkpoints import RunCheckpoint
+from vehicle_data_tracker.history import load_history
+from vehicle_data_tracker.history import longest_first
+from vehicle_data_tracker.history import pack_longest_first
+from vehicle_data_tracker.registry import spider_makes
+from vehicle_data_tracker.segments import compact
+from vehicle_data_tracker.segments import new_run_id
+from vehicle_data_tracker.snapshots import SnapshotLog
+from vehicle_data_tracker.store import VehicleStore
+from vehicle_data_tracker.trimindex import TrimSet
+from vehicle_data_tracker.trimindex import index_path
+from vehicle_data_tracker.trimindex import refresh_index
+from vehicle_data_tracker.utilities import MAKES_LIST
+from vehicle_data_tracker.utilities import PurgeScope
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+from vehicle_data_tracker.utilities import trim_id
+from vehicle_data_tracker.workers import WorkerPool
+
+
+def spider_name(make: str):
+    """
+    Returns the name of the spider that crawls ``make``.
+
+    :param make: a key of MAKES_LIST['available'], e.g. 'Mercedes-Benz'
+    :return: the spider name, e.g. 'mercedes'
+    """
+    return MAKES_LIST['available'][make].replace('.py', '')
+
+
+def resolve_makes(names: list):
+    """
+    Translates the make names or spider names given on the command line into keys of MAKES_LIST['available'].
+    Matching is case-insensitive, and the single name 'all' selects every available make.
+
+    :param names: a list of strings such as ['Acura', 'vw', 'mercedes-benz']
+    :return: a list of make names, in the order given
+    :raise ValueError: if a name does not match any available make
+    """
+    if [name.lower() for name in names] == ['all']:
+        return list(MAKES_LIST['available'])
+    lookup = {}
+    for make in MAKES_LIST['available']:
+        lookup[make.lower()] = make
+        lookup[spider_name(make)] = make
+    makes = []
+    for name in names:
+        try:
+            makes.append(lookup[name.lower()])
+        except KeyError:
+            raise ValueError(f'unknown make: {name}')
+    return makes
+
+
+def crawl_settings(**overrides):
+    """
+    Loads the project settings, applying any settings given as keyword arguments (ignoring those that are None).
+    """
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'vehicle_data_tracker.settings')
+    settings = get_project_settings()
+    for name, value in overrides.items():
+        if value is not None:
+            settings.set(name, value, priority='cmdline')
+    return settings
+
+
+def crawl_status(finish_reason: str):
+    """
+    Returns the status of a make given the finish reason of its spider: 'done' if the spider finished normally,
+    'partial' if it was stopped early (by running out of budget, by a shutdown or by being cancelled) and 'failed'
+    otherwise.
+    """
+    if finish_reason == 'finished':
+        return 'done'
+    if finish_reason in ('budget_seconds', 'budget_requests', 'shutdown', 'cancelled'):
+        return 'partial'
+    return 'failed'
+
+
+def purge_committed(finish_reason: str, items: int):
+    """
+    Returns whether a spider that purged may replace the old rows of its make(s) with the ones it found: only if it
+    finished normally and found something, since a spider whose site is down also finishes normally, with no items.
+    Otherwise the old rows are kept.
+    """
+    return crawl_status(finish_reason) == 'done' and items > 0
+
+
+def crawl_result(crawler, elapsed: float, failure=None):
+    """
+    Summarizes a finished crawl.
+
+    :param crawler: the Crawler that ran the spider
+    :param elapsed: wall time of the crawl, in seconds
+    :param failure: the Failure the crawl ended with, if any
+    :return: a dict with the spider name, run id, status (see crawl_status), wall time, finish reason and request,
+        item and drop counts
+    """
+    stats = crawler.stats.get_stats() if crawler.stats else {}
+    reason = stats.get('finish_reason')
+    if failure is not None:
+        reason = f'error: {failure.getErrorMessage()}'
+    return {'spider': crawler.spidercls.name,
+            'run_id': crawler.settings.get('RUN_ID'),
+            'status': crawl_status(reason),
+            'seconds': round(elapsed, 3),
+            'finish_reason': reason,
+            'requests': stats.get('downloader/request_count', 0),
+            'items': stats.get('item_scraped_count', 0),
+            'dropped': stats.get('item_dropped_count', 0)}
+
+
+def skipped_result(make: str, reason: str, run_id: str = None):
+    """
+    Returns the crawl_result of a make whose spider never ran, e.g. because it was cancelled before its turn.
+    """
+    return {'spider': spider_name(make), 'run_id': run_id, 'status': crawl_status(reason), 'seconds': 0,
+            'finish_reason': reason, 'requests': 0, 'items': 0, 'dropped': 0}
+
+
+def results_run_id(results: dict):
+    """
+    Returns the run id of the crawl results of a run (see schedule_crawls), or None if there are none.
+    """
+    return next((result['run_id'] for result in results.values() if result.get('run_id')), None)
+
+
+def schedule_crawls(runner, makes: list, purge=False, max_spiders: int = None, checkpoint: RunCheckpoint = None,
+                    cancelled: set = None, on_state=None):
+    """
+    Schedules a crawl of every make in ``makes`` on ``runner``, with at most ``max_spiders`` spiders running at once
+    (CONCURRENT_SPIDERS by default). The spiders are started longest first, according to the CRAWL_HISTORY file.
+
+    The crawls are one run, with the run id of the RUN_ID setting, or a new one if it is empty (see
+    segments.new_run_id). The spiders get it as their RUN_ID setting, so that everything the run writes (query index
+    runs, Parquet files, segments) has the same run id, and so does the snapshot recorded afterwards (see
+    record_snapshot). It is in the crawl_result of every make.
+
+    To add makes to the run while it is under way, use a CrawlSchedule instead.
+
+    :param runner: a CrawlerRunner (or CrawlerProcess)
+    :param makes: a list of keys of MAKES_LIST['available']
+    :param purge: whether the spiders should purge old entries of their makes
+    :param max_spiders: the maximum number of spiders running at the same time
+    :param checkpoint: the RunCheckpoint of the run, if it is checkpointed. Whether the spiders purge is then up to the
+        checkpoint rather than ``purge``, and those that do not crawl with their JOBDIR in the checkpoint.
+    :param cancelled: makes that should not be crawled after all. Makes added to this set before their turn comes are
+        skipped, and end up with the 'cancelled' finish reason.
+    :param on_state: called with a make and its new state whenever a make starts ('running') or finishes (the status
+        of its crawl_result)
+    :return: a Deferred that fires with a dict mapping each make to its crawl_result once every crawl has finished
+    """
+    return CrawlSchedule(runner, makes, purge, max_spiders, checkpoint, cancelled, on_state).deferred
+
+
+class CrawlSchedule:
+    """
+    The crawls of a run scheduled by schedule_crawls (see there for the parameters), which more makes can be added to
+    with add until the run is over. The makes added wait for a free spot among the ``max_spiders`` like the others,
+    and are started in the order they were added, after the makes the run started with.
+
+    :ivar deferred: a Deferred that fires with a dict mapping each make to its crawl_result once every crawl has
+        finished, the ones added included
+    """
+    def __init__(self, runner, makes: list, purge=False, max_spiders: int = None, checkpoint: RunCheckpoint = None,
+                 cancelled: set = None, on_state=None):
+        if max_spiders is None:
+            max_spiders = runner.settings.getint('CONCURRENT_SPIDERS')
+        self.runner = runner
+        self.purge = purge
+        self.checkpoint = checkpoint
+        self.cancelled = cancelled
+        self.on_state = on_state
+        self.run_id = runner.settings.get('RUN_ID') or new_run_id()
+        self.semaphore = defer.DeferredSemaphore(max(1, max_spiders))
+        self.makes = []
+        self.results = {}
+        # the crawls that are running or waiting for a spot
+        self.pending = 0
+        self.over = False
+        self.deferred = defer.Deferred()
+        by_spider = {spider_name(make): make for make in makes}
+        history = load_history(runner.settings.get('CRAWL_HISTORY'))
+        # held until every make is added, so that crawls that are over right away (e.g. cancelled ones) do not end the
+        #  run before the others are added
+        self.pending += 1
+        for spider in longest_first(list(by_spider), history):
+            self.add(by_spider[spider])
+        # the results are in the order the makes were given in
+        self.makes.sort(key=list(makes).index)
+        self.crawl_over(None)
+
+    def add(self, make: str):
+        """
+        Adds a crawl of ``make`` to the run, unless the run is over already or already has it.
+
+        :return: whether the make was added
+        """
+        if self.over or make in self.makes:
+            return False
+        self.makes.append(make)
+        if self.checkpoint is not None and make not in self.checkpoint.state['makes']:
+            self.checkpoint.state['makes'].append(make)
+        self.pending += 1
+        # like DeferredList(consumeErrors=True), a crawl that could not even be started is left out of the results
+        self.semaphore.run(self.crawl, make).addErrback(lambda _: None).addCallback(self.crawl_over)
+        return True
+
+    def crawl(self, make: str):
+        if self.cancelled is not None and make in self.cancelled:
+            self.results[make] = skipped_result(make, 'cancelled', self.run_id)
+            if self.checkpoint is not None:
+                self.checkpoint.mark_finished(make, spider_name(make))
+            if self.on_state is not None:
+                self.on_state(make, self.results[make]['status'])
+            return
+        crawler = self.runner.create_crawler(spider_name(make))
+        crawler.settings.set('RUN_ID', self.run_id, priority='cmdline')
+        start = time.monotonic()
+        spider_purge = self.purge
+        if self.checkpoint is not None:
+            spider_purge = self.checkpoint.purge(make)
+            if not spider_purge:
+                crawler.settings.set('JOBDIR', self.checkpoint.jobdir(spider_name(make)), priority='cmdline')
+            self.checkpoint.mark_started(make)
+
+        def finished(failure):
+            self.results[make] = crawl_result(crawler, time.monotonic() - start, failure)
+            # a spider that was shut down keeps its JOBDIR, so that the run can pick up where it left off
+            if self.checkpoint is not None and self.results[make]['finish_reason'] != 'shutdown':
+                self.checkpoint.mark_finished(make, spider_name(make))
+            if self.on_state is not None:
+                self.on_state(make, self.results[make]['status'])
+
+        if self.on_state is not None:
+            self.on_state(make, 'running')
+        d = self.runner.crawl(crawler, purge=int(spider_purge))
+        d.addCallbacks(lambda _: finished(None), finished)
+        return d
+
+    def crawl_over(self, _):
+        self.pending -= 1
+        if not self.pending:
+            self.finish()
+
+    def finish(self):
+        self.over = True
+        self.deferred.callback({make: self.results[make] for make in self.makes if make in self.results})
+
+
+def open_checkpoint(settings, makes: list, purge=False, resume=False):
+    """
+    Starts a checkpoint for a run of ``makes`` in CHECKPOINT_DIR, or, if ``resume`` is True and there is a checkpoint
+    of an interrupted run, loads that one instead, setting PURGE_YEAR and PURGE_MODEL in ``settings`` to those of the
+    interrupted run.
+
+    :return: the RunCheckpoint (None if CHECKPOINT_DIR is empty) and the makes left to crawl
+    """
+    if not settings.get('CHECKPOINT_DIR'):
+        return None, makes
+    checkpoint = RunCheckpoint(settings.get('CHECKPOINT_DIR'))
+    if resume and checkpoint.load():
+        settings.set('PURGE_YEAR', checkpoint.state.get('purge_year', ''), priority='cmdline')
+        settings.set('PURGE_MODEL', checkpoint.state.get('purge_model', ''), priority='cmdline')
+        return checkpoint, checkpoint.pending()
+    checkpoint.start(makes, purge, settings.get('PURGE_YEAR'), settings.get('PURGE_MODEL'))
+    return checkpoint, makes
+
+
+def compact_output(settings):
+    """
+    With the segments backend, merges the latest segment of every make into VEHICLES_OUTPUT (see segments.compact).
+    With the sqlite backend, deletes the vehicles of the generations that purges have replaced (see
+    VehicleStore.collect). Does nothing with the csv backend, which writes to its final destination directly.
+    """
+    if settings.get('VEHICLES_BACKEND') == 'segments':
+        compact(settings.get('VEHICLES_SEGMENTS'), settings.get('VEHICLES_OUTPUT'))
+    elif settings.get('VEHICLES_BACKEND') == 'sqlite':
+        with VehicleStore(settings.get('VEHICLES_DB')) as store:
+            store.collect()
+
+
+def output_rows(settings):
+    """
+    Yields the vehicles the output holds, as lists of values in STANDARD_FIELDS order: the vehicles of the VEHICLES_DB
+    database with the sqlite backend, and the rows of VEHICLES_OUTPUT otherwise.
+    """
+    if settings.get('VEHICLES_BACKEND') == 'sqlite':
+        with VehicleStore(settings.get('VEHICLES_DB')) as store:
+            for row in store.rows():
+                yield list(row)
+        return
+    try:
+        with open(settings.get('VEHICLES_OUTPUT'), 'r', newline='', encoding='utf-8') as output_file:
+            for row in csv.reader(output_file):
+                if len(row) >= len(STANDARD_FIELDS) and row[0].lower() != 'year':
+                    yield row[:len(STANDARD_FIELDS)]
+    except FileNotFoundError:
+        return
+
+
+def record_snapshot(settings, results: dict):
+    """
+    Records a snapshot of the output once a run is over (see snapshots.py), with the run id and the status of each make
+    of the run, and adds the vehicles of the snapshot to the archive (see archive.py) unless the ARCHIVE_FILE setting
+    is empty. Does nothing if the SNAPSHOT_DIR setting is empty.
+
+    :param results: a dict mapping each make to its crawl_result
+    :return: the manifest entry of the snapshot, or None
+    """
+    if not settings.get('SNAPSHOT_DIR'):
+        return None
+    log = SnapshotLog(settings.get('SNAPSHOT_DIR'), settings.getint('SNAPSHOT_FULL_EVERY'))
+    entry = log.record(output_rows(settings), {make: result['status'] for make, result in results.items()},
+                       results_run_id(results))
+    if settings.get('ARCHIVE_FILE'):
+        Archive(settings.get('ARCHIVE_FILE')).add_run(entry['run_id'], output_rows(settings), entry['timestamp'])
+    return entry
+
+
+def run_crawl(makes: list, purge=False, max_spiders: int = None, concurrent_requests: int = None,
+              per_domain: int = None, output: str = None, settings: dict = None, resume=False, checkpointed=True):
+    """
+    Crawls every make in ``makes`` concurrently in this process, blocking until all spiders are finished. Since
+    the Twisted reactor cannot be restarted, this can only be called once per process.
+
+    Unless ``checkpointed`` is False or the CHECKPOINT_DIR setting is empty, the run is checkpointed (see
+    checkpoints.py), replacing any earlier checkpoint.
+
+    :param output: the csv file to write to, instead of VEHICLES_OUTPUT
+    :param settings: any other settings to override, by name
+    :param resume: if there is a checkpoint of an unfinished run, resume that run instead, ignoring ``makes`` and
+        ``purge``
+    :return: a dict mapping each make to its crawl_result
+    """
+    settings = crawl_settings(CONCURRENT_SPIDERS=max_spiders,
+                              CONCURRENT_REQUESTS=concurrent_requests,
+                              CONCURRENT_REQUESTS_PER_DOMAIN=per_domain,
+                              VEHICLES_OUTPUT=output,
+                              **(settings or {}))
+    checkpoint = None
+    if checkpointed:
+        checkpoint, makes = open_checkpoint(settings, makes, purge, resume)
+
+    process = CrawlerProcess(settings)
+    results = {}
+    d = schedule_crawls(process, makes, purge, checkpoint=checkpoint)
+    d.addCallback(results.update)
+
+    from twisted.internet import reactor
+
+    def stop(_):
+        # on Ctrl-C, the process stops the reactor by itself. If every spider failed to start (e.g. because of a
+        #  misconfigured middleware), the crawls are over before the reactor is, so it is stopped once it runs.
+        if reactor.running:
+            reactor.stop()
+        else:
+            reactor.callWhenRunning(reactor.stop)
+
+    d.addBoth(stop)
+    process.start(stop_after_crawl=False)
+    compact_output(settings)
+    return results
+
+
+def partition_path(output_file: str, index: int):
+    """
+    Returns the name of the partition of ``output_file`` written by worker ``index``, e.g. vehicles.part0.csv.
+    """
+    root, ext = os.path.splitext(output_file)
+    return f'{root}.part{index}{ext}'
+
+
+def merge_partitions(output_file: str, partitions: list, purged=(), year: str = '', model: str = '', discarded=()):
+    """
+    Merges the rows of the given partitions into ``output_file``.
+
+    The existing rows of ``output_file`` are copied over in their original order, except for those whose make is in
+    ``purged`` (and, if they are given, whose year is ``year`` and model is ``model``, see utilities.PurgeScope). The
+    new rows from the partitions follow, except for those whose make is in ``discarded``, sorted by year, make, model,
+    trim and msrp so that the result does not depend on which worker finished first. Like in DuplicatePipeline, a new
+    row is dropped if a row with the same year, make, model and trim was already written. The output file is replaced
+    in one step once the merge is complete, and its trim index (see trimindex.py) is brought up to date. The partitions
+    and their trim indexes are deleted afterwards.
+
+    :param output_file: the csv file to merge into, which does not need to exist yet
+    :param partitions: a list of csv files written by DuplicatePipeline, any of which may be missing
+    :param purged: lowercase names of the makes whose existing rows should be removed
+    :param discarded: lowercase names of the makes whose new rows should be left out, e.g. because their purge was not
+        committed
+    """
+    scope = PurgeScope(purged, year, model)
+    ids_seen = TrimSet()
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', newline='', encoding='utf-8') as merged:
+        writer = csv.writer(merged)
+        writer.writerow(STANDARD_FIELDS)
+        try:
+            with open(output_file, 'r', newline='', encoding='utf-8') as existing:
+                for row in csv.reader(existing):
+                    if row and row[0].lower() != 'year' and not scope.covers(row):
+                        writer.writerow(row)
+                        ids_seen.add(trim_id(*row[0:4]))
+        except FileNotFoundError:
+            pass
+
+        new_rows = []
+        for partition in partitions:
+            try:
+                with open(partition, 'r', newline='', encoding='utf-8') as part:
+                    new_rows.extend(row for row in csv.reader(part)
+                                    if row and row[0].lower() != 'year' and row[1].lower() not in discarded)
+            except FileNotFoundError:
+                pass
+        new_rows.sort()
+        for row in new_rows:
+            identity = trim_id(*row[0:4])
+            if identity not in ids_seen:
+                ids_seen.add(identity)
+                writer.writerow(row)
+    os.replace(temp_file, output_file)
+    refresh_index(output_file)
+    for partition in partitions:
+        for path in (partition, index_path(partition)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def run_sharded(makes: list, workers: int, purge=False, max_spiders: int = None, concurrent_requests: int = None,
+                per_domain: int = None, output: str = None, settings: dict = None):
+    """
+    Crawls ``makes`` in up to ``workers`` processes at once (see workers.py), each running its share of the spiders
+    concurrently, then merges what they found into the output file with merge_partitions (unless VEHICLES_BACKEND is
+    'sqlite' or 'segments', in which case they all write to the database or to segments directly). The makes are split
+    so that the workers, each running up to ``max_spiders`` spiders at once (CONCURRENT_SPIDERS by default), are
+    expected to finish at about the same time, according to the CRAWL_HISTORY file (see history.pack_longest_first).
+
+    :return: a dict mapping each make to its crawl_result
+    """
+    project_settings = crawl_settings(VEHICLES_OUTPUT=output, **(settings or {}))
+    output_file = project_settings.get('VEHICLES_OUTPUT')
+    by_spider = {spider_name(make): make for make in makes}
+    history = load_history(project_settings.get('CRAWL_HISTORY'))
+    concurrency = max_spiders or project_settings.getint('CONCURRENT_SPIDERS')
+    shards = [[by_spider[spider] for spider in group]
+              for group in pack_longest_first(list(by_spider), workers, history, concurrency)]
+    partitions = [partition_path(output_file, i) for i in range(len(shards))]
+    # the workers' crawls are all one run
+    run_id = project_settings.get('RUN_ID') or new_run_id()
+
+    # with the csv backend, each worker writes to its own partition without purging, since the purge is applied when
+    #  the partitions are merged. Unless the run purges, the vehicles already in the output file are dropped by the
+    #  workers (see VEHICLES_STORED), so that they are not counted as new ones. With the other backends, the workers
+    #  write to the database or to segments and purge their makes themselves, and segments are compacted once all
+    #  workers are done. Either way, the workers crawl without checkpoints, since the run cannot be resumed shard by
+    #  shard.
+    direct = project_settings.get('VEHICLES_BACKEND') in ('sqlite', 'segments')
+    results = {}
+    with WorkerPool(len(shards), project_settings.getint('WORKER_MAX_JOBS'), settings,
+                    project_settings.getfloat('PROGRESS_INTERVAL')) as pool:
+        pending = []
+        for shard, partition in zip(shards, partitions):
+            job_settings = {'CONCURRENT_REQUESTS': concurrent_requests, 'CONCURRENT_REQUESTS_PER_DOMAIN': per_domain,
+                            'RUN_ID': run_id}
+            if not direct:
+                if os.path.exists(partition):
+                    os.remove(partition)
+                job_settings['VEHICLES_OUTPUT'] = partition
+                if not purge:
+                    job_settings['VEHICLES_STORED'] = output_file
+            pending.append(pool.submit(shard, purge=purge and direct, max_spiders=max_spiders, checkpointed=False,
+                                       record=False, compact=False, settings=job_settings))
+        for shard, future in zip(shards, pending):
+            try:
+                results.update(future.result())
+            except Exception as e:
+                for make in shard:
+                    results[make] = skipped_result(make, f'error: {e}', run_id)
+    if direct:
+        compact_output(project_settings)
+        return {make: results[make] for make in makes if make in results}
+
+    # as in DuplicatePipeline, the rows of a purged make are only replaced if its spider committed the purge, and
+    #  otherwise, the make keeps its old rows and the new ones are thrown away
+    purged = set()
+    discarded = set()
+    if purge:
+        for make in makes:
+            result = results.get(make)
+            if result is not None and purge_committed(result['finish_reason'], result['items']):
+                purged.update(spider_makes(spider_name(make)))
+            else:
+                discarded.update(spider_makes(spider_name(make)))
+    merge_partitions(output_file, partitions, purged, project_settings.get('PURGE_YEAR'),
+                     project_settings.get('PURGE_MODEL'), discarded)
+    return {make: results[make] for make in makes if make in results}
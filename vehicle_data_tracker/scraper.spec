@@ -23,6 +23,25 @@ a = Analysis(['scraper_app.py'],
 					('.\\utilities.py',		'.\\vehicle_data_tracker\\'),
 					('.\\pipelines.py',		'.\\vehicle_data_tracker\\'),
                     ('.\\middlewares.py',	'.\\vehicle_data_tracker\\'),
+                    ('.\\archive.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\checkpoints.py',	'.\\vehicle_data_tracker\\'),
+                    ('.\\columnar.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\daemon.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\dedup.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\diff.py',			'.\\vehicle_data_tracker\\'),
+                    ('.\\history.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\extensions.py',	'.\\vehicle_data_tracker\\'),
+                    ('.\\monitor.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\query.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\registry.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\runner.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\segments.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\service.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\snapshots.py',	'.\\vehicle_data_tracker\\'),
+                    ('.\\store.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\trimindex.py',	'.\\vehicle_data_tracker\\'),
+                    ('.\\workers.py',		'.\\vehicle_data_tracker\\'),
+                    ('.\\__main__.py',		'.\\vehicle_data_tracker\\'),
                     ('.\\__init__.py',		'.\\vehicle_data_tracker\\'),
 					('.\\settings.py',		'.\\vehicle_data_tracker\\spiders\\vehicle_data_tracker\\'),
 					('.\\items.py',			'.\\vehicle_data_tracker\\spiders\\vehicle_data_tracker\\'),
@@ -31,7 +50,9 @@ a = Analysis(['scraper_app.py'],
 					('.\\middlewares.py',	'.\\vehicle_data_tracker\\spiders\\vehicle_data_tracker\\'),
 					('.\\media\\',			'.\\media\\'),
 					],
-             hiddenimports=['vehicle_data_tracker.spiders', 'vehicle_data_tracker.pipelines'],
+             hiddenimports=['vehicle_data_tracker.spiders', 'vehicle_data_tracker.pipelines',
+                            'vehicle_data_tracker.registry', 'vehicle_data_tracker.service',
+                            'vehicle_data_tracker.workers'],
              # hookspath=['.\\hooks\\'],
 			 hookspath=[],
              hooksconfig={},
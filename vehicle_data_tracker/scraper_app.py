@@ -2,7 +2,7 @@
 The application that ties everything together. GUI made with Tkinter, web crawling made with Scrapy.
 
 Author: Tyler Jaafari
-Version: 1.1.0
+Version: 1.7.4
     0.5.0 - created basic GUI
     0.7.0 - refined GUI, implemented all spiders, added "Purge?" button
     0.8.0 - made the "Crawl!" button do something
@@ -20,14 +20,38 @@ Version: 1.1.0
 
     1.1.0 - okay that did not actually work
           - implemented dynamic creation of virtual environment for installing and launching scrapy
+
+    1.2.0 - "[UPDATE ALL]" now crawls every make concurrently in a single subprocess instead of one after another
+    1.2.1 - crawl output is read as it comes instead of all at once at the end, and crawl progress is shown live
+    1.3.0 - added "Resume" button to continue an interrupted "[UPDATE ALL]" run from its checkpoint
+    1.4.0 - if Scrapy can be imported (e.g. from the frozen bundle), crawls run inside the app and no virtual
+            environment is needed; otherwise the virtual environment is only set up once, on Linux as well
+    1.5.0 - crawls are handed to a pool of worker processes started with the app, which have Scrapy and the spiders
+            loaded already
+    1.6.0 - added the crawl queue: several makes can be selected and crawled in parallel, and each of them can be
+            cancelled on its own
+    1.7.0 - added the "Year" and "Model" fields, which narrow a crawl (and a purge) down to one model year, or one
+            model of a year, of the chosen makes
+    1.7.1 - makes queued while others are crawling start as soon as fewer than "Parallel" makes are crawling, instead
+            of once all of them are done
+    1.7.2 - the "Resume" button looks for interrupted runs in the CHECKPOINT_DIR setting, like
+            "python -m vehicle_data_tracker --resume" does, so each of them can resume the runs of the other
+    1.7.3 - the app no longer imports Scrapy to start the crawl workers, and its controls can be used right away
+            instead of once a worker is warm
+    1.7.4 - crawling a single make no longer replaces the checkpoint of an interrupted "[UPDATE ALL]" run
 """
+import importlib.util
+import multiprocessing
 import os
 import pathlib
+import sys
 from tkinter import *
 from tkinter import ttk
 from tkinter import messagebox
 from PIL import Image, ImageTk
 from utilities import MAKES_LIST
+from monitor import OutputMonitor
+from checkpoints import RunCheckpoint
 import subprocess
 import threading
 
@@ -36,7 +60,12 @@ class ScraperApp:
     """
     To run from console, enter:
 
-    scrapy runspider -a purge=(0 or 1) (make).py
+    scrapy runspider -a purge=(0 or 1) [-a purge_year=(year) [-a purge_model=(model)]] (make).py
+
+    or, to crawl several makes at once without the app:
+
+    python -m vehicle_data_tracker --purge (0 or 1) [--purge-year (year) [--purge-model (model)]]
+                                   (all | make [make ...])
     """
     UPDATE_ALL_TEXT = '[UPDATE ALL]'
 
@@ -45,14 +74,37 @@ class ScraperApp:
                  'Check the box labeled "Purge" to remove old entries of the chosen make (recommended after'
                  ' app is updated). Leave it unchecked for duplicate-checking instead.',
 
+                 'To only crawl one model year of the chosen make(s), enter it under "Year", and to only crawl one'
+                 ' model of that year, enter its name under "Model" as well. With "Purge" checked, only the old entries'
+                 ' of that year (and model) are removed, and the rest of the make is kept.',
+
                  'When you are ready, click the "Crawl!" button. Running the process on all makes can take several minutes.',
 
-                 'Please do not close the app until the process is complete.']
+                 'To crawl a handful of makes, select them in the "Crawl Queue" list (Ctrl-click or Shift-click to'
+                 ' select several) and click "Queue". Up to "Parallel" makes are crawled at the same time, and makes'
+                 ' queued while others are crawling start as soon as one of them is done (or once all of them are, if'
+                 ' "Purge", "Year" or "Model" was changed in between). Select makes in the queue and click "Cancel" to'
+                 ' stop them without stopping the others.',
+
+                 'Please do not close the app until the process is complete. If an "[UPDATE ALL]" run is'
+                 ' interrupted anyway, click the "Resume" button the next time the app is opened to pick up where it'
+                 ' left off.']
 
     OUTPUT_DIR = pathlib.Path(__file__).parent
 
+    # how many lines of a crawl's output to keep in memory
+    OUTPUT_LINES = 500
+
+    # crawl queue states of a make that is not done yet
+    QUEUE_PENDING = ('queued', 'running', 'cancelling')
+
+    # where the scrapy and python executables of the fallback virtual environment are
+    ENV_SCRIPTS = 'Scripts' if sys.platform == 'win32' else 'bin'
+
     def __init__(self, master: Tk):
         master.title('S.C.R.A.P.E.R.')
+        self.master = master
+        self.workerPool = None
         self.parentPath = pathlib.Path(__file__).parent
         iconPath = os.sep.join((str(self.parentPath), 'media', 'FiWize_Symbol-smiley.png'))
         master.iconphoto(True, [PhotoImage(file=iconPath)])
@@ -62,7 +114,7 @@ class ScraperApp:
         master.columnconfigure(0, weight=1)
         master.columnconfigure(1, weight=2)
         master.columnconfigure(2, weight=1)
-        master.minsize(width=650, height=380)
+        master.minsize(width=900, height=420)
         self.headerLabel = ttk.Label(master,
                                      text='Welcome to the Selective Car Retrieval And Processing Efficient Robot')
         self.headerLabel.config(wraplength=250, justify=CENTER, font=('Courier', 12))
@@ -92,6 +144,18 @@ class ScraperApp:
         self.purgeCheckButton = ttk.Checkbutton(self.updateFrame, text='Purge', variable=self.purgeFlag)
         self.purgeCheckButton.pack(anchor=NE)
 
+        # the purge scope (see utilities.PurgeScope), which narrows crawls down to a model year or a model of a year
+        self.scopeFrame = ttk.Frame(self.updateFrame)
+        self.purgeYear = StringVar()
+        self.purgeModel = StringVar()
+        ttk.Label(self.scopeFrame, text='Year').grid(row=0, column=0, stick='e')
+        self.purgeYearEntry = ttk.Entry(self.scopeFrame, textvariable=self.purgeYear, width=6)
+        self.purgeYearEntry.grid(row=0, column=1, stick='w', padx=5)
+        ttk.Label(self.scopeFrame, text='Model').grid(row=0, column=2, stick='e')
+        self.purgeModelEntry = ttk.Entry(self.scopeFrame, textvariable=self.purgeModel, width=14)
+        self.purgeModelEntry.grid(row=0, column=3, stick='w', padx=5)
+        self.scopeFrame.pack(anchor=NE, pady=2)
+
         makes = [self.UPDATE_ALL_TEXT]
         longest = 0
         for make in MAKES_LIST['available']:
@@ -111,6 +175,10 @@ class ScraperApp:
         self.updateLabel = ttk.Label(self.updateFrame, wraplength=200)
         self.crawlButton = ttk.Button(self.updateFrame, text='Crawl!', command=self.crawl_button_click)
         self.crawlButton.pack()
+        self.resumeButton = ttk.Button(self.updateFrame, text='Resume', command=self.resume_button_click)
+        # the checkpoint of interrupted multi-make runs, which is only known once the settings are loaded (see
+        #  load_checkpoint)
+        self.checkpoint = None
         self.updateLabel.pack()
 
         self.closeAppCautionLabel = ttk.Label(master, text='', justify=CENTER)
@@ -118,43 +186,136 @@ class ScraperApp:
 
         self.progressBar = ttk.Progressbar(self.updateFrame, orient='horizontal', mode='indeterminate', length=200)
 
+        # the crawl queue, which is only shown once the worker pool is running (see start_worker_pool)
+        self.queueFrame = ttk.LabelFrame(master, text='Crawl Queue')
+        self.makeListbox = Listbox(self.queueFrame, selectmode=EXTENDED, exportselection=False, height=8,
+                                   width=longest + 2)
+        self.makeListbox.insert(END, *MAKES_LIST['available'])
+        self.makeListbox.grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+        self.makeScrollbar = ttk.Scrollbar(self.queueFrame, orient=VERTICAL, command=self.makeListbox.yview)
+        self.makeListbox.config(yscrollcommand=self.makeScrollbar.set)
+        self.makeScrollbar.grid(row=0, column=2, stick='ns')
+        self.concurrency = IntVar(value=4)
+        ttk.Label(self.queueFrame, text='Parallel').grid(row=1, column=0, stick='e')
+        self.concurrencySpinbox = ttk.Spinbox(self.queueFrame, from_=1, to=16, width=4, textvariable=self.concurrency)
+        self.concurrencySpinbox.grid(row=1, column=1, stick='w', padx=5)
+        self.queueButton = ttk.Button(self.queueFrame, text='Queue', command=self.queue_button_click)
+        self.queueButton.grid(row=2, column=0, columnspan=2, pady=5)
+        self.queueTree = ttk.Treeview(self.queueFrame, columns=('state', 'items'), height=6)
+        self.queueTree.heading('#0', text='Make')
+        self.queueTree.heading('state', text='State')
+        self.queueTree.heading('items', text='Items')
+        self.queueTree.column('#0', width=110)
+        self.queueTree.column('state', width=80)
+        self.queueTree.column('items', width=50, anchor=E)
+        self.queueTree.grid(row=3, column=0, columnspan=3, padx=5)
+        self.cancelButton = ttk.Button(self.queueFrame, text='Cancel', command=self.cancel_button_click)
+        self.cancelButton.grid(row=4, column=0, columnspan=2, pady=5)
+        # makes waiting to be crawled, and the Future, makes and options (see queue_options) of the batch being crawled
+        self.queuedMakes = []
+        self.batch = None
+        self.batchMakes = []
+        self.batchOptions = None
+
         if pathlib.Path(__file__).parent.joinpath('vehicle_data_tracker').exists():
             self.spidersPath = os.sep.join((str(pathlib.Path(__file__).parent), 'vehicle_data_tracker', 'spiders'))
+            self.projectPath = pathlib.Path(__file__).parent
         else:
             self.spidersPath = os.sep.join((str(pathlib.Path(__file__).parent), 'spiders'))
+            self.projectPath = pathlib.Path(__file__).parent.parent
 
         self.disable_critical_controls()
         self.closeAppCautionLabel.config(text='Initializing, please wait...')
-        init_venv_thread = threading.Thread(group=None, target=self.install_venv, name='init_venv_thread')
-        init_venv_thread.start()
+        # finding the scrapy module does not import it, so this check is instant, and so is starting the pool, whose
+        #  workers warm up in the background
+        if importlib.util.find_spec('scrapy') is not None:
+            self.start_worker_pool()
+        else:
+            init_thread = threading.Thread(group=None, target=self.install_venv, name='init_venv_thread')
+            init_thread.start()
+
+    def load_settings(self):
+        """
+        Imports the settings module of the crawls (SCRAPY_SETTINGS_MODULE, or the project's) and returns it. The module
+        is read as it is, without Scrapy, so that the app never has to import Scrapy itself.
+        """
+        if str(self.projectPath) not in sys.path:
+            sys.path.insert(0, str(self.projectPath))
+        return importlib.import_module(os.environ.get('SCRAPY_SETTINGS_MODULE', 'vehicle_data_tracker.settings'))
+
+    def start_worker_pool(self):
+        """
+        Starts the pool of warm crawl workers (see workers.py) that every crawl is run with from then on. Used when
+        Scrapy can be imported, either from the interpreter running the app or from the frozen bundle, but only the
+        workers import it. The controls are enabled right away: crawls started before a worker is warm wait for it in
+        the pool's queue.
+        """
+        settings = self.load_settings()
+        from vehicle_data_tracker.workers import WorkerPool
+        self.load_checkpoint(getattr(settings, 'CHECKPOINT_DIR', ''))
+        self.workerPool = WorkerPool(getattr(settings, 'WORKER_POOL_SIZE', 2), getattr(settings, 'WORKER_MAX_JOBS', 10),
+                                     interval=getattr(settings, 'PROGRESS_INTERVAL', 1.0))
+        self.queueFrame.grid(row=1, column=2, padx=5, pady=5, stick='n')
+        self.closeAppCautionLabel.config(text='')
+        self.enable_critical_controls()
 
     def install_venv(self):
-        if not self.parentPath.joinpath('scraper_env').exists():
+        """
+        Fallback for when Scrapy cannot be imported by the app: creates the scraper_env virtual environment and installs
+        Scrapy in it, which crawl subprocesses are then run with. This is skipped if a previous launch already did it.
+        """
+        envPath = self.parentPath.joinpath('scraper_env')
+        scrapyPath = envPath.joinpath(self.ENV_SCRIPTS, 'scrapy')
+        if not (scrapyPath.exists() or scrapyPath.with_suffix('.exe').exists()):
             if sys.platform == "win32":
-                subprocess.run('where python', shell=True)
-                subprocess.run(f'py -m venv "{self.parentPath.joinpath("scraper_env")}"', shell=True)
+                subprocess.run(f'py -m venv "{envPath}"', shell=True)
             else:
-                subprocess.run(f'python3 -m venv "{self.parentPath.joinpath("scraper_env")}"', shell=True)
+                subprocess.run(f'python3 -m venv "{envPath}"', shell=True)
 
-            parentPathStr = str(self.parentPath)
-            if sys.platform == "win32":
-                pip_command = os.sep.join((parentPathStr, 'scraper_env', 'Scripts', 'pip'))
-                subprocess.run(f'"{pip_command}" install --upgrade pip', shell=True)
-                print('--------------------------------------------------------------------------------')
+            pip_command = os.sep.join((str(envPath), self.ENV_SCRIPTS, 'pip'))
+            subprocess.run(f'"{pip_command}" install --upgrade pip', shell=True)
+            print('--------------------------------------------------------------------------------')
 
-                subprocess.run(f'"{pip_command}" install scrapy', shell=True)
-                print('--------------------------------------------------------------------------------')
-            else:
-                activate_command = f'source {os.sep.join(("scraper_env", "bin", "activate"))}'
-                p = subprocess.Popen(activate_command, universal_newlines=True)
-                print(p.communicate(input='which python'))
+            subprocess.run(f'"{pip_command}" install scrapy', shell=True)
+            print('--------------------------------------------------------------------------------')
+        settings = self.load_settings()
+        self.load_checkpoint(getattr(settings, 'CHECKPOINT_DIR', ''))
         self.closeAppCautionLabel.config(text='')
         self.enable_critical_controls()
 
+    def scope_settings(self):
+        """
+        Returns the PURGE_YEAR and PURGE_MODEL settings for the year and model entered, leaving out those left empty.
+        """
+        scope = {'PURGE_YEAR': self.purgeYear.get().strip(), 'PURGE_MODEL': self.purgeModel.get().strip()}
+        return {name: value for name, value in scope.items() if value}
+
+    def scope_arguments(self, spider_arguments=True):
+        """
+        Returns the command-line arguments for the year and model entered: spider arguments for "scrapy runspider", or
+        options for "python -m vehicle_data_tracker".
+        """
+        scope = self.scope_settings()
+        names = {'PURGE_YEAR': 'purge_year', 'PURGE_MODEL': 'purge_model'}
+        if spider_arguments:
+            return ''.join(f'-a {names[name]}="{value}" ' for name, value in scope.items())
+        return ''.join(f'--{names[name].replace("_", "-")} "{value}" ' for name, value in scope.items())
+
+    def check_scope(self):
+        """
+        Returns whether the year and model entered make a valid scope, displaying an error message if they do not.
+        """
+        if self.purgeModel.get().strip() and not self.purgeYear.get().strip():
+            self.updateLabel.config(text='Please enter the year of the model.', foreground='red')
+            return False
+        return True
+
     def crawl_button_click(self):
         """
         Runs the spider selected in the combo box. Displays an error message if the selection is invalid.
         """
+        if not self.check_scope():
+            return
         if self.selectedMake.get() == self.UPDATE_ALL_TEXT:
             spiders = []
             for make in MAKES_LIST['available']:
@@ -165,43 +326,93 @@ class ScraperApp:
                                                   '\nPlease do not close the app while this is running.')
             self.progressBar.pack()
             self.progressBar.start()
+            if self.workerPool is not None:
+                self.updateLabel.config(text='Running ' + str(len(spiders)) + ' makes...', foreground='black')
+                self.run_in_worker([spider[0] for spider in spiders])
+                return
             crawl_all_thread = threading.Thread(group=None, target=self.crawl_multiple_spiders, name='crawl_all',
                                                 kwargs=args)
             crawl_all_thread.start()
         else:
             try:
                 spider = MAKES_LIST['available'][self.selectedMake.get()]
-                spiderPath = os.sep.join((str(self.spidersPath), spider))
-                scrapyPath = os.sep.join((str(self.parentPath), 'scraper_env', 'Scripts', 'scrapy'))
-                process_args = f'"{scrapyPath}" runspider -a purge={self.purgeFlag.get()} "{spiderPath}"'
-                args = {'process_args': process_args}
                 self.updateLabel.config(text='Running ' + self.selectedMake.get() + '...', foreground='black')
                 self.disable_critical_controls()
                 self.closeAppCautionLabel.config(text='Please do not close the app while this is running.')
                 self.progressBar.pack()
                 self.progressBar.start(interval=20)
+                if self.workerPool is not None:
+                    # not checkpointed, so that it does not replace the checkpoint of an interrupted "[UPDATE ALL]" run
+                    self.run_in_worker([self.selectedMake.get()], checkpointed=False)
+                    return
+                spiderPath = os.sep.join((str(self.spidersPath), spider))
+                scrapyPath = os.sep.join((str(self.parentPath), 'scraper_env', self.ENV_SCRIPTS, 'scrapy'))
+                process_args = (f'"{scrapyPath}" runspider -a purge={self.purgeFlag.get()} {self.scope_arguments()}'
+                                f'-s PROGRESS_ENABLED=1 "{spiderPath}"')
+                args = {'process_args': process_args}
                 crawl_thread = threading.Thread(group=None, target=self.start_crawl,
                                                 name=f'crawl_{spider.replace(".py", "")}', kwargs=args)
                 crawl_thread.start()
             except KeyError:
                 self.updateLabel.config(text='Please enter a valid make or choose from the list.', foreground='red')
 
-    def crawl_multiple_spiders(self, spiders: list, **kwargs):
+    def resume_button_click(self):
+        """
+        Resumes the last multi-make run, which was interrupted before it could finish.
+        """
+        self.disable_critical_controls()
+        self.closeAppCautionLabel.config(text='This process may take several minutes.'
+                                              '\nPlease do not close the app while this is running.')
+        self.progressBar.pack()
+        self.progressBar.start()
+        if self.workerPool is not None:
+            self.updateLabel.config(text='Resuming the last run...', foreground='black')
+            self.run_in_worker([], resume=True)
+            return
+        resume_thread = threading.Thread(group=None, target=self.crawl_multiple_spiders, name='resume',
+                                         kwargs={'spiders': [], 'resume': True})
+        resume_thread.start()
+
+    def load_checkpoint(self, directory: str):
+        """
+        Sets the checkpoint the "Resume" button resumes to the one in ``directory``, the CHECKPOINT_DIR setting of the
+        crawls, so that the app and "python -m vehicle_data_tracker --resume" resume each other's runs. An empty
+        ``directory`` turns checkpointing off, like it does for the crawls.
         """
-        Helper method for running multiple spiders consecutively. Runs on a separate thread to avoid the app freezing
-        while crawling is in progress.
+        self.checkpoint = RunCheckpoint(directory) if directory else None
+        self.update_resume_button()
+
+    def update_resume_button(self):
+        """
+        Shows the "Resume" button if there is an interrupted run to resume, and hides it otherwise.
+        """
+        if self.checkpoint is not None and self.checkpoint.load():
+            self.resumeButton.pack()
+        else:
+            self.resumeButton.pack_forget()
+
+    def crawl_multiple_spiders(self, spiders: list, resume=False, **kwargs):
+        """
+        Helper method for running multiple spiders at once. All of them are crawled concurrently by a single
+        subprocess (see runner.py and __main__.py), so this takes about as long as the slowest spider. Runs on a
+        separate thread to avoid the app freezing while crawling is in progress.
 
         :param spiders: a list of tuples containing the full make name followed by the corresponding spider
+        :param resume: resume the last run instead, if it was interrupted
         :param kwargs: I don't know why I included this
         """
-        self.updateLabel.config(foreground='black')
-        for spider in spiders:
-            self.updateLabel.config(text='Running ' + spider[0] + '...')
-            spiderPath = os.sep.join((str(self.spidersPath), spider[1]))
-            scrapyPath = os.sep.join((str(self.parentPath), 'scraper_env', 'Scripts', 'scrapy'))
-            process_args = f'"{scrapyPath}" runspider -a purge={self.purgeFlag.get()} "{spiderPath}"'
-            self.start_crawl(process_args, single_crawl=False)
+        pythonPath = os.sep.join((str(self.parentPath), 'scraper_env', self.ENV_SCRIPTS, 'python'))
+        if resume:
+            self.updateLabel.config(text='Resuming the last run...', foreground='black')
+            process_args = f'"{pythonPath}" -m vehicle_data_tracker --resume --progress'
+        else:
+            self.updateLabel.config(text='Running ' + str(len(spiders)) + ' makes...', foreground='black')
+            spiderNames = ' '.join(spider[1].replace('.py', '') for spider in spiders)
+            process_args = (f'"{pythonPath}" -m vehicle_data_tracker --purge {self.purgeFlag.get()} '
+                            f'{self.scope_arguments(spider_arguments=False)}--progress {spiderNames}')
+        self.start_crawl(process_args, single_crawl=False)
         self.progressBar.stop()
+        self.update_resume_button()
         self.updateLabel.config(text='Done.')
         self.closeAppCautionLabel.config(text='It is safe to close this window.'
                                               '\nNote: Occasionally, no Tesla data will be retrieved on the first run.'
@@ -209,20 +420,195 @@ class ScraperApp:
         self.enable_critical_controls()
 
     def start_crawl(self, process_args, single_crawl=True):
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        """
+        Runs a crawl subprocess and waits for it to finish. The output of the subprocess is consumed line by line as
+        it runs (see monitor.py), and the progress the spiders report is shown under the "Crawl!" button. The last
+        OUTPUT_LINES lines of output are kept in self.lastOutput afterwards.
+        """
+        startupinfo = None
+        if sys.platform == 'win32':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, (str(self.projectPath), env.get('PYTHONPATH'))))
         p = subprocess.Popen(process_args,
                              shell=True,
+                             env=env,
                              startupinfo=startupinfo,
-                             stdin=subprocess.PIPE,
+                             stdin=subprocess.DEVNULL,
                              stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-        p.communicate()
+                             stderr=subprocess.STDOUT)
+        self.runningText = self.updateLabel.cget('text')
+        monitor = OutputMonitor(p, max_lines=self.OUTPUT_LINES, on_progress=self.show_progress)
+        returncode = monitor.wait()
+        self.lastOutput = monitor.tail()
         if single_crawl:
             self.progressBar.stop()
-            self.updateLabel.config(text=self.updateLabel.cget('text') + ' done.')
+            if returncode == 0:
+                self.updateLabel.config(text=self.updateLabel.cget('text') + ' done.')
+            else:
+                self.updateLabel.config(text=self.runningText + ' failed.', foreground='red')
+            self.closeAppCautionLabel.config(text='It is safe to close this window.')
+            self.enable_critical_controls()
+
+    def run_in_worker(self, makes: list, resume=False, checkpointed=True):
+        """
+        Hands a crawl of ``makes`` to the worker pool, then keeps showing the progress of the crawl until it is over.
+
+        :param resume: resume the last run instead, if it was interrupted
+        :param checkpointed: keep a checkpoint of the crawl for the "Resume" button, which replaces the checkpoint of
+            the last run
+        """
+        self.runningText = self.updateLabel.cget('text')
+        future = self.workerPool.submit(makes, purge=bool(self.purgeFlag.get()), resume=resume,
+                                        settings=self.scope_settings(), checkpointed=checkpointed,
+                                        on_progress=self.show_totals)
+        self.poll_crawl(future)
+
+    def poll_crawl(self, future):
+        """
+        Checks every half second whether a crawl handed to the worker pool is over, and wraps up once it is.
+
+        :param future: the Future returned by WorkerPool.submit
+        """
+        if not future.done():
+            self.master.after(500, self.poll_crawl, future)
+            return
+        self.progressBar.stop()
+        try:
+            failed = [make for make, result in future.result().items() if result['status'] == 'failed']
+        except Exception as e:
+            failed = [str(e)]
+        if failed:
+            self.updateLabel.config(text='Done, but failed: ' + ', '.join(failed), foreground='red')
+        else:
+            self.updateLabel.config(text='Done.')
+        self.update_resume_button()
+        self.closeAppCautionLabel.config(text='It is safe to close this window.')
+        self.enable_critical_controls()
+
+    def queue_button_click(self):
+        """
+        Adds the makes selected in the list to the crawl queue, except for those already in it, and starts crawling
+        them as soon as there is room for them.
+        """
+        if not self.check_scope():
+            return
+        for index in self.makeListbox.curselection():
+            make = self.makeListbox.get(index)
+            if self.queueTree.exists(make):
+                if self.queueTree.set(make, 'state') in self.QUEUE_PENDING:
+                    continue
+                self.queueTree.item(make, values=('queued', ''))
+            else:
+                self.queueTree.insert('', END, iid=make, text=make, values=('queued', ''))
+            self.queuedMakes.append(make)
+        self.makeListbox.selection_clear(0, END)
+        self.start_queued_makes()
+
+    def queue_options(self):
+        """
+        Returns the purge flag and the PURGE_YEAR and PURGE_MODEL settings the queued makes are to be crawled with.
+        """
+        return bool(self.purgeFlag.get()), self.scope_settings()
+
+    def start_queued_makes(self):
+        """
+        Hands the queued makes to the worker pool. If a batch is being crawled with the same options, they are added to
+        it, and each of them starts as soon as fewer than "Parallel" makes of the batch are crawling (see
+        runner.CrawlSchedule). Otherwise they are handed over as a new batch, running up to "Parallel" of them at the
+        same time, once the batch being crawled is over. The batches are not checkpointed, so that they do not replace
+        the checkpoint of an interrupted "[UPDATE ALL]" run.
+        """
+        if self.batch is not None:
+            if self.queue_options() == self.batchOptions:
+                for make in self.queuedMakes:
+                    self.workerPool.add(self.batch, make)
+                self.batchMakes += self.queuedMakes
+                self.queuedMakes = []
+            return
+        if not self.queuedMakes:
             self.closeAppCautionLabel.config(text='It is safe to close this window.')
             self.enable_critical_controls()
+            return
+        self.batchMakes, self.queuedMakes = self.queuedMakes, []
+        self.batchOptions = self.queue_options()
+        for control in (self.crawlButton, self.resumeButton, self.comboBox):
+            control.state(['disabled'])
+        self.closeAppCautionLabel.config(text='Please do not close the app while this is running.')
+        purge, settings = self.batchOptions
+        self.batch = self.workerPool.submit(self.batchMakes, purge=purge, max_spiders=max(1, self.concurrency.get()),
+                                            checkpointed=False, settings=settings,
+                                            on_progress=self.show_queue_progress)
+        self.poll_batch()
+
+    def poll_batch(self):
+        """
+        Checks every half second whether the batch being crawled is over. Once it is, shows the result of each of its
+        makes and starts the queued makes. Makes that were added to the batch too late to be crawled by it, as it was
+        ending, are queued again.
+        """
+        if not self.batch.done():
+            self.master.after(500, self.poll_batch)
+            return
+        try:
+            results = self.batch.result()
+        except Exception:
+            results = None
+            for make in self.batchMakes:
+                self.queueTree.item(make, values=('failed', ''))
+        if results is not None:
+            late = []
+            for make in self.batchMakes:
+                if make in results:
+                    result = results[make]
+                    state = 'cancelled' if result['finish_reason'] == 'cancelled' else result['status']
+                    self.queueTree.item(make, values=(state, result['items']))
+                elif self.queueTree.set(make, 'state') == 'cancelling':
+                    self.queueTree.set(make, 'state', 'cancelled')
+                else:
+                    late.append(make)
+            self.queuedMakes = late + self.queuedMakes
+        self.batch = None
+        self.batchMakes = []
+        self.batchOptions = None
+        self.start_queued_makes()
+
+    def show_queue_progress(self, progress: dict):
+        """
+        Shows the state of each make of the batch being crawled. Called from the worker pool's thread.
+        """
+        for make, state in progress['makes'].items():
+            if self.queueTree.set(make, 'state') != 'cancelling':
+                self.queueTree.set(make, 'state', state)
+
+    def cancel_button_click(self):
+        """
+        Cancels the makes selected in the queue. Makes that are still waiting to be handed to the worker pool are taken
+        out of the queue, and makes of the batch being crawled are stopped without stopping the others.
+        """
+        for make in self.queueTree.selection():
+            if make in self.queuedMakes:
+                self.queuedMakes.remove(make)
+                self.queueTree.set(make, 'state', 'cancelled')
+            elif make in self.batchMakes and self.queueTree.set(make, 'state') in ('queued', 'running'):
+                self.workerPool.cancel(self.batch, make)
+                self.queueTree.set(make, 'state', 'cancelling')
+
+    def show_progress(self, monitor: OutputMonitor):
+        """
+        Shows the requests, items and drops counted so far by the running spiders. Called from the output monitor's
+        reader thread.
+        """
+        self.show_totals(monitor.totals())
+
+    def show_totals(self, totals: dict):
+        """
+        Shows the given totals of requests, items and drops after the text of the running crawl. Called from the reader
+        thread of the output monitor or of the worker pool.
+        """
+        self.updateLabel.config(text=f'{self.runningText} {totals["requests"]} requests, {totals["items"]} items, '
+                                     f'{totals["dropped"]} duplicates')
 
     def disable_critical_controls(self):
         """
@@ -230,8 +616,12 @@ class ScraperApp:
         """
         state = ['disabled']
         self.crawlButton.state(state)
+        self.resumeButton.state(state)
         self.purgeCheckButton.state(state)
+        self.purgeYearEntry.state(state)
+        self.purgeModelEntry.state(state)
         self.comboBox.state(state)
+        self.queueButton.state(state)
 
     def enable_critical_controls(self):
         """
@@ -239,8 +629,12 @@ class ScraperApp:
         """
         state = ['!disabled']
         self.crawlButton.state(state)
+        self.resumeButton.state(state)
         self.purgeCheckButton.state(state)
+        self.purgeYearEntry.state(state)
+        self.purgeModelEntry.state(state)
         self.comboBox.state(state)
+        self.queueButton.state(state)
 
     def show_help_text(self):
         messagebox.showinfo(title='How to use S.C.R.A.P.E.R.', message='\n\n'.join(self.HELP_TEXT))
@@ -253,4 +647,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # the crawl workers are started with multiprocessing, which needs this in the frozen app
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,156 @@
+"""
+Per-make output segments, used instead of appending to vehicles.csv when the VEHICLES_BACKEND setting is 'segments'.
+
+Every run of a spider writes a segment of its own, VEHICLES_SEGMENTS/<spider name>/<run id>.csv, so spiders running at
+the same time (in the same process or not) never write to the same file. A segment holds every vehicle of the spider's
+make(s), sorted: unless the spider purges, the vehicles of the latest segment before it are carried over first. That
+way, a purge only ever drops one make's rows, and the latest segment of each make is all there is to know about it.
+
+Once a run is over, compact merges the latest segment of every make into VEHICLES_OUTPUT with a streaming k-way merge,
+and deletes the segments it superseded. Rows of VEHICLES_OUTPUT whose make has no segments yet (e.g. from before the
+switch to this backend) are kept, ahead of the merged rows.
+"""
+import csv
+import datetime
+import heapq
+import os
+
+from vehicle_data_tracker.registry import load_registry
+from vehicle_data_tracker.trimindex import TrimSet
+from vehicle_data_tracker.trimindex import refresh_index
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+from vehicle_data_tracker.utilities import trim_id
+
+
+def new_run_id():
+    """
+    Returns an id for a segment that sorts after those of earlier runs, e.g. '20221031T142503-5120'.
+    """
+    return f'{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}'
+
+
+def segment_paths(directory: str, partition: str):
+    """
+    Returns the paths of the complete segments of ``partition`` (a spider name), oldest first.
+    """
+    try:
+        names = sorted(name for name in os.listdir(os.path.join(directory, partition)) if name.endswith('.csv'))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, partition, name) for name in names]
+
+
+def read_segment(path: str):
+    """
+    Yields the rows of a segment, without its header.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as segment:
+        reader = csv.reader(segment)
+        next(reader, None)
+        yield from reader
+
+
+class SegmentWriter:
+    """
+    Writes a new segment of ``partition`` in ``directory``. The rows are kept in memory, and written sorted when the
+    writer is closed, under a temporary name that is replaced by the final one once the segment is complete.
+    """
+    def __init__(self, directory: str, partition: str, run_id: str = None):
+        self.directory = directory
+        self.partition = partition
+        self.path = os.path.join(directory, partition, (run_id or new_run_id()) + '.csv')
+        self.rows = []
+        self.ids_seen = TrimSet()
+
+    def carry_over(self, output_file: str = None, makes=(), purged=None):
+        """
+        Adds the rows of the latest segment of the partition. If the partition has no segments yet, adds the rows of
+        ``output_file`` whose make is in ``makes`` instead, so that they are not lost at the next compaction.
+
+        :param makes: lowercase names of the makes of the partition
+        :param purged: a PurgeScope (see utilities.py) whose rows are left out, since they are being replaced
+        """
+        paths = segment_paths(self.directory, self.partition)
+        if paths:
+            for row in read_segment(paths[-1]):
+                if purged is None or not purged.covers(row):
+                    self.add(row)
+        elif output_file is not None:
+            try:
+                with open(output_file, 'r', newline='', encoding='utf-8') as existing:
+                    for row in csv.reader(existing):
+                        if (row and row[0].lower() != 'year' and row[1].lower() in makes
+                                and (purged is None or not purged.covers(row))):
+                            self.add(row[:len(STANDARD_FIELDS)])
+            except FileNotFoundError:
+                pass
+
+    def add(self, row: list):
+        """
+        Adds ``row`` (a list of values in STANDARD_FIELDS order), unless a row with the same year, make, model and trim
+        was added already.
+
+        :return: True if the row was added, False if it was a duplicate
+        """
+        identity = trim_id(*row[0:4])
+        if identity in self.ids_seen:
+            return False
+        self.ids_seen.add(identity)
+        self.rows.append(row)
+        return True
+
+    def close(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.part'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as segment:
+            writer = csv.writer(segment)
+            writer.writerow(STANDARD_FIELDS)
+            writer.writerows(sorted(self.rows))
+        os.replace(temp_path, self.path)
+
+
+def compact(directory: str, output_file: str):
+    """
+    Replaces ``output_file`` with the rows of the latest segment of every partition in ``directory``, merged in sorted
+    order, after the rows of ``output_file`` whose make does not belong to any partition. Once ``output_file`` has
+    been replaced, its trim index is brought up to date (see trimindex.refresh_index) and older segments are deleted.
+
+    The segments are read a row at a time while merging, so memory use does not grow with the number of vehicles.
+    Since every make belongs to exactly one partition, the merged rows need no further duplicate checks.
+
+    :return: the number of partitions merged
+    """
+    try:
+        partitions = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+    except FileNotFoundError:
+        return 0
+    segments = {partition: segment_paths(directory, partition) for partition in partitions}
+    segments = {partition: paths for partition, paths in segments.items() if paths}
+    registry = load_registry()
+    covered = set()
+    for partition in segments:
+        covered.update(registry[partition]['makes'] if partition in registry else [partition])
+
+    temp_file = f'{output_file}.{os.getpid()}.tmp'
+    with open(temp_file, 'w', newline='', encoding='utf-8') as merged:
+        writer = csv.writer(merged)
+        writer.writerow(STANDARD_FIELDS)
+        try:
+            with open(output_file, 'r', newline='', encoding='utf-8') as existing:
+                for row in csv.reader(existing):
+                    if row and row[0].lower() != 'year' and row[1].lower() not in covered:
+                        writer.writerow(row)
+        except FileNotFoundError:
+            pass
+        writer.writerows(heapq.merge(*(read_segment(paths[-1]) for paths in segments.values())))
+    os.replace(temp_file, output_file)
+    refresh_index(output_file)
+
+    for paths in segments.values():
+        for path in paths[:-1]:
+            try:
+                os.remove(path)
+            except OSError:
+                # still being read by another compaction, so it is left for the next one
+                pass
+    return len(segments)
@@ -0,0 +1,154 @@
+"""
+Runs crawls in the current process, on a reactor running in a background thread, for the app to use when Scrapy can be
+imported directly (from the interpreter running the app, or from the frozen bundle). That saves the app from setting up
+a virtual environment and from starting a Scrapy subprocess for every crawl.
+
+Since a reactor cannot be restarted, the CrawlService is started once and then used for every crawl the app runs.
+"""
+import concurrent.futures
+import threading
+
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.log import configure_logging
+from scrapy.utils.reactor import install_reactor
+from twisted.internet import defer
+from twisted.internet import threads
+
+from vehicle_data_tracker.extensions import close_spider
+from vehicle_data_tracker.history import record_runs
+from vehicle_data_tracker.runner import compact_output
+from vehicle_data_tracker.runner import record_snapshot
+from vehicle_data_tracker.runner import crawl_settings
+from vehicle_data_tracker.runner import open_checkpoint
+from vehicle_data_tracker.runner import CrawlSchedule
+from vehicle_data_tracker.runner import spider_name
+
+
+class CrawlService:
+    """
+    Starts a reactor in a background thread and runs crawls on it when asked to from other threads.
+
+    Every crawl gets a CrawlerRunner of its own, with freshly loaded settings, so crawls do not share any crawler,
+    stats or settings with the ones that came before them.
+
+    :param settings: any settings to override, by name
+    """
+    def __init__(self, settings: dict = None):
+        self.overrides = dict(settings or {})
+        self.settings = crawl_settings(**self.overrides)
+        if self.settings.get('TWISTED_REACTOR'):
+            install_reactor(self.settings.get('TWISTED_REACTOR'))
+        from twisted.internet import reactor
+        self.reactor = reactor
+        configure_logging(self.settings)
+        # the state of the crawl run by each active CrawlerRunner: the state of each of its makes, and which of them
+        #  were cancelled
+        self.jobs = {}
+        self.thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False},
+                                       name='crawl_service', daemon=True)
+        self.thread.start()
+
+    def submit(self, makes: list, purge=False, resume=False, max_spiders: int = None, settings: dict = None,
+               checkpointed=True, record=True, compact=True):
+        """
+        Starts crawling ``makes`` (see runner.schedule_crawls) and returns right away. More makes can be added to the
+        crawl with add while it is under way.
+
+        :param resume: resume the last run instead, if it was interrupted
+        :param settings: settings to override for this crawl only, by name
+        :param checkpointed: whether to checkpoint the run (see checkpoints.py), like the CLI does
+        :param record: whether to add the results to the crawl history, and record a snapshot of the output once the
+            crawl is over
+        :param compact: whether to compact the output segments once the crawl is over, with the segments backend
+        :return: a concurrent.futures.Future of the dict mapping each make to its crawl_result
+        """
+        future = concurrent.futures.Future()
+
+        def start():
+            job_settings = crawl_settings(**dict(self.overrides, **(settings or {})))
+            runner = CrawlerRunner(job_settings)
+            checkpoint, pending = None, makes
+            if checkpointed:
+                checkpoint, pending = open_checkpoint(job_settings, makes, purge, resume)
+            job = self.jobs[runner] = {'states': {make: 'queued' for make in pending}, 'cancelled': set(),
+                                       'future': future}
+            job['schedule'] = CrawlSchedule(runner, pending, purge, max_spiders, checkpoint=checkpoint,
+                                            cancelled=job['cancelled'], on_state=job['states'].__setitem__)
+            d = job['schedule'].deferred
+            if record:
+                d.addCallback(self.record, job_settings)
+            if compact:
+                d.addCallback(lambda results: threads.deferToThread(compact_output, job_settings).addCallback(
+                    lambda _: results))
+            if record:
+                d.addCallback(lambda results: threads.deferToThread(record_snapshot, job_settings, results).addCallback(
+                    lambda _: results))
+
+            def finished(result):
+                del self.jobs[runner]
+                return result
+
+            return d.addBoth(finished)
+
+        def run():
+            d = defer.maybeDeferred(start)
+            d.addCallbacks(future.set_result, lambda failure: future.set_exception(failure.value))
+
+        self.reactor.callFromThread(run)
+        return future
+
+    @staticmethod
+    def record(results: dict, settings):
+        record_runs(settings.get('CRAWL_HISTORY'), results)
+        return results
+
+    def cancel(self, make: str):
+        """
+        Stops crawling ``make`` in the crawls that are under way, leaving their other makes alone. If its spider is
+        running, it is closed with the 'cancelled' finish reason, keeping what it found so far. If it has not started
+        yet, it is skipped.
+        """
+        def cancel():
+            for runner, job in self.jobs.items():
+                if make not in job['states']:
+                    continue
+                job['cancelled'].add(make)
+                for crawler in list(runner.crawlers):
+                    if crawler.spidercls.name == spider_name(make) and crawler.engine is not None:
+                        close_spider(crawler, crawler.spider, 'cancelled')
+
+        self.reactor.callFromThread(cancel)
+
+    def add(self, future: concurrent.futures.Future, make: str):
+        """
+        Adds ``make`` to the crawl of ``future`` (as returned by submit), which starts crawling it as soon as fewer than
+        its ``max_spiders`` spiders are running (see runner.CrawlSchedule). If the crawl is over by then, or already
+        has the make, nothing happens, and the make is not in the results of the crawl.
+        """
+        def add():
+            for job in self.jobs.values():
+                if job['future'] is future and job['schedule'].add(make):
+                    job['states'][make] = 'queued'
+
+        self.reactor.callFromThread(add)
+
+    def progress(self):
+        """
+        Returns the requests, items and drops counted so far by the spiders that are currently running, and under
+        'makes', the state of every make of the crawls under way ('queued', 'running' or the status of its
+        crawl_result).
+        """
+        totals = {'requests': 0, 'items': 0, 'dropped': 0, 'makes': {}}
+        for runner, job in list(self.jobs.items()):
+            totals['makes'].update(job['states'])
+            for crawler in list(runner.crawlers):
+                if crawler.stats is None:
+                    continue
+                totals['requests'] += (crawler.stats.get_value('downloader/response_count', 0) +
+                                       crawler.stats.get_value('downloader/exception_count', 0))
+                totals['items'] += crawler.stats.get_value('item_scraped_count', 0)
+                totals['dropped'] += crawler.stats.get_value('item_dropped_count', 0)
+        return totals
+
+    def stop(self):
+        self.reactor.callFromThread(self.reactor.stop)
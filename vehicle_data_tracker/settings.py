@@ -14,6 +14,8 @@ DUPEFILTER_DEBUG = True
 
 SPIDER_MODULES = ['vehicle_data_tracker.spiders']
 NEWSPIDER_MODULE = 'vehicle_data_tracker.spiders'
+# Look spiders up in spiders/registry.json instead of importing every module in SPIDER_MODULES (see registry.py)
+SPIDER_LOADER_CLASS = 'vehicle_data_tracker.registry.RegistrySpiderLoader'
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -25,6 +27,31 @@ ROBOTSTXT_OBEY = True
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 #CONCURRENT_REQUESTS = 32
 
+# Maximum number of spiders crawling at the same time when several makes are run in one process (see runner.py)
+CONCURRENT_SPIDERS = 8
+
+# Where the duration and request count of every spider run are recorded. The runner starts the spiders that have taken
+#  the longest first (see history.py).
+CRAWL_HISTORY = 'crawl_history.json'
+
+# Crawl worker processes kept warm by the app, and how many jobs each of them runs before it is replaced by a new one
+#  (see workers.py)
+WORKER_POOL_SIZE = 2
+WORKER_MAX_JOBS = 10
+
+# Where multi-make runs keep the checkpoints they can be resumed from if interrupted (see checkpoints.py). Leave empty
+#  to turn checkpointing off.
+CHECKPOINT_DIR = 'checkpoints'
+
+# Service mode (see daemon.py): how often to check for stale makes, in seconds, and how long the data of each make stays
+#  fresh after a successful crawl, in seconds, by spider name (REFRESH_TTL for the ones not listed)
+DAEMON_INTERVAL = 600
+REFRESH_TTL = 24 * 60 * 60
+REFRESH_TTLS = {
+    'tesla': 24 * 60 * 60,
+    'porsche': 7 * 24 * 60 * 60,
+}
+
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
@@ -47,9 +74,10 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
+SPIDER_MIDDLEWARES = {
 #    'vehicle_data_tracker.middlewares.VehicleDataTrackerSpiderMiddleware': 543,
-#}
+    'vehicle_data_tracker.middlewares.PurgeScopeMiddleware': 550,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
@@ -59,17 +87,93 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
-#}
+    'vehicle_data_tracker.extensions.ProgressReporter': 500,
+    'vehicle_data_tracker.extensions.SpiderBudget': 500,
+}
+
+# Print a JSON progress line to stdout every PROGRESS_INTERVAL seconds (see extensions.ProgressReporter). The app turns
+#  this on for the crawls it runs.
+PROGRESS_ENABLED = False
+PROGRESS_INTERVAL = 1.0
+
+# Wall-clock (seconds) and request budgets of the spiders, by spider name (see extensions.SpiderBudget). Limits missing
+#  from SPIDER_BUDGETS are taken from SPIDER_BUDGET, and 0 means no limit, which is the default. A spider that runs out
+#  of budget is closed, keeping what it scraped so far, and its make is marked as partial (so a purge of it is not
+#  committed). The defaults can also be set with --time-budget and --request-budget.
+SPIDER_BUDGET = {'seconds': 0, 'requests': 0}
+SPIDER_BUDGETS = {
+#    'porsche': {'seconds': 120},
+#    'tesla': {'seconds': 120, 'requests': 50},
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
+# Spiders must not set ITEM_PIPELINES in their custom_settings, which would replace this dict instead of adding to it
+#  and leave the pipelines below out of their crawls.
 ITEM_PIPELINES = {
    'vehicle_data_tracker.pipelines.FormatPipeline': 300,
+   'vehicle_data_tracker.pipelines.ColumnarPipeline': 350,
+   'vehicle_data_tracker.pipelines.QueryIndexPipeline': 360,
    'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
 }
 
+# The csv file DuplicatePipeline checks for duplicates and writes new vehicles to
+VEHICLES_OUTPUT = 'vehicles.csv'
+
+# A csv file whose vehicles DuplicatePipeline drops as duplicates too, without writing to it, or '' for none. Set by
+#  sharded runs (see runner.run_sharded), whose workers write to partitions of VEHICLES_OUTPUT instead of the file
+VEHICLES_STORED = ''
+
+# DuplicatePipeline writes new vehicles in batches of up to WRITE_BATCH_SIZE (in one transaction each, with the sqlite
+#  backend), flushed when full, every WRITE_BATCH_INTERVAL seconds and when the spider closes. 1 writes each vehicle
+#  as soon as it is scraped.
+WRITE_BATCH_SIZE = 200
+WRITE_BATCH_INTERVAL = 2.0
+
+# Keep a persistent index of the trims in VEHICLES_OUTPUT (see trimindex.py), so that DuplicatePipeline does not have to
+#  read the whole file when a spider opens
+VEHICLES_INDEX = True
+
+# Where the vehicles are stored:
+#   - 'csv' for VEHICLES_OUTPUT
+#   - 'sqlite' for the VEHICLES_DB database (see store.py), which can be exported to VEHICLES_OUTPUT with
+#     "python -m vehicle_data_tracker.store export"
+#   - 'segments' for one file per spider run in the VEHICLES_SEGMENTS directory (see segments.py), which are merged
+#     into VEHICLES_OUTPUT at the end of every run
+VEHICLES_BACKEND = 'csv'
+VEHICLES_DB = 'vehicles.db'
+VEHICLES_SEGMENTS = 'vehicles'
+
+# Narrow crawls down to the vehicles of this model year (e.g. '2024') and, if PURGE_MODEL is set as well, of this model
+#  (e.g. 'Sierra 1500'), or '' for all of them (see utilities.PurgeScope). Requests for other years and models are not
+#  sent, and a purge only replaces the vehicles in the scope instead of every vehicle of the make(s). Spiders also take
+#  them as the purge_year and purge_model arguments.
+PURGE_YEAR = ''
+PURGE_MODEL = ''
+
+# The id of the run, which everything the run writes (query index runs, Parquet files, segments, the snapshot) is
+#  recorded under, and which the crawl report has. Leave empty for a new one for every run (see runner.schedule_crawls).
+RUN_ID = ''
+
+# Where a snapshot of the vehicles is recorded after every run (see snapshots.py), or '' for no snapshots. Snapshots
+#  only store what changed since the one before, except for a full checkpoint every SNAPSHOT_FULL_EVERY snapshots.
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_FULL_EVERY = 10
+# The archive the vehicles of every snapshot are added to, with a block index to read single runs and makes from (see
+#  archive.py), or '' for no archive, which is the default since the snapshots hold the same vehicles. A name ending
+#  with .zst is compressed with zstd instead of gzip (e.g. 'archive.csv.zst').
+ARCHIVE_FILE = ''
+
+# Where ColumnarPipeline writes a Parquet copy of the vehicles of every run, partitioned by make and run date (see
+#  columnar.py), or '' to disable it. Needs pyarrow.
+COLUMNAR_DIR = ''
+
+# The database QueryIndexPipeline adds the vehicles of every run to, for "python -m vehicle_data_tracker.query" (see
+#  query.py), or '' to disable it
+QUERY_DB = 'query.db'
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,231 @@
+"""
+Snapshots of the vehicle data after every run, for keeping a history of MSRPs without keeping a full copy of the data
+per run.
+
+A snapshot records the run (its id, when it was taken and the status of each make that was crawled) and the vehicles
+the output held once the run was over. Only the first snapshot and every SNAPSHOT_FULL_EVERY-th one after it are full
+checkpoints, with every vehicle. The others are deltas against the snapshot before them, with a row per change:
+
+- added: a trim that was not in the previous snapshot
+- removed: a trim of the previous snapshot that is gone, with its last msrp
+- repriced: a trim whose msrp changed, with the new msrp and the previous one
+
+A snapshot is reconstructed by loading the last full checkpoint up to it and replaying the deltas after that, so no
+more than SNAPSHOT_FULL_EVERY files are ever read. Trims are identified by year, make, model and trim, as in
+DuplicatePipeline.
+
+SNAPSHOT_DIR holds a manifest (snapshots.jsonl), with one JSON line per snapshot, and a csv file per snapshot,
+<run id>.full.csv or <run id>.delta.csv. The csv file is complete before its line is appended to the manifest, so a
+snapshot interrupted halfway is simply not there. Processes must not record snapshots in the same directory at the
+same time.
+
+To list the snapshots, write one out in the layout of vehicles.csv, or show the msrp history of a trim, enter:
+
+python -m vehicle_data_tracker.snapshots list [--dir DIR]
+python -m vehicle_data_tracker.snapshots export RUN_ID [--dir DIR] [--output FILE]
+python -m vehicle_data_tracker.snapshots history YEAR MAKE MODEL TRIM [--dir DIR]
+
+The directory defaults to the SNAPSHOT_DIR setting.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+
+from vehicle_data_tracker.segments import new_run_id
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+
+DELTA_FIELDS = ['change'] + STANDARD_FIELDS + ['previous_msrp']
+
+
+class SnapshotLog:
+    """
+    The snapshots in ``directory``, a full checkpoint being taken every ``full_every`` snapshots.
+    """
+    def __init__(self, directory: str, full_every: int = 10):
+        self.directory = directory
+        self.full_every = max(1, full_every)
+        self.manifest = os.path.join(directory, 'snapshots.jsonl')
+
+    def snapshots(self):
+        """
+        Returns the manifest entries of every snapshot, oldest first: dicts with the run id, timestamp, kind ('full' or
+        'delta'), file name, status of each make crawled, number of vehicles and numbers of added, removed and
+        repriced trims.
+        """
+        try:
+            with open(self.manifest, 'r') as manifest:
+                return [json.loads(line) for line in manifest if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _find(self, run_id: str, snapshots: list):
+        for i, entry in enumerate(snapshots):
+            if entry['run_id'] == run_id:
+                return i
+        raise KeyError(f'no snapshot with run id {run_id}')
+
+    def reconstruct(self, run_id: str = None):
+        """
+        Reconstructs the vehicles of a snapshot.
+
+        :param run_id: the run id of the snapshot, default the latest one
+        :return: a dict mapping each (year, make, model, trim) to its msrp, empty if there are no snapshots
+        """
+        snapshots = self.snapshots()
+        if not snapshots:
+            return {}
+        end = len(snapshots) - 1 if run_id is None else self._find(run_id, snapshots)
+        start = end
+        while snapshots[start]['kind'] != 'full':
+            start -= 1
+        vehicles = {}
+        for entry in snapshots[start:end + 1]:
+            self.replay(entry, vehicles)
+        return vehicles
+
+    def replay(self, entry: dict, vehicles: dict):
+        with open(os.path.join(self.directory, entry['file']), 'r', newline='', encoding='utf-8') as snapshot:
+            reader = csv.reader(snapshot)
+            next(reader, None)
+            if entry['kind'] == 'full':
+                vehicles.clear()
+                for row in reader:
+                    vehicles[tuple(row[0:4])] = row[4]
+                return
+            for row in reader:
+                if row[0] == 'removed':
+                    vehicles.pop(tuple(row[1:5]), None)
+                else:
+                    vehicles[tuple(row[1:5])] = row[5]
+
+    def record(self, rows, statuses: dict, run_id: str = None):
+        """
+        Records a snapshot of ``rows`` (lists of values in STANDARD_FIELDS order), as a full checkpoint if it is the
+        first snapshot or if the last full_every - 1 snapshots were deltas, and as a delta against the latest snapshot
+        otherwise. If a trim appears in several rows, the last one counts.
+
+        :param statuses: a dict mapping each make crawled in the run to its status (see runner.crawl_status)
+        :param run_id: the id of the snapshot (with a suffix if a snapshot has it already), default a new one (see
+            segments.new_run_id)
+        :return: the manifest entry of the snapshot
+        """
+        vehicles = {}
+        for row in rows:
+            vehicles[tuple(row[0:4])] = row[4]
+        snapshots = self.snapshots()
+        since_full = 0
+        for entry in reversed(snapshots):
+            if entry['kind'] == 'full':
+                break
+            since_full += 1
+        full = not snapshots or since_full + 1 >= self.full_every
+
+        base = run_id or new_run_id()
+        run_id = base
+        taken = {entry['run_id'] for entry in snapshots}
+        suffix = 1
+        while run_id in taken:
+            # a second snapshot in the same second, e.g. by a daemon with nothing to refresh, or of a run that was
+            #  resumed after its interrupted part was recorded
+            run_id = f'{base}-{suffix}'
+            suffix += 1
+        entry = {'run_id': run_id,
+                 'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'kind': 'full' if full else 'delta',
+                 'file': f'{run_id}.{"full" if full else "delta"}.csv',
+                 'makes': dict(statuses),
+                 'vehicles': len(vehicles)}
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, entry['file'])
+        temp_path = path + '.part'
+        previous = self.reconstruct() if snapshots else {}
+        changes = diff_vehicles(previous, vehicles)
+        with open(temp_path, 'w', newline='', encoding='utf-8') as snapshot:
+            writer = csv.writer(snapshot)
+            if full:
+                writer.writerow(STANDARD_FIELDS)
+                writer.writerows(list(key) + [msrp] for key, msrp in sorted(vehicles.items()))
+            else:
+                writer.writerow(DELTA_FIELDS)
+                writer.writerows(changes)
+        os.replace(temp_path, path)
+        for change in ('added', 'removed', 'repriced'):
+            entry[change] = sum(1 for row in changes if row[0] == change)
+        with open(self.manifest, 'a') as manifest:
+            manifest.write(json.dumps(entry) + '\n')
+        return entry
+
+    def price_history(self, year: str, make: str, model: str, trim: str):
+        """
+        Returns the msrp of a trim in every snapshot, oldest first, as a list of (run id, msrp) tuples, with an msrp of
+        None for the snapshots it was not in. The snapshots are replayed once, in order.
+        """
+        key = (year, make, model, trim)
+        history = []
+        vehicles = {}
+        for entry in self.snapshots():
+            self.replay(entry, vehicles)
+            history.append((entry['run_id'], vehicles.get(key)))
+        return history
+
+
+def diff_vehicles(previous: dict, current: dict):
+    """
+    Returns the changes from ``previous`` to ``current`` (dicts mapping each (year, make, model, trim) to its msrp) as
+    rows in DELTA_FIELDS order, sorted by trim.
+    """
+    changes = []
+    for key in sorted(previous.keys() | current.keys()):
+        if key not in current:
+            changes.append(['removed', *key, previous[key], ''])
+        elif key not in previous:
+            changes.append(['added', *key, current[key], ''])
+        elif previous[key] != current[key]:
+            changes.append(['repriced', *key, current[key], previous[key]])
+    return changes
+
+
+def main(argv=None):
+    # imported here, so that the rest of the module does not depend on Scrapy
+    from vehicle_data_tracker.runner import crawl_settings
+
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.snapshots',
+                                     description='Inspect the snapshots of the vehicle data taken after every run.')
+    parser.add_argument('command', choices=('list', 'export', 'history'))
+    parser.add_argument('args', nargs='*', help='RUN_ID for export, YEAR MAKE MODEL TRIM for history')
+    parser.add_argument('--dir', default=None, help='the snapshot directory, default SNAPSHOT_DIR')
+    parser.add_argument('--output', default=None, help='csv file to export to, default <RUN_ID>.csv')
+    args = parser.parse_args(argv)
+    settings = crawl_settings()
+    log = SnapshotLog(args.dir or settings.get('SNAPSHOT_DIR'), settings.getint('SNAPSHOT_FULL_EVERY'))
+    if args.command == 'list':
+        for entry in log.snapshots():
+            print(f'{entry["run_id"]}  {entry["timestamp"]}  {entry["kind"]:<5}  {entry["vehicles"]} vehicles, '
+                  f'+{entry["added"]} -{entry["removed"]} ~{entry["repriced"]}  '
+                  f'{", ".join(f"{make} {status}" for make, status in entry["makes"].items())}')
+    elif args.command == 'export':
+        if len(args.args) != 1:
+            parser.error('export takes a RUN_ID')
+        output = args.output or f'{args.args[0]}.csv'
+        try:
+            vehicles = log.reconstruct(args.args[0])
+        except KeyError as e:
+            parser.error(e.args[0])
+        with open(output, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(STANDARD_FIELDS)
+            writer.writerows(list(key) + [msrp] for key, msrp in sorted(vehicles.items()))
+        print(f'{len(vehicles)} vehicles written to {output}')
+    else:
+        if len(args.args) != 4:
+            parser.error('history takes a YEAR, MAKE, MODEL and TRIM')
+        for run_id, msrp in log.price_history(*args.args):
+            print(f'{run_id}  {msrp if msrp is not None else "-"}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
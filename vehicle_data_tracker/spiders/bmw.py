@@ -30,10 +30,6 @@ class BmwSpider(scrapy.Spider):
         #         'fields': STANDARD_FIELDS,
         #     }
         # },
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     def parse(self, response, **kwargs):
@@ -32,10 +32,6 @@ class BuickSpider(scrapy.Spider):
         #         'fields': STANDARD_FIELDS,
         #     }
         # },
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     def gen_api_link(self, model_name: str, model_year: str):
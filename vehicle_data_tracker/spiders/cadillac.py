@@ -30,10 +30,6 @@ class CadillacSpider(scrapy.Spider):
         #         'fields': STANDARD_FIELDS,
         #     }
         # },
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     # note: CADILLAC HAS THE EXACT SAME "BUILD & PRICE" SYSTEM AS BUICK HOLY CRAP
@@ -35,10 +35,6 @@ class ChevroletSpider(scrapy.Spider):
         #     }
         # },
         'ROBOTSTXT_OBEY': False,
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     # chevrolet is also GM
@@ -46,10 +46,6 @@ class FcaSpider(scrapy.Spider):
         #     }
         # },
         'ROBOTSTXT_OBEY': False,
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     def gen_api_link(self, make: str, modelCode: str):
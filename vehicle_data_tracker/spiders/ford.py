@@ -29,10 +29,6 @@ class FordSpider(scrapy.Spider):
         #         'fields': STANDARD_FIELDS,
         #     }
         # },
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     def parse(self, response, **kwargs):
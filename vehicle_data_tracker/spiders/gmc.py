@@ -30,10 +30,6 @@ class GmcSpider(scrapy.Spider):
         #         'fields': STANDARD_FIELDS,
         #     }
         # },
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        },
     }
 
     def gen_api_link(self, modelName: str, modelYear: str, separate_category=True):
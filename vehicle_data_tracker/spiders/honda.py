@@ -30,10 +30,6 @@ class HondaSpider(scrapy.Spider):
         #         'fields': STANDARD_FIELDS,
         #     }
         # },
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     # So, Honda corp owns both Honda (who would have guessed) and Acura. Let's see what we can do here.
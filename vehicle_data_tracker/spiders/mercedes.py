@@ -23,10 +23,6 @@ class MercedesSpider(scrapy.Spider):
         #     }
         # },
         'long_name': name_long,
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     def parse(self, response, **kwargs):
@@ -34,10 +34,6 @@ class TeslaSpider(scrapy.Spider):
         #     }
         # },
         'HTTPERROR_ALLOWED_CODES': [403],
-        'ITEM_PIPELINES': {
-            'vehicle_data_tracker.pipelines.FormatPipeline': 300,
-            'vehicle_data_tracker.pipelines.DuplicatePipeline': 400,
-        }
     }
 
     def gen_api_link(self, compare_id: str):
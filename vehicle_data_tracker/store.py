@@ -0,0 +1,297 @@
+"""
+An SQLite store for the vehicle data, used instead of vehicles.csv when the VEHICLES_BACKEND setting is 'sqlite'.
+
+With the csv backend, DuplicatePipeline reads all of vehicles.csv into memory when a spider opens, to know which
+vehicles have been seen already, and rewrites the whole file if the spider purges. Here, the vehicles table has a
+unique index on (year, make, model, trim, generation), so a duplicate is detected by the INSERT OR IGNORE that would
+have added it. It does not depend on how many vehicles the other makes have.
+
+Every vehicle belongs to a generation of its make, and only the visible generation of each make (see the generations
+table) is read. A purging spider writes its vehicles to a new generation, which is made visible in one UPDATE once the
+purge is committed, so a purge costs nothing when the spider opens and a failed crawl loses nothing. The vehicles of
+older generations are deleted later by collect, which is run after every crawl (see runner.compact_output). Those of
+generations that were never committed are left behind until a later purge of the make is, and then collected too.
+
+A purge narrowed down to a model year, or a model of a year (see utilities.PurgeScope), is committed by commit_scoped
+instead, which deletes the visible vehicles in the scope and moves the new generation into the visible one. Both go
+through the vehicles_scope index, so they only touch the vehicles in the scope and the new ones, however many vehicles
+the make has. A scoped purge leaves the visible generation as it is, so the vehicles of one that was never committed
+are only collected after the next full purge of the make.
+
+The database is in WAL mode, so that the spiders of a run (which each have a connection of their own, and may be in
+different worker processes) can write to it at the same time. StorePipeline writes the vehicles of a spider in batches
+of up to WRITE_BATCH_SIZE, each in one transaction (see add_many), which only starts once the batch is complete, so no
+connection holds the write lock for longer than it takes to insert one batch. Reads, like the duplicate check of
+contains, never wait for the write lock. The other statements are each their own transaction, except for those run in
+a transaction block (see transaction).
+
+To write the vehicles in the same layout as vehicles.csv, or to load an existing vehicles.csv into the database, enter:
+
+python -m vehicle_data_tracker.store export [--db FILE] [--output FILE]
+python -m vehicle_data_tracker.store import [--db FILE] [--input FILE]
+
+The files default to the VEHICLES_DB and VEHICLES_OUTPUT settings.
+"""
+import argparse
+import contextlib
+import csv
+import sqlite3
+
+from vehicle_data_tracker.trimindex import refresh_index
+from vehicle_data_tracker.utilities import STANDARD_FIELDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    year TEXT NOT NULL,
+    make TEXT NOT NULL,
+    model TEXT NOT NULL,
+    trim TEXT NOT NULL,
+    msrp TEXT NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS vehicles_generation_identity ON vehicles (year, make, model, trim, generation);
+CREATE INDEX IF NOT EXISTS vehicles_scope ON vehicles (make COLLATE NOCASE, generation, year, model COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS generations (
+    make TEXT PRIMARY KEY COLLATE NOCASE,
+    visible INTEGER NOT NULL DEFAULT 0,
+    latest INTEGER NOT NULL DEFAULT 0
+);
+"""
+# the vehicles of the visible generation of their make; a make that was never purged is at generation 0
+VISIBLE = 'vehicles.generation = COALESCE((SELECT visible FROM generations WHERE generations.make = vehicles.make), 0)'
+
+
+class VehicleStore:
+    """
+    The vehicles table of the SQLite database in ``path``, which is created if it does not exist yet.
+    """
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # in WAL mode, this only syncs at checkpoints, which is enough to keep the database from being corrupted
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(vehicles)')]
+        if columns and 'generation' not in columns:
+            # a database from before generations, whose vehicles all become generation 0
+            self.connection.executescript('ALTER TABLE vehicles ADD COLUMN generation INTEGER NOT NULL DEFAULT 0;'
+                                          'DROP INDEX IF EXISTS vehicles_identity;'
+                                          'DROP INDEX IF EXISTS vehicles_make;')
+        # replaced by vehicles_scope, which starts with the same columns
+        self.connection.execute('DROP INDEX IF EXISTS vehicles_make_generation')
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, vehicle, generation: int = 0):
+        """
+        Adds ``vehicle`` (a Vehicle or any mapping with the STANDARD_FIELDS) to ``generation`` of its make, unless a
+        vehicle with the same year, make, model and trim is already in it.
+
+        :return: True if the vehicle was added, False if it was a duplicate
+        """
+        cursor = self.connection.execute('INSERT OR IGNORE INTO vehicles VALUES (?, ?, ?, ?, ?, ?)',
+                                         [str(vehicle[field]) for field in STANDARD_FIELDS] + [generation])
+        return cursor.rowcount == 1
+
+    def contains(self, row: list):
+        """
+        Returns whether a vehicle with the year, make, model, trim and generation of ``row`` (a list of values in
+        STANDARD_FIELDS order, followed by the generation) is stored.
+        """
+        return self.connection.execute(
+            'SELECT 1 FROM vehicles WHERE year = ? AND make = ? AND model = ? AND trim = ? AND generation = ?',
+            row[0:4] + row[5:6]).fetchone() is not None
+
+    def add_many(self, rows):
+        """
+        Adds the given rows (lists of values in STANDARD_FIELDS order, each followed by its generation) in a single
+        transaction, skipping those that are already stored.
+
+        :return: the number of rows added
+        """
+        with self.transaction():
+            cursor = self.connection.executemany('INSERT OR IGNORE INTO vehicles VALUES (?, ?, ?, ?, ?, ?)', rows)
+        return cursor.rowcount
+
+    def upsert(self, rows):
+        """
+        Adds the given rows (lists of values in STANDARD_FIELDS order) to the visible generation of their make,
+        updating the msrp of the vehicles that are already stored instead of skipping them. All rows are written in a
+        single transaction.
+
+        :return: the number of rows written
+        """
+        with self.transaction():
+            cursor = self.connection.executemany(
+                'INSERT INTO vehicles SELECT ?1, ?2, ?3, ?4, ?5, '
+                'COALESCE((SELECT visible FROM generations WHERE make = ?2), 0) WHERE true '
+                'ON CONFLICT (year, make, model, trim, generation) DO UPDATE SET msrp = excluded.msrp', rows)
+        return cursor.rowcount
+
+    def purge(self, makes):
+        """
+        Removes every vehicle of the given makes, matched case-insensitively, right away and in every generation. For
+        a purge that should only take effect once a crawl has replaced the vehicles, see begin_generation.
+
+        :return: the number of vehicles removed
+        """
+        makes = list(makes)
+        if not makes:
+            return 0
+        placeholders = ', '.join('?' * len(makes))
+        cursor = self.connection.execute(
+            f'DELETE FROM vehicles WHERE make COLLATE NOCASE IN ({placeholders})', makes)
+        return cursor.rowcount
+
+    def generation(self, make: str):
+        """
+        Returns the visible generation of ``make``.
+        """
+        row = self.connection.execute('SELECT visible FROM generations WHERE make = ?', [make]).fetchone()
+        return row[0] if row else 0
+
+    def begin_generation(self, makes):
+        """
+        Starts a new generation of each of the given makes, which is not visible until it is committed.
+
+        :return: a dict mapping each make to its new generation
+        """
+        generations = {}
+        with self.transaction():
+            for make in makes:
+                self.connection.execute('INSERT OR IGNORE INTO generations (make) VALUES (?)', [make])
+                self.connection.execute('UPDATE generations SET latest = latest + 1 WHERE make = ?', [make])
+                generations[make] = self.connection.execute(
+                    'SELECT latest FROM generations WHERE make = ?', [make]).fetchone()[0]
+        return generations
+
+    def commit_generation(self, generations: dict):
+        """
+        Makes the given generations (as returned by begin_generation) the visible ones of their makes, unless a newer
+        generation was committed in the meantime.
+        """
+        with self.transaction():
+            for make, generation in generations.items():
+                self.connection.execute('UPDATE generations SET visible = ?1 WHERE make = ?2 AND visible < ?1',
+                                        [generation, make])
+
+    def commit_scoped(self, generations: dict, year: str, model: str = ''):
+        """
+        Commits the given generations (as returned by begin_generation) for a purge narrowed down to the model year
+        ``year`` and, if it is given, the model ``model`` (matched case-insensitively): the vehicles of that year and
+        model in the visible generation of each make are deleted, and the vehicles of the new generation, which are
+        all in the scope, are moved into the visible one. The visible generation stays the same, so the other vehicles
+        of the make are kept.
+
+        :return: the number of vehicles deleted
+        """
+        deleted = 0
+        scope = 'AND year = ?' + (' AND model COLLATE NOCASE = ?' if model else '')
+        parameters = [year] + ([model] if model else [])
+        with self.transaction():
+            for make, generation in generations.items():
+                visible = self.generation(make)
+                deleted += self.connection.execute(
+                    f'DELETE FROM vehicles WHERE make COLLATE NOCASE = ? AND generation = ? {scope}',
+                    [make, visible] + parameters).rowcount
+                self.connection.execute(
+                    'UPDATE vehicles SET generation = ? WHERE make COLLATE NOCASE = ? AND generation = ?',
+                    [visible, make, generation])
+        return deleted
+
+    def collect(self):
+        """
+        Deletes the vehicles of the generations older than the visible one of their make.
+
+        :return: the number of vehicles deleted
+        """
+        deleted = 0
+        for make, visible in self.connection.execute('SELECT make, visible FROM generations').fetchall():
+            deleted += self.connection.execute(
+                'DELETE FROM vehicles WHERE make COLLATE NOCASE = ? AND generation < ?', [make, visible]).rowcount
+        return deleted
+
+    def rows(self):
+        """
+        Yields every vehicle of a visible generation as a tuple in STANDARD_FIELDS order, oldest first, which is the
+        order vehicles.csv would have them in.
+        """
+        yield from self.connection.execute(f'SELECT year, make, model, trim, msrp FROM vehicles WHERE {VISIBLE} '
+                                           f'ORDER BY rowid')
+
+    def export_csv(self, output_file: str):
+        """
+        Writes every visible vehicle to ``output_file`` in the layout of vehicles.csv: a header with the
+        STANDARD_FIELDS, then one row per vehicle. The trim index of ``output_file`` is brought up to date (see
+        trimindex.refresh_index).
+
+        :return: the number of vehicles written
+        """
+        count = 0
+        with open(output_file, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(STANDARD_FIELDS)
+            for row in self.rows():
+                writer.writerow(row)
+                count += 1
+        refresh_index(output_file)
+        return count
+
+    def import_csv(self, input_file: str):
+        """
+        Upserts the vehicles of ``input_file``, a csv file in the layout of vehicles.csv.
+
+        :return: the number of rows read
+        """
+        with open(input_file, 'r', newline='', encoding='utf-8') as csv_file:
+            rows = [row[:len(STANDARD_FIELDS)] for row in csv.reader(csv_file)
+                    if len(row) >= len(STANDARD_FIELDS) and row[0].lower() != 'year']
+        self.upsert(rows)
+        return len(rows)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Runs the statements executed inside the with block in a single transaction.
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+
+def main(argv=None):
+    # imported here, so that the rest of the module does not depend on Scrapy
+    from vehicle_data_tracker.runner import crawl_settings
+
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.store',
+                                     description='Copy vehicles between the SQLite store and a csv file.')
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('--db', default=None, help='the SQLite database, default VEHICLES_DB')
+    parser.add_argument('--output', default=None, help='csv file to export to, default VEHICLES_OUTPUT')
+    parser.add_argument('--input', default=None, help='csv file to import from, default VEHICLES_OUTPUT')
+    args = parser.parse_args(argv)
+    settings = crawl_settings()
+    args.db = args.db or settings.get('VEHICLES_DB')
+    args.output = args.output or settings.get('VEHICLES_OUTPUT')
+    args.input = args.input or settings.get('VEHICLES_OUTPUT')
+    with VehicleStore(args.db) as store:
+        if args.command == 'export':
+            print(f'{store.export_csv(args.output)} vehicles written to {args.output}')
+        else:
+            print(f'{store.import_csv(args.input)} vehicles read from {args.input}')
+
+
+if __name__ == '__main__':
+    main()
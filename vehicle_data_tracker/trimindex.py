@@ -0,0 +1,575 @@
+"""
+A persistent index of the trims in vehicles.csv, so that DuplicatePipeline does not have to read the whole file into a
+set every time a spider opens.
+
+The index is a memory-mapped file next to the csv file (vehicles.csv.idx), holding an open-addressing hash table with
+linear probing, followed by the trim ids themselves (see utilities.trim_id), each encoded in UTF-8 and prefixed with its
+length. Each slot of the table is the 64-bit hash of a trim id, or 0 if the slot is empty, and where the trim id is
+in the key area. The hash picks the slot, and whenever a slot holds the same hash, the trim id is compared with the one
+in the key area, so two trims are never mistaken for each other, even if their hashes are the same. Opening the index
+only maps the file, so it takes the same time however many trims there are, and the operating system only loads the
+pages that lookups actually touch. New trims are added in place as they are exported, the key area is doubled when it
+is full, and the table is rehashed into one twice as large when it gets 70% full.
+
+The header records the size the csv file had when the index was last known to match it. If the sizes differ when the
+index is opened (because the csv file was purged or edited, or a crawl was killed before it could update the header),
+the index is rebuilt.
+
+All spiders of a process share one TrimIndex per file (see open_index), so they always see each other's trims. As with
+vehicles.csv itself, processes must not write to the same index at the same time.
+
+TrimSet is the same table and key area in memory, for the trim ids held without an index (see dedup.py, segments.py
+and runner.merge_partitions). At 16 bytes a slot and 4 bytes more than the trim id for its key, it takes about two
+thirds of the memory of a set of trim id strings. The trim ids of a file are hashed in bulk and then put in their slots in one pass
+(see TrimSet.update), which is also how the index is rebuilt, but that still takes longer than filling a set, whose
+hashing and inserting are all done in C.
+
+To see how the index and TrimSet compare with reading vehicles.csv into a set, enter:
+
+python -m vehicle_data_tracker.trimindex ROWS [ROWS ...]
+"""
+import argparse
+import array
+import csv
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from vehicle_data_tracker.utilities import trim_id
+
+# magic, version, number of slots, number of trims, size of the csv file, bytes used and bytes reserved for keys
+HEADER = struct.Struct('<4sIQQQQQ')
+MAGIC = b'VTIX'
+VERSION = 3
+# the hash of a trim id, and where its key starts in the key area
+SLOT = struct.Struct('<QQ')
+# the length of a key, which precedes it in the key area
+KEY = struct.Struct('<I')
+EMPTY = 0
+MIN_CAPACITY = 1024
+MIN_KEYS = 65536
+MAX_LOAD = 0.7
+# how many trim ids TrimSet.update hashes at a time
+HASH_BATCH = 65536
+
+_open_indexes = {}
+
+
+def trim_key(trim_id: str):
+    """
+    Returns a trim id as it is kept in the key area, encoded in UTF-8.
+    """
+    return trim_id.encode('utf-8')
+
+
+def trim_digest(key: bytes):
+    """
+    Returns the 64-bit hash of the key of a trim id (see trim_key) as 8 bytes, which are trim_hash in little-endian
+    order (except that it may be EMPTY).
+    """
+    return hashlib.blake2b(key, digest_size=8).digest()
+
+
+def trim_hash(key: bytes):
+    """
+    Returns the 64-bit hash of the key of a trim id (see trim_key), which picks its slot, and is never EMPTY.
+    """
+    return int.from_bytes(trim_digest(key), 'little') or 1
+
+
+class TrimIndex:
+    """
+    The index in ``path``, which is created empty if it does not exist.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, MIN_CAPACITY, 0)
+        self._map()
+
+    @staticmethod
+    def _create(path: str, capacity: int, source_size: int, keys: bytes = b'', keys_capacity: int = MIN_KEYS):
+        """
+        Writes an index of ``capacity`` empty slots, with ``keys`` at the start of a key area of ``keys_capacity``
+        bytes.
+        """
+        keys_capacity = max(keys_capacity, len(keys))
+        with open(path, 'wb') as index_file:
+            index_file.write(HEADER.pack(MAGIC, VERSION, capacity, 0, source_size, len(keys), keys_capacity))
+            index_file.seek(HEADER.size + capacity * SLOT.size)
+            index_file.write(keys)
+            index_file.truncate(HEADER.size + capacity * SLOT.size + keys_capacity)
+
+    def _map(self):
+        self.file = open(self.path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        if len(self.map) < HEADER.size:
+            self._unmap()
+            raise ValueError(f'{self.path} is not a trim index')
+        (magic, version, self.capacity, self.count, self.source_size, self.keys_size,
+         self.keys_capacity) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self._unmap()
+            raise ValueError(f'{self.path} is not a trim index')
+        self.mask = self.capacity - 1
+        self.keys_offset = HEADER.size + self.capacity * SLOT.size
+
+    def _unmap(self):
+        self.map.close()
+        self.file.close()
+
+    def _write_header(self):
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.capacity, self.count, self.source_size, self.keys_size,
+                         self.keys_capacity)
+
+    def _key_at(self, offset: int):
+        """
+        Returns the key that starts ``offset`` bytes into the key area.
+        """
+        start = self.keys_offset + offset + KEY.size
+        return self.map[start:start + KEY.unpack_from(self.map, start - KEY.size)[0]]
+
+    def _probe(self, value: int, key: bytes):
+        """
+        Returns the offset of the slot of ``key``, whose hash is ``value``, in the table, or of the empty slot where
+        probing for it stopped, and the hash that slot holds.
+        """
+        slot = value & self.mask
+        while True:
+            offset = HEADER.size + slot * SLOT.size
+            stored, key_offset = SLOT.unpack_from(self.map, offset)
+            if stored == EMPTY or (stored == value and self._key_at(key_offset) == key):
+                return offset, stored
+            slot = (slot + 1) & self.mask
+
+    def __contains__(self, trim_id: str):
+        key = trim_key(trim_id)
+        return self._probe(trim_hash(key), key)[1] != EMPTY
+
+    def __len__(self):
+        return self.count
+
+    def add(self, trim_id: str):
+        """
+        Adds a trim id to the index.
+
+        :return: True if it was added, False if it was in the index already
+        """
+        key = trim_key(trim_id)
+        value = trim_hash(key)
+        offset, stored = self._probe(value, key)
+        if stored != EMPTY:
+            return False
+        record = KEY.pack(len(key)) + key
+        if self.keys_size + len(record) > self.keys_capacity:
+            # the key area follows the table, so the offset of the slot stays the same
+            self._grow_keys(self.keys_size + len(record))
+        self.map[self.keys_offset + self.keys_size:self.keys_offset + self.keys_size + len(record)] = record
+        SLOT.pack_into(self.map, offset, value, self.keys_size)
+        self.keys_size += len(record)
+        self.count += 1
+        if self.count > self.capacity * MAX_LOAD:
+            self._resize(self.capacity * 2)
+        return True
+
+    def clear(self, capacity: int = MIN_CAPACITY, keys: bytes = b''):
+        """
+        Empties the index, giving it room for ``capacity`` slots (rounded up to a power of 2), with ``keys`` at the
+        start of its key area.
+        """
+        self._unmap()
+        self._create(self.path, max(MIN_CAPACITY, 1 << (capacity - 1).bit_length()), 0, keys,
+                     max(MIN_KEYS, 2 * len(keys)))
+        self._map()
+
+    def _grow_keys(self, needed: int):
+        """
+        Makes room for at least ``needed`` bytes in the key area, at least doubling it. The file is extended and mapped
+        again, since not every platform can resize a map in place.
+        """
+        self.keys_capacity = max(2 * self.keys_capacity, needed)
+        self._write_header()
+        self._unmap()
+        os.truncate(self.path, self.keys_offset + self.keys_capacity)
+        self._map()
+
+    def _resize(self, capacity: int):
+        """
+        Rehashes every trim into a new table of ``capacity`` slots. The key area is copied as it is, so the slots still
+        point to their keys.
+        """
+        temp_path = self.path + '.tmp'
+        self._create(temp_path, capacity, self.source_size,
+                     self.map[self.keys_offset:self.keys_offset + self.keys_size], self.keys_capacity)
+        mask = capacity - 1
+        with open(temp_path, 'r+b') as temp_file, mmap.mmap(temp_file.fileno(), 0) as new_map:
+            for slot in range(self.capacity):
+                value, key_offset = SLOT.unpack_from(self.map, HEADER.size + slot * SLOT.size)
+                if value != EMPTY:
+                    new_slot = value & mask
+                    while SLOT.unpack_from(new_map, HEADER.size + new_slot * SLOT.size)[0] != EMPTY:
+                        new_slot = (new_slot + 1) & mask
+                    SLOT.pack_into(new_map, HEADER.size + new_slot * SLOT.size, value, key_offset)
+            HEADER.pack_into(new_map, 0, MAGIC, VERSION, capacity, self.count, self.source_size, self.keys_size,
+                             self.keys_capacity)
+        self._unmap()
+        os.replace(temp_path, self.path)
+        self._map()
+
+    def sync(self, source_size: int):
+        """
+        Records that the index matches a csv file of ``source_size`` bytes, and writes the index to disk.
+        """
+        self.source_size = source_size
+        self._write_header()
+        self.map.flush()
+
+    def rebuild(self, source_file: str, trim_ids=None):
+        """
+        Empties the index and adds the trim of every row of ``source_file``.
+
+        :param trim_ids: the trim ids of ``source_file``, if they are known already, to save reading it
+        """
+        size = os.path.getsize(source_file) if os.path.exists(source_file) else 0
+        if trim_ids is None:
+            trim_ids = read_trim_ids(source_file)
+        # the table is built in memory in bulk (see TrimSet.update), and written to the file in one go
+        table = TrimSet(trim_ids)
+        self.clear(table.capacity, table.keys)
+        self.map[HEADER.size:self.keys_offset] = table.to_bytes()
+        self.count = len(table)
+        self.keys_size = len(table.keys)
+        self.sync(size)
+
+    def close(self):
+        self._write_header()
+        self._unmap()
+
+
+class TrimSet:
+    """
+    A set of trim ids in memory, held in a table and key area like those of TrimIndex. It has the set methods the
+    pipelines use, but cannot be iterated.
+    """
+    def __init__(self, trim_ids=()):
+        self.clear()
+        self.update(trim_ids)
+
+    def clear(self, capacity: int = MIN_CAPACITY):
+        """
+        Empties the set, giving it room for ``capacity`` slots (rounded up to a power of 2).
+        """
+        self.capacity = max(MIN_CAPACITY, 1 << (capacity - 1).bit_length())
+        self.mask = self.capacity - 1
+        self.count = 0
+        # the hash in each slot and where its key starts in self.keys are next to each other, at 2 * slot and
+        #  2 * slot + 1
+        self.table = array.array('Q', bytes(self.capacity * SLOT.size))
+        self.keys = bytearray()
+        # the bytes of self.keys taken by the keys of discarded trims
+        self.discarded = 0
+
+    def _key_at(self, offset: int):
+        start = offset + KEY.size
+        return self.keys[start:start + KEY.unpack_from(self.keys, offset)[0]]
+
+    def _probe(self, value: int, key: bytes):
+        """
+        Returns the slot of ``key``, whose hash is ``value``, or the empty slot where probing for it stopped.
+        """
+        table = self.table
+        slot = value & self.mask
+        while True:
+            stored = table[2 * slot]
+            if stored == EMPTY or (stored == value and self._key_at(table[2 * slot + 1]) == key):
+                return slot
+            slot = (slot + 1) & self.mask
+
+    def __contains__(self, trim_id: str):
+        key = trim_key(trim_id)
+        return self.table[2 * self._probe(trim_hash(key), key)] != EMPTY
+
+    def __len__(self):
+        return self.count
+
+    def add(self, trim_id: str):
+        """
+        Adds a trim id to the set.
+
+        :return: True if it was added, False if it was in the set already
+        """
+        key = trim_key(trim_id)
+        value = trim_hash(key)
+        slot = self._probe(value, key)
+        if self.table[2 * slot] != EMPTY:
+            return False
+        self.table[2 * slot] = value
+        self.table[2 * slot + 1] = len(self.keys)
+        self.keys += KEY.pack(len(key))
+        self.keys += key
+        self.count += 1
+        if self.count > self.capacity * MAX_LOAD:
+            self._resize(self.capacity * 2)
+        return True
+
+    def update(self, trim_ids):
+        """
+        Adds every trim id of ``trim_ids``. They are taken HASH_BATCH at a time: each batch is hashed into one array
+        first, the table is resized at most once to fit it, and then its trim ids are put in their slots in a single
+        pass, which takes less than half the time of adding them one by one.
+        """
+        trim_ids = iter(trim_ids)
+        while True:
+            batch = [trim_key(identity) for identity in itertools.islice(trim_ids, HASH_BATCH)]
+            if not batch:
+                break
+            hashes = array.array('Q', b''.join([trim_digest(key) for key in batch]))
+            if sys.byteorder == 'big':
+                hashes.byteswap()
+            needed = self.count + len(batch)
+            if needed > self.capacity * MAX_LOAD:
+                self._resize(int(needed / MAX_LOAD) + 1)
+            table = self.table
+            keys = self.keys
+            mask = self.mask
+            count = self.count
+            for value, key in zip(hashes, batch):
+                value = value or 1
+                slot = value & mask
+                stored = table[2 * slot]
+                while stored != EMPTY:
+                    if stored == value and self._key_at(table[2 * slot + 1]) == key:
+                        break
+                    slot = (slot + 1) & mask
+                    stored = table[2 * slot]
+                else:
+                    table[2 * slot] = value
+                    table[2 * slot + 1] = len(keys)
+                    keys += KEY.pack(len(key))
+                    keys += key
+                    count += 1
+            self.count = count
+
+    def discard(self, trim_id: str):
+        """
+        Removes a trim id from the set if it is in it. The slots after it that would no longer be reached by probing
+        are moved back, so that the table never needs markers for removed trims. Its key stays in the key area until
+        the keys of discarded trims take up half of it, and the set is rehashed without them.
+        """
+        table = self.table
+        key = trim_key(trim_id)
+        hole = self._probe(trim_hash(key), key)
+        if table[2 * hole] == EMPTY:
+            return
+        self.count -= 1
+        self.discarded += KEY.size + len(key)
+        slot = (hole + 1) & self.mask
+        while table[2 * slot] != EMPTY:
+            # the trim in slot can move back to the hole if probing for it starts at or before the hole
+            home = table[2 * slot] & self.mask
+            if (slot - home) & self.mask >= (slot - hole) & self.mask:
+                table[2 * hole] = table[2 * slot]
+                table[2 * hole + 1] = table[2 * slot + 1]
+                hole = slot
+            slot = (slot + 1) & self.mask
+        table[2 * hole] = EMPTY
+        table[2 * hole + 1] = 0
+        if self.discarded > len(self.keys) // 2:
+            self._resize(self.capacity)
+
+    def difference_update(self, trim_ids):
+        for identity in trim_ids:
+            self.discard(identity)
+
+    def to_bytes(self):
+        """
+        Returns the table in the layout of the slots of a TrimIndex, whose key area is self.keys.
+        """
+        if sys.byteorder == 'little':
+            return self.table.tobytes()
+        table = array.array('Q', self.table)
+        table.byteswap()
+        return table.tobytes()
+
+    def _resize(self, capacity: int):
+        """
+        Rehashes every trim into a new table of ``capacity`` slots, leaving the keys of discarded trims out of the new
+        key area.
+        """
+        old_table = self.table
+        old_keys = self.keys
+        count = self.count
+        self.clear(capacity)
+        table = self.table
+        keys = self.keys
+        for offset in range(0, len(old_table), 2):
+            value = old_table[offset]
+            if value != EMPTY:
+                slot = value & self.mask
+                while table[2 * slot] != EMPTY:
+                    slot = (slot + 1) & self.mask
+                table[2 * slot] = value
+                table[2 * slot + 1] = len(keys)
+                start = old_table[offset + 1]
+                keys += old_keys[start:start + KEY.size + KEY.unpack_from(old_keys, start)[0]]
+        self.count = count
+
+
+def read_trim_ids(source_file: str):
+    """
+    Yields the trim id of every row of ``source_file``, a csv file in the layout of vehicles.csv, if it exists.
+    """
+    try:
+        with open(source_file, 'r', newline='', encoding='utf-8') as source:
+            for row in csv.reader(source):
+                if row and row[0].lower() != 'year':
+                    yield trim_id(*row[0:4])
+    except FileNotFoundError:
+        return
+
+
+def index_path(source_file: str):
+    return source_file + '.idx'
+
+
+def open_index(source_file: str, trim_ids=None):
+    """
+    Returns the TrimIndex of ``source_file``, shared by every caller in this process until the last of them calls
+    release_index. When it is first opened, the index is rebuilt if it does not match the current size of
+    ``source_file``. While it is open, the callers keep it up to date themselves, so rows they append to
+    ``source_file`` in the meantime do not make another caller opening it rebuild it.
+
+    :param trim_ids: the trim ids of ``source_file``, if they are known already, to save reading it for a rebuild
+    """
+    path = os.path.abspath(index_path(source_file))
+    if path in _open_indexes:
+        index, users = _open_indexes[path]
+    else:
+        try:
+            index = TrimIndex(path)
+        except ValueError:
+            os.remove(path)
+            index = TrimIndex(path)
+        users = 0
+        size = os.path.getsize(source_file) if os.path.exists(source_file) else 0
+        if index.source_size != size:
+            index.rebuild(source_file, trim_ids)
+    _open_indexes[path] = (index, users + 1)
+    return index
+
+
+def release_index(source_file: str):
+    """
+    Records that the index matches the current size of ``source_file``, and closes it once nobody else in the process
+    is using it.
+    """
+    path = os.path.abspath(index_path(source_file))
+    index, users = _open_indexes[path]
+    index.sync(os.path.getsize(source_file) if os.path.exists(source_file) else 0)
+    if users == 1:
+        del _open_indexes[path]
+        index.close()
+    else:
+        _open_indexes[path] = (index, users - 1)
+
+
+def refresh_index(source_file: str):
+    """
+    Brings the index of ``source_file`` up to date after ``source_file`` has been rewritten rather than appended to:
+    rebuilds it if it is open in this process, and deletes it otherwise, so that it is rebuilt the next time it is
+    opened. The size it records is not enough to tell, since a rewritten file can have the same size and other trims.
+    """
+    path = os.path.abspath(index_path(source_file))
+    if path in _open_indexes:
+        _open_indexes[path][0].rebuild(source_file)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _traced_size(build):
+    """
+    Returns what ``build()`` returns, and how many bytes of memory it still holds.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        built = build()
+        return built, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(rows: int, directory: str):
+    """
+    Times loading a csv file of ``rows`` vehicles into a set of trim id strings, as DuplicatePipeline used to, and into
+    a TrimSet, against opening the index of the same file, and 10,000 lookups of each. Also measures the memory the set
+    and the TrimSet take.
+    """
+    source_file = os.path.join(directory, f'vehicles_{rows}.csv')
+    with open(source_file, 'w', newline='', encoding='utf-8') as source:
+        writer = csv.writer(source)
+        writer.writerow(['year', 'make', 'model', 'trim', 'msrp'])
+        for i in range(rows):
+            writer.writerow([str(2000 + i % 25), f'Make{i % 40}', f'Model{i // 1000}', f'Trim {i}', '$30,000'])
+    probes = [trim_id(str(2000 + i % 25), f'Make{i % 40}', f'Model{i // 1000}', f'Trim {i}')
+              for i in range(0, rows, max(1, rows // 10000))]
+
+    start = time.perf_counter()
+    ids_seen = set(read_trim_ids(source_file))
+    set_load = time.perf_counter() - start
+    start = time.perf_counter()
+    assert all(probe in ids_seen for probe in probes)
+    set_lookups = time.perf_counter() - start
+    del ids_seen
+    set_bytes = _traced_size(lambda: set(read_trim_ids(source_file)))[1]
+
+    start = time.perf_counter()
+    trim_set = TrimSet(read_trim_ids(source_file))
+    trim_set_load = time.perf_counter() - start
+    start = time.perf_counter()
+    assert all(probe in trim_set for probe in probes)
+    trim_set_lookups = time.perf_counter() - start
+    del trim_set
+    trim_set_bytes = _traced_size(lambda: TrimSet(read_trim_ids(source_file)))[1]
+
+    if os.path.exists(index_path(source_file)):
+        os.remove(index_path(source_file))
+    start = time.perf_counter()
+    open_index(source_file)
+    release_index(source_file)
+    index_build = time.perf_counter() - start
+    start = time.perf_counter()
+    index = open_index(source_file)
+    index_open = time.perf_counter() - start
+    start = time.perf_counter()
+    assert all(probe in index for probe in probes)
+    index_lookups = time.perf_counter() - start
+    size = os.path.getsize(index_path(source_file))
+    release_index(source_file)
+    print(f'{rows:>10,} rows: set load {set_load:8.3f}s, {len(probes)} set lookups {set_lookups:.4f}s, '
+          f'set memory {set_bytes / 2 ** 20:.1f} MiB | TrimSet load {trim_set_load:8.3f}s, '
+          f'{len(probes)} TrimSet lookups {trim_set_lookups:.4f}s, TrimSet memory {trim_set_bytes / 2 ** 20:.1f} MiB | '
+          f'index build (once) {index_build:8.3f}s, index open {index_open * 1000:.3f}ms, '
+          f'{len(probes)} index lookups {index_lookups:.4f}s, index file {size / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m vehicle_data_tracker.trimindex',
+                                     description='Benchmark the trim index and TrimSet against loading vehicles.csv '
+                                                 'into a set.')
+    parser.add_argument('rows', type=int, nargs='+', help='numbers of rows to benchmark with, e.g. 100000 10000000')
+    parser.add_argument('--dir', default=None, help='where to write the test files, default a temporary directory')
+    args = parser.parse_args()
+    if args.dir:
+        for count in args.rows:
+            benchmark(count, args.dir)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for count in args.rows:
+                benchmark(count, temp_dir)
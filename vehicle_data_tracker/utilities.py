@@ -2,6 +2,7 @@
 Static support functions and global variables for use in any of the web crawlers and the app.
 
 """
+import re
 
 # from items import Vehicle
 
@@ -32,6 +33,82 @@ MAKES_LIST = {
 }
 
 
+def trim_id(year: str, make: str, model: str, trim: str):
+    """
+    Returns the identity of a trim, which DuplicatePipeline and the other pipelines drop a vehicle as a duplicate by.
+    Each field is prefixed with its length, so that different trims never get the same id, e.g. model 'X' with trim
+    '5 M' and model 'X5' with trim ' M'.
+
+    :return: a string like '4:20244:Ford5:F-1502:XL'
+    """
+    return f'{len(year)}:{year}{len(make)}:{make}{len(model)}:{model}{len(trim)}:{trim}'
+
+
+def model_words(model: str):
+    """
+    Returns a model name the way FormatPipeline writes it, in lowercase: the runs of letters, digits, dashes, slashes
+    and periods in it, separated by single spaces.
+    """
+    return ' '.join(re.findall('[a-z0-9-/.]+', model.lower()))
+
+
+class PurgeScope:
+    """
+    The vehicles a purge replaces: those of the makes ``makes`` (lowercase names, as in the make column), or only those
+    of model year ``year`` of them, or only those of model ``model`` of that year (matched case-insensitively). Any
+    other vehicles of the makes are kept.
+
+    A crawl with a year or a model is narrowed down to them as well, purge or not: the vehicles outside of them are
+    dropped by DuplicatePipeline (see in_scope), and the requests for other years or models are not even sent (see
+    middlewares.PurgeScopeMiddleware).
+    """
+    def __init__(self, makes, year: str = '', model: str = ''):
+        self.makes = [make.lower() for make in makes]
+        self.year = str(year or '').strip()
+        self.model = str(model or '').strip()
+        if self.model and not self.year:
+            raise ValueError('a purge scope with a model needs a year as well')
+
+    def __str__(self):
+        return ' '.join(['/'.join(self.makes)] + [part for part in (self.year, self.model) if part])
+
+    def narrowed(self):
+        """
+        Returns whether the scope is narrower than the whole of its makes.
+        """
+        return bool(self.year)
+
+    def covers(self, row):
+        """
+        Returns whether the vehicle ``row`` (a list of values in STANDARD_FIELDS order) is in the scope.
+        """
+        return row[1].lower() in self.makes and self.in_scope(row)
+
+    def in_scope(self, row):
+        """
+        Returns whether the vehicle ``row`` (a list of values in STANDARD_FIELDS order) has the year and model of the
+        scope, whatever its make.
+        """
+        return (not self.year or row[0] == self.year) and (not self.model or row[2].lower() == self.model.lower())
+
+    def may_cover(self, year=None, model=None):
+        """
+        Returns whether a page a spider passes ``year`` and ``model`` along to, as it scraped them, may have vehicles in
+        the scope. A page is only ruled out if its year is a different 4-digit year, or its model is neither part of the
+        scope's model nor the other way around (e.g. 'Sierra' and 'Sierra 1500' may both be the model 'Sierra 1500').
+        """
+        if self.year and year is not None:
+            years = re.findall('[0-9]{4}', str(year))
+            if years and self.year not in years:
+                return False
+        if self.model and model is not None:
+            words = model_words(str(model))
+            wanted = model_words(self.model)
+            if words and wanted not in words and words not in wanted:
+                return False
+        return True
+
+
 def remove_html_tags(text: str):
     """
     Creates a copy of a string with any html tags removed.
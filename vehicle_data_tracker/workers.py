@@ -0,0 +1,235 @@
+"""
+A pool of pre-started crawl worker processes, so that a crawl can start without waiting for a Python interpreter to
+start and for Scrapy, the settings and the spiders to be loaded.
+
+Each worker starts a CrawlService (see service.py), loads every spider in the registry, and then waits for crawl jobs,
+which the pool hands it over a pipe. While a job runs, the worker sends back its progress every PROGRESS_INTERVAL
+seconds and the results once it is over, and takes requests to add makes to the job or to cancel makes of it. Every
+job gets a fresh CrawlerRunner and freshly loaded settings, but since a reactor cannot be restarted, the reactor and
+everything the spiders leave behind stay with the worker. To keep that from piling up, a worker is replaced by a new one
+after WORKER_MAX_JOBS jobs. The new worker is started right away, and is warm before it is given a job.
+
+The pool itself does not import Scrapy, so it can be used from a process that does not need it otherwise.
+"""
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(connection, settings: dict, interval: float):
+    """
+    The main function of a worker process.
+
+    :param connection: the worker's end of the pipe to the pool
+    :param settings: the settings to override in every job, by name
+    :param interval: how often to send the progress of a running job, in seconds
+    """
+    # imported here, so that the pool's process does not import Scrapy as well
+    from vehicle_data_tracker.registry import load_registry
+    from vehicle_data_tracker.registry import spider_class
+    from vehicle_data_tracker.service import CrawlService
+
+    service = CrawlService(settings)
+    for name in load_registry():
+        spider_class(name)
+    connection.send(('ready', os.getpid()))
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        if isinstance(job, tuple):
+            # a request to add or cancel a make that came in as the job it was for ended, which is too late
+            continue
+        future = service.submit(**job)
+        while not future.done():
+            if connection.poll(interval):
+                try:
+                    command, make = connection.recv()
+                except EOFError:
+                    service.stop()
+                    return
+                if command == 'add':
+                    service.add(future, make)
+                elif command == 'cancel':
+                    service.cancel(make)
+            elif not future.done():
+                connection.send(('progress', service.progress()))
+        try:
+            connection.send(('done', future.result()))
+        except Exception as e:
+            connection.send(('error', str(e)))
+    service.stop()
+
+
+class WorkerPool:
+    """
+    Keeps ``size`` warm crawl worker processes, each of which is replaced after ``max_jobs`` jobs, and runs the crawl
+    jobs submitted to it on whichever worker is free.
+
+    :param settings: the settings the workers should override in every job, by name
+    :param interval: how often workers report the progress of a running job, in seconds
+    """
+    def __init__(self, size: int, max_jobs: int, settings: dict = None, interval: float = 1.0):
+        self.max_jobs = max(1, max_jobs)
+        self.settings = dict(settings or {})
+        self.interval = interval
+        self.context = multiprocessing.get_context('spawn')
+        self.jobs = queue.Queue()
+        self.ready = threading.Event()
+        # the pipe to the worker running each job, and the requests to add or cancel makes of the jobs that are not
+        #  running yet
+        self.lock = threading.Lock()
+        self.running = {}
+        self.commands = {}
+        self.threads = [threading.Thread(target=self._serve, name=f'crawl_worker_{i}', daemon=True)
+                        for i in range(max(1, size))]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, makes: list, purge=False, resume=False, max_spiders: int = None, settings: dict = None,
+               checkpointed=True, record=True, compact=True, on_progress=None):
+        """
+        Queues a crawl of ``makes`` (see CrawlService.submit for the other parameters) and returns right away. The
+        crawl starts once a worker is free, so crawls submitted before any worker is warm wait until one is.
+
+        :param on_progress: called with the totals of requests, items and drops every time the worker reports
+            progress, from one of the pool's threads
+        :return: a concurrent.futures.Future of the dict mapping each make to its crawl_result
+        """
+        job = {'makes': list(makes), 'purge': purge, 'resume': resume, 'max_spiders': max_spiders,
+               'settings': settings, 'checkpointed': checkpointed, 'record': record, 'compact': compact}
+        future = concurrent.futures.Future()
+        self.jobs.put((job, future, on_progress))
+        return future
+
+    def add(self, future: concurrent.futures.Future, make: str):
+        """
+        Adds ``make`` to the job of ``future`` (see CrawlService.add), which starts crawling it as soon as one of its
+        ``max_spiders`` spots is free. If the job has not been handed to a worker yet, the make is added as soon as it
+        is. If the job is over by the time the worker gets the request, the make is not crawled, and is not in the
+        results of the job.
+        """
+        self._send(future, ('add', make))
+
+    def cancel(self, future: concurrent.futures.Future, make: str):
+        """
+        Stops crawling ``make`` in the job of ``future`` (see CrawlService.cancel), leaving the other makes of the job
+        alone. If the job has not been handed to a worker yet, the make is cancelled as soon as it is.
+        """
+        self._send(future, ('cancel', make))
+
+    def _send(self, future: concurrent.futures.Future, command: tuple):
+        """
+        Sends ``command`` to the worker running the job of ``future``, or once the job is handed to a worker if it has
+        not been yet.
+        """
+        with self.lock:
+            if future.done():
+                return
+            connection = self.running.get(future)
+            if connection is None:
+                self.commands.setdefault(future, []).append(command)
+            else:
+                connection.send(command)
+
+    def close(self):
+        """
+        Stops the workers once they are done with the jobs already submitted.
+        """
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _start_worker(self):
+        """
+        Starts a worker process and waits until it is warm.
+
+        :return: the process and the pool's end of its pipe, or (None, None) if the worker failed to start
+        """
+        connection, worker_connection = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(worker_connection, self.settings, self.interval),
+                                       daemon=True)
+        process.start()
+        worker_connection.close()
+        try:
+            connection.recv()
+        except EOFError:
+            process.join()
+            logger.error('Crawl worker failed to start (exit code %s)', process.exitcode)
+            return None, None
+        self.ready.set()
+        return process, connection
+
+    def _stop_worker(self, process, connection):
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+        process.join()
+
+    def _serve(self):
+        """
+        Runs in each of the pool's threads, keeping one worker process going and handing it jobs one at a time.
+        """
+        process = connection = None
+        jobs_done = 0
+        while True:
+            if process is None:
+                process, connection = self._start_worker()
+                jobs_done = 0
+            item = self.jobs.get()
+            if item is None:
+                if process is not None:
+                    self._stop_worker(process, connection)
+                return
+            job, future, on_progress = item
+            if not future.set_running_or_notify_cancel():
+                with self.lock:
+                    self.commands.pop(future, None)
+                continue
+            if process is None:
+                future.set_exception(RuntimeError('crawl worker failed to start'))
+                continue
+            with self.lock:
+                connection.send(job)
+                for command in self.commands.pop(future, []):
+                    connection.send(command)
+                self.running[future] = connection
+            while True:
+                try:
+                    kind, value = connection.recv()
+                except EOFError:
+                    process.join()
+                    future.set_exception(RuntimeError(f'crawl worker exited (exit code {process.exitcode})'))
+                    process = None
+                    break
+                if kind == 'progress':
+                    if on_progress is not None:
+                        on_progress(value)
+                elif kind == 'done':
+                    future.set_result(value)
+                    break
+                else:
+                    future.set_exception(RuntimeError(value))
+                    break
+            with self.lock:
+                del self.running[future]
+            jobs_done += 1
+            if process is not None and jobs_done >= self.max_jobs:
+                self._stop_worker(process, connection)
+                process = None